@@ -1,14 +1,48 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, PrivateAttr, create_model, field_validator
+from typing import Optional, Dict, Any, List, Literal, Annotated, TYPE_CHECKING
 from pathlib import Path
-import joblib
-import pandas as pd
+import numpy as np
 import sqlite3, json
-from datetime import datetime
+import csv
+import io
+from datetime import date, datetime, timedelta, timezone
 import time
+import logging
+import multiprocessing
 import os
+import queue
 import shutil
+import threading
+import uuid
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import hashlib
+import itertools
+from collections import OrderedDict
+from bisect import bisect_right
+import math
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Formats binaire / JSON rapide (facultatifs : repli sur le module json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger("student_api")
+
+# pandas, joblib, scikit-learn et mlflow sont importés à la demande (pipeline,
+# upload, entraînement) : le chemin de service n'a besoin que de NumPy.
+if TYPE_CHECKING:
+    import pandas as pd
 
 APP_DIR = Path(__file__).parent
 ROOT = APP_DIR.parent
@@ -29,24 +63,657 @@ SCENARIOS_CONFIG = {
 }
 
 FEATURE_TEMPLATE_PATH = ROOT / "models" / "feature_template.json"
-DB_PATH = APP_DIR / "inferences.sqlite"
+# Domaines des catégories et bornes numériques des modèles de base (généré par
+# ml/export_feature_schema.py) ; chaque version du registre a le sien (/train)
+FEATURE_SCHEMA_PATH = ROOT / "models" / "feature_schema.json"
+DB_PATH = Path(os.environ.get("INFERENCE_DB_PATH", str(APP_DIR / "inferences.sqlite")))
+# Rétention du journal : les jours plus anciens que RETENTION_DAYS sont archivés
+# en Parquet (python maintenance.py archive) ; 0 = tout conserver dans SQLite.
+# Archives dans INFERENCE_ARCHIVE_DIR, par défaut <base>_archive/ à côté de la base.
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", "0"))
+ARCHIVE_DIR = os.environ.get("INFERENCE_ARCHIVE_DIR")
+# Jeu d'entraînement : DATA_PATH (CSV, versionné et lisible) est la source ;
+# TRAIN_STORE_PATH en est dérivé (Arrow IPC / Feather v2 non compressé, lu en
+# mémoire mappée, catégorielles en category et entiers dans le plus petit type
+# signé). /upload-data réécrit les deux ; le fichier colonnaire est reconstruit
+# depuis le CSV s'il manque ou s'il est plus ancien.
 DATA_PATH = ROOT / "data" / "student_full.csv"
+TRAIN_STORE_PATH = ROOT / "data" / "student_full.feather"
+
+# Mode service seul : les modèles sont chargés depuis les artefacts compilés
+# (model_s*.compiled.json), sans pandas/joblib/scikit-learn ; /train et
+# /upload-data sont désactivés (image construite avec requirements-serving.txt).
+SERVING_ONLY = os.environ.get("SERVING_ONLY") == "1"
+
+# Mode d'inférence : "compiled" (encodeur précompilé + produit scalaire NumPy)
+# ou "pipeline" (DataFrame + pipeline scikit-learn complet)
+INFERENCE_MODE = "compiled" if SERVING_ONLY else os.environ.get("INFERENCE_MODE", "compiled")
+
+# Positionné par serve.py dans les workers forkés
+PREFORKED = os.environ.get("SERVE_PREFORKED") == "1"
+# Répertoire partagé des métriques des workers (positionné par serve.py) :
+# instantané par processus toutes les METRICS_FLUSH_S secondes
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_S = float(os.environ.get("METRICS_FLUSH_S", "1"))
+
+# Préchauffage des modèles au démarrage : "sync" (avant d'accepter des requêtes),
+# "background" (/health indique ready=false tant que ce n'est pas fini) ou "off"
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "sync")
+# Chargement des artefacts joblib en mémoire mappée (tableaux NumPy non compressés)
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "1") == "1"
 
 # MLflow tracking URI (sur le réseau Docker)
 MLFLOW_TRACKING_URI = os.environ.get("MLFLOW_TRACKING_URI", "http://student-mlflow:5000")
 
+def process_start_time() -> float:
+    """
+    Début du processus (epoch, s) : PROCESS_START_TIME posé par le point d'entrée
+    (serve.py, hérité par les workers), sinon date de démarrage lue dans /proc
+    (Linux, à 1/SC_CLK_TCK près, interpréteur compris), sinon maintenant.
+    """
+    if os.environ.get("PROCESS_START_TIME"):
+        return float(os.environ["PROCESS_START_TIME"])
+    try:
+        with open("/proc/self/stat") as f:
+            # champ 22 (starttime, en ticks depuis le boot), compté après "pid (comm)"
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+PROCESS_START_TIME = process_start_time()
+# Démarrage à froid (ms depuis le début du processus), exposé dans /health
+COLD_START: Dict[str, Optional[float]] = {"import_ms": None, "startup_ms": None, "first_prediction_ms": None}
+
+def _since_process_start_ms() -> float:
+    return (time.time() - PROCESS_START_TIME) * 1000.0
+
 # Charger le template de features
 with open(FEATURE_TEMPLATE_PATH, "r") as f:
     FEATURE_TEMPLATE = json.load(f)
 
 app = FastAPI(title="Student Success API", version="3.4.0")
 
+# =========================
+# Métriques (format texte Prometheus)
+# =========================
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _fmt_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self.values)
+
+    def render(self, values: Optional[Dict[tuple, float]] = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(values.items())]
+        return lines
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.buckets = name, help, buckets
+        self.values: Dict[tuple, list] = {}  # labels → [compteurs par bucket..., somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self) -> Dict[tuple, list]:
+        with self._lock:
+            return {key: list(state) for key, state in self.values.items()}
+
+    def render(self, values: Optional[Dict[tuple, list]] = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(values.items()):
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', '+Inf'),))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {state[-1]}")
+        return lines
+
+class CallbackMetric:
+    """Valeur lue au moment du scrape : fn() renvoie [(labels, valeur), ...]."""
+    def __init__(self, name: str, help: str, fn, kind: str = "gauge"):
+        self.name, self.help, self.fn, self.kind = name, help, fn, kind
+
+    def snapshot(self) -> Dict[tuple, float]:
+        return {tuple(sorted(labels.items())): value for labels, value in self.fn()}
+
+    def render(self, values: Optional[Dict[tuple, float]] = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_fmt_labels(k)} {v}" for k, v in values.items()]
+        return lines
+
+METRICS: List[Any] = []
+
+def register_metric(metric):
+    METRICS.append(metric)
+    return metric
+
+# Plusieurs workers (serve.py) : chaque processus a ses propres compteurs. Il
+# écrit un instantané dans METRICS_DIR/<pid>.json et /metrics fusionne ceux de
+# tous les workers : compteurs et histogrammes additionnés (y compris ceux d'un
+# worker mort, pour rester monotones), jauges par worker (label worker=<pid>)
+# pour les seuls processus vivants.
+def _metrics_file(pid: int) -> Path:
+    return Path(METRICS_DIR) / f"{pid}.json"
+
+def write_metrics_snapshot():
+    snap = {m.name: [[list(key), value] for key, value in m.snapshot().items()] for m in METRICS}
+    path = _metrics_file(os.getpid())
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(snap))
+    os.replace(tmp, path)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def merged_metrics() -> Dict[str, Dict[tuple, Any]]:
+    """Valeurs de chaque métrique, fusionnées sur les instantanés de METRICS_DIR."""
+    write_metrics_snapshot()
+    merged: Dict[str, Dict[tuple, Any]] = {m.name: {} for m in METRICS}
+    kinds = {m.name: m.kind for m in METRICS}
+    for path in Path(METRICS_DIR).glob("*.json"):
+        try:
+            pid, snap = int(path.stem), json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        alive = _pid_alive(pid)
+        for name, values in snap.items():
+            if name not in merged:
+                continue
+            acc = merged[name]
+            for key, value in values:
+                key = tuple(tuple(kv) for kv in key)
+                if kinds[name] == "gauge":
+                    if alive:
+                        acc[key + (("worker", pid),)] = value
+                elif kinds[name] == "histogram":
+                    prev = acc.get(key)
+                    acc[key] = value if prev is None else [a + b for a, b in zip(prev, value)]
+                else:
+                    acc[key] = acc.get(key, 0) + value
+    return merged
+
+class MetricsSnapshotWriter:
+    """Thread qui écrit l'instantané des métriques du processus toutes les interval_s secondes."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not METRICS_DIR or (self.thread is not None and self.thread.is_alive()):
+            return
+        self._stop.clear()
+        write_metrics_snapshot()
+        self.thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self._stop.set()
+        self.thread.join()
+        self.thread = None
+        write_metrics_snapshot()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                write_metrics_snapshot()
+            except OSError as e:
+                logger.warning("Metrics snapshot error: %s", e)
+
+_metrics_writer = MetricsSnapshotWriter(METRICS_FLUSH_S)
+
+STAGE_SECONDS = register_metric(Histogram(
+    "student_api_stage_seconds", "Latence par étape de /predict (secondes)"))
+REQUEST_SECONDS = register_metric(Histogram(
+    "student_api_request_seconds", "Latence totale des requêtes HTTP (secondes)"))
+RESPONSES_TOTAL = register_metric(Counter(
+    "student_api_responses_total", "Réponses HTTP par route et code de statut"))
+PREDICTIONS_TOTAL = register_metric(Counter(
+    "student_api_predictions_total", "Prédictions par scénario"))
+
+class StageTimer:
+    """Chronomètre par étapes : lap("x") enregistre le temps écoulé depuis l'étape précédente."""
+    def __init__(self, start: Optional[float] = None):
+        self.t = start if start is not None else time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self.t, stage=stage)
+        self.t = now
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence totale et code de statut par route (chemin du template, pas l'URL)."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        scope.setdefault("state", {})["t_received"] = t0
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, path=path)
+            RESPONSES_TOTAL.inc(path=path, status=status["code"])
+
+app.add_middleware(MetricsMiddleware)
+
+# =========================
+# Formats d'échange (JSON / MessagePack)
+# =========================
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+def _media_type(content_type: Optional[str]) -> str:
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Choisit le format de réponse ("json" ou "msgpack") d'après l'en-tête Accept
+    (poids q respectés, JSON par défaut). None si aucun format proposé n'est servi.
+    """
+    if not accept:
+        return "json"
+    best, best_rank = None, (0.0, False)
+    for part in accept.split(","):
+        media, _, params = part.partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media in MSGPACK_MEDIA_TYPES and msgpack is not None:
+            fmt = "msgpack"
+        elif media in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            fmt = "json"
+        else:
+            continue
+        # À poids égal : type explicite avant joker, puis ordre de l'en-tête
+        rank = (q, "*" not in media)
+        if q > 0 and rank > best_rank:
+            best, best_rank = fmt, rank
+    return best
+
+def dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def response_format(request: Request) -> str:
+    """
+    Format de réponse négocié, ou 406. Appelé en tête des handlers : une requête
+    refusée ne passe ni par l'admission ni par le scoring ni par le journal.
+    """
+    fmt = negotiate(request.headers.get("accept"))
+    if fmt is None:
+        served = [JSON_MEDIA_TYPE] + (list(MSGPACK_MEDIA_TYPES[:1]) if msgpack is not None else [])
+        raise HTTPException(status_code=406, detail=f"Formats disponibles : {', '.join(served)}")
+    return fmt
+
+def wire_response(request: Request, data: Any, status_code: int = 200, fmt: Optional[str] = None) -> Response:
+    """Sérialise data dans le format négocié (orjson si disponible, ou MessagePack)."""
+    fmt = fmt or response_format(request)
+    if fmt == "msgpack":
+        body, media_type = msgpack.packb(data, use_bin_type=True), MSGPACK_MEDIA_TYPES[0]
+    else:
+        body, media_type = dumps_json(data), JSON_MEDIA_TYPE
+    return Response(content=body, status_code=status_code, media_type=media_type, headers={"Vary": "Accept"})
+
+class WireRoute(APIRoute):
+    """
+    Route dont le corps de requête peut être en MessagePack (Content-Type
+    application/msgpack) ; les corps JSON sont décodés par orjson si disponible.
+    Le corps décodé est transmis à FastAPI comme un corps JSON (validation inchangée).
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            media_type = _media_type(request.headers.get("content-type"))
+            if media_type in MSGPACK_MEDIA_TYPES or (media_type == JSON_MEDIA_TYPE and orjson is not None):
+                body = await request.body()
+                if body:
+                    if media_type in MSGPACK_MEDIA_TYPES:
+                        if msgpack is None:
+                            raise HTTPException(status_code=415, detail="MessagePack non disponible (pip install msgpack)")
+                        try:
+                            data = msgpack.unpackb(body, raw=False)
+                        except Exception as e:
+                            raise HTTPException(status_code=400, detail=f"Corps MessagePack invalide: {e}")
+                    else:
+                        try:
+                            data = orjson.loads(body)
+                        except orjson.JSONDecodeError:
+                            return await handler(request)  # erreur 422 standard de FastAPI
+                    headers = [(k, v) for k, v in request.scope["headers"] if k != b"content-type"]
+                    scope = {**request.scope, "headers": headers + [(b"content-type", JSON_MEDIA_TYPE.encode())]}
+                    request = Request(scope, request.receive)
+                    request._body = body
+                    request._json = data
+            return await handler(request)
+
+        return route_handler
+
+app.router.route_class = WireRoute
+
 # =========================
 # Base de données
 # =========================
+# Journal compact : une colonne typée par feature du template (f_<nom>), NULL
+# si la feature est absente du payload OU égale à sa valeur de référence ;
+# present_mask (un bit par feature) distingue les deux cas, int_mask marque les
+# nombres envoyés comme entiers. Les catégories sont codées en petits entiers
+# (table feature_codes). Références et codes sont fixés dans la base
+# (feature_columns) : le décodage reste exact si le template évolue.
+# Un payload non représentable (clé inconnue, type inattendu, catégorie hors
+# dictionnaire) est conservé tel quel en JSON dans input_json.
+FEATURE_MASK_BITS = 62  # present_mask tient dans un INTEGER SQLite signé
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False)  # = json.dumps(..., ensure_ascii=False), sans réinstanciation
+
+class FeatureCodec:
+    """Encodage payload ↔ colonnes typées, construit depuis feature_columns / feature_codes."""
+
+    def __init__(self, features: List[tuple], codes: Dict[str, Dict[str, int]]):
+        # features : (nom, bit, "num" | "cat", valeur de référence), triées par bit
+        self.features = sorted(features, key=lambda f: f[1])
+        self.index = {name: (i, bit, kind, default) for i, (name, bit, kind, default) in enumerate(self.features)}
+        self.by_bit = {bit: i for i, (_, bit, _, _) in enumerate(self.features)}
+        self.codes = codes
+        self.values = {name: {code: value for value, code in m.items()} for name, m in codes.items()}
+        self._layouts: Dict[int, List[tuple]] = {}
+        self.columns = [f"f_{name}" for name, _, _, _ in self.features]
+        self.insert_sql = (
+            "INSERT INTO inferences (ts, session_id, scenario, input_json, pred_label, pred_proba, "
+            + ", ".join(["present_mask", "int_mask"] + self.columns) + ") VALUES ("
+            + ", ".join(["?"] * (8 + len(self.columns))) + ")"
+        )
+
+    def encode(self, payload: dict) -> Optional[tuple]:
+        """(present_mask, int_mask, valeurs...) ou None si le payload n'est pas représentable exactement."""
+        values: List[Any] = [None] * len(self.features)
+        mask, int_mask = 0, 0
+        for key, v in payload.items():
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            i, bit, kind, default = entry
+            if kind == "num":
+                if type(v) is int:
+                    if abs(v) > 2 ** 53:
+                        return None  # non représentable exactement en REAL
+                    int_mask |= 1 << bit
+                elif type(v) is not float or v != v or (v == 0.0 and str(v) != "0.0"):
+                    return None  # NaN (stocké NULL par SQLite) et -0.0 : JSON brut
+                if v != default or type(v) is not type(default):
+                    values[i] = v
+            else:
+                if type(v) is not str:
+                    return None
+                if v != default:
+                    code = self.codes.get(key, {}).get(v)
+                    if code is None:
+                        return None
+                    values[i] = code
+            mask |= 1 << bit
+        return (mask, int_mask or None, *values)
+
+    def decode(self, mask: int, int_mask: Optional[int], values) -> dict:
+        payload = {}
+        while mask:
+            low = mask & -mask  # bits positionnés, du plus faible au plus fort (ordre du template)
+            mask ^= low
+            bit = low.bit_length() - 1
+            i = self.by_bit[bit]
+            name, _, kind, default = self.features[i]
+            v = values[i]
+            if v is None:
+                payload[name] = default
+            elif kind == "cat":
+                payload[name] = self.values[name][v]
+            else:
+                payload[name] = int(v) if int_mask and (int_mask >> bit) & 1 else float(v)
+        return payload
+
+    def row(self, payload: dict, label: int, proba: float, session_id: Optional[str], scenario: str, ts: str) -> tuple:
+        encoded = self.encode(payload)
+        if encoded is None:
+            return (ts, session_id, scenario, json.dumps(payload, ensure_ascii=False), int(label), float(proba),
+                    None, None, *([None] * len(self.columns)))
+        return (ts, session_id, scenario, None, int(label), float(proba), *encoded)
+
+    def _layout(self, mask: int) -> List[tuple]:
+        """Pour un present_mask : (indice, bit, '"nom": ', type, JSON de la référence, JSON des modalités), en cache."""
+        layout = self._layouts.get(mask)
+        if layout is None:
+            layout = []
+            for bit in range(mask.bit_length()):
+                if (mask >> bit) & 1:
+                    i = self.by_bit[bit]
+                    name, _, kind, default = self.features[i]
+                    cats = {code: _JSON_ENCODER.encode(value) for code, value in self.values.get(name, {}).items()}
+                    layout.append((i, bit, _JSON_ENCODER.encode(name) + ": ", kind, _JSON_ENCODER.encode(default), cats))
+            self._layouts[mask] = layout
+        return layout
+
+    def input_json(self, raw: Optional[str], mask: Optional[int], int_mask: Optional[int], values) -> Optional[str]:
+        """
+        input_json d'origine (même sérialisation que json.dumps(payload, ensure_ascii=False)),
+        écrit directement depuis les colonnes, sans passer par un dict.
+        """
+        if raw is not None or mask is None:
+            return raw
+        parts = []
+        for i, bit, key, kind, default, cats in self._layout(mask):
+            v = values[i]
+            if v is None:
+                parts.append(key + default)
+            elif kind == "cat":
+                parts.append(key + cats[v])
+            elif int_mask and (int_mask >> bit) & 1:
+                parts.append(key + str(int(v)))
+            elif v - v == 0:
+                parts.append(key + float.__repr__(float(v)))
+            else:
+                return _JSON_ENCODER.encode(self.decode(mask, int_mask, values))  # ±inf : « Infinity »
+        return "{" + ", ".join(parts) + "}"
+
+_feature_codecs: Dict[str, FeatureCodec] = {}
+_feature_codecs_lock = threading.Lock()
+
+def feature_codec(db_path: Optional[Path] = None) -> FeatureCodec:
+    """Codec de la base (chargé une fois par processus et par chemin)."""
+    key = str(db_path or DB_PATH)
+    codec = _feature_codecs.get(key)
+    if codec is None:
+        with _feature_codecs_lock:
+            codec = _feature_codecs.get(key)
+            if codec is None:
+                codec = _feature_codecs[key] = _load_feature_codec(Path(key))
+    return codec
+
+def _load_feature_codec(db_path: Path) -> FeatureCodec:
+    conn = sqlite3.connect(db_path)
+    try:
+        features = [(name, bit, kind, json.loads(default)) for name, bit, kind, default in
+                    conn.execute("SELECT feature, bit, kind, default_json FROM feature_columns")]
+        codes: Dict[str, Dict[str, int]] = {}
+        for feature, value, code in conn.execute("SELECT feature, value, code FROM feature_codes"):
+            codes.setdefault(feature, {})[value] = code
+    except sqlite3.OperationalError:  # base pas encore initialisée : tout en JSON
+        features, codes = [], {}
+    finally:
+        conn.close()
+    return FeatureCodec(features, codes)
+
+def _sql_literal(value: Any) -> str:
+    return "'" + value.replace("'", "''") + "'" if isinstance(value, str) else repr(float(value))
+
+def _init_feature_columns(cur: sqlite3.Cursor):
+    """Ajoute les features du template absentes de feature_columns (bit, colonne, codes)."""
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS feature_columns ("
+        "feature TEXT PRIMARY KEY,"
+        "bit INTEGER UNIQUE,"
+        "kind TEXT,"
+        "default_json TEXT)"
+    )
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS feature_codes ("
+        "feature TEXT,"
+        "code INTEGER,"
+        "value TEXT,"
+        "PRIMARY KEY (feature, code),"
+        "UNIQUE (feature, value))"
+    )
+    existing = {row[1] for row in cur.execute("PRAGMA table_info(inferences)")}
+    for col in ("present_mask", "int_mask"):
+        if col not in existing:
+            cur.execute(f"ALTER TABLE inferences ADD COLUMN {col} INTEGER")
+    known = {row[0] for row in cur.execute("SELECT feature FROM feature_columns")}
+    next_bit = cur.execute("SELECT COALESCE(MAX(bit), -1) + 1 FROM feature_columns").fetchone()[0]
+    domains = FEATURE_SCHEMA.get("categorical", {})
+    for name, default in FEATURE_TEMPLATE.items():
+        if name in known or next_bit >= FEATURE_MASK_BITS or not name.isidentifier():
+            continue
+        kind = "cat" if isinstance(default, str) else "num"
+        cur.execute("INSERT INTO feature_columns VALUES (?, ?, ?, ?)", (name, next_bit, kind, json.dumps(default)))
+        if f"f_{name}" not in existing:
+            cur.execute(f"ALTER TABLE inferences ADD COLUMN f_{name} {'INTEGER' if kind == 'cat' else 'REAL'}")
+        next_bit += 1
+    # Dictionnaire des catégories : codes stables, nouvelles valeurs ajoutées en fin
+    for name, kind in cur.execute("SELECT feature, kind FROM feature_columns WHERE kind = 'cat'").fetchall():
+        for value in domains.get(name, []):
+            cur.execute(
+                "INSERT OR IGNORE INTO feature_codes (feature, code, value) VALUES "
+                "(?, (SELECT COALESCE(MAX(code), -1) + 1 FROM feature_codes WHERE feature = ?), ?)",
+                (name, name, value),
+            )
+    # Vue d'analyse : valeur vue par le modèle (référence si absente ou non stockée),
+    # catégories décodées ; NULL pour les lignes restées en JSON
+    select = []
+    for name, kind, default in cur.execute("SELECT feature, kind, default_json FROM feature_columns ORDER BY bit").fetchall():
+        default = json.loads(default)
+        if kind == "cat":
+            expr = (f"COALESCE((SELECT value FROM feature_codes c WHERE c.feature = '{name}' AND c.code = i.f_{name}), "
+                    f"{_sql_literal(default)})")
+        else:
+            expr = f"COALESCE(i.f_{name}, {_sql_literal(default)})"
+        select.append(f"CASE WHEN i.input_json IS NULL THEN {expr} END AS {name}")
+    cur.execute("DROP VIEW IF EXISTS inference_features")
+    cur.execute(
+        "CREATE VIEW inference_features AS SELECT i.id, i.ts, i.session_id, i.scenario, i.pred_label, i.pred_proba"
+        + "".join(", " + expr for expr in select) + " FROM inferences i"
+    )
+
+class ConnectionPool:
+    """
+    Connexions SQLite réutilisées entre requêtes (lecture du journal, écriture
+    directe) : évite l'ouverture et l'analyse du schéma à chaque appel.
+    Une connexion n'est utilisée que par un appelant à la fois.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._idle: Dict[str, List[sqlite3.Connection]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, db_path: Path):
+        key = str(db_path)
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = sqlite3.connect(key, check_same_thread=False, timeout=30)
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def clear(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+_db_pool = ConnectionPool(int(os.environ.get("DB_POOL_SIZE", "8")))
+
 def db_init():
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
+    # Effectif à la création de la base seulement (sinon : maintenance.py archive --vacuum)
+    cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
     cur.execute(
         "CREATE TABLE IF NOT EXISTS inferences ("
         "id INTEGER PRIMARY KEY AUTOINCREMENT,"
@@ -57,28 +724,659 @@ def db_init():
         "pred_label INTEGER,"
         "pred_proba REAL)"
     )
-    conn.commit()
-    conn.close()
-
-def db_log(payload: dict, label: int, proba: float, session_id: Optional[str], scenario: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    # Index pour la pagination keyset filtrée (ORDER BY id) et les plages de dates
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inferences_session ON inferences (session_id, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inferences_scenario ON inferences (scenario, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inferences_label ON inferences (pred_label, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inferences_ts ON inferences (ts)")
+    _init_feature_columns(cur)
+    # Agrégats horaires du journal ; à la création, initialisés depuis les lignes existantes
+    for table, keys in ROLLUP_TABLES.items():
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "hour TEXT,"
+            + "".join(f"{k} TEXT," for k in keys)
+            + "n INTEGER,"
+            "n_success INTEGER,"
+            "sum_proba REAL,"
+            f"PRIMARY KEY (hour, {', '.join(keys)}))"
+        )
+        if not exists:
+            cur.execute(_rollup_insert_sql(table))
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_session_rollups_session ON inference_session_rollups (session_id, hour)")
+    # Compteurs de dérive des entrées (voir DriftMonitor)
     cur.execute(
-        "INSERT INTO inferences (ts, session_id, scenario, input_json, pred_label, pred_proba) VALUES (?, ?, ?, ?, ?, ?)",
-        (datetime.utcnow().isoformat(), session_id, scenario, json.dumps(payload, ensure_ascii=False), int(label), float(proba))
+        "CREATE TABLE IF NOT EXISTS drift_counts ("
+        "version TEXT,"
+        "scenario TEXT,"
+        "feature TEXT,"
+        "bin INTEGER,"
+        "count INTEGER,"
+        "PRIMARY KEY (version, scenario, feature, bin))"
+    )
+    # État des jobs d'entraînement, partagé entre workers (serve.py)
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS train_jobs ("
+        "job_id TEXT PRIMARY KEY,"
+        "status TEXT,"
+        "updated_at TEXT,"
+        "snapshot_json TEXT)"
     )
     conn.commit()
+    cur.execute("PRAGMA journal_mode=WAL").fetchone()
     conn.close()
+    _feature_codecs.pop(str(DB_PATH), None)
+    _db_pool.clear()
 
-def db_read(limit: int):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(
-        "SELECT * FROM inferences ORDER BY id DESC LIMIT ?",
-        conn,
-        params=(int(limit),)
+def compact_inference_log(batch_size: int = 5000) -> dict:
+    """
+    Réencode en colonnes typées les lignes encore stockées en JSON (journal
+    antérieur au format compact). Les payloads non représentables restent en JSON.
+    """
+    codec = feature_codec()
+    stats = {"scanned": 0, "compacted": 0, "kept_json": 0}
+    set_sql = ", ".join(f"{c} = ?" for c in ["present_mask", "int_mask"] + codec.columns)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, input_json FROM inferences WHERE id > ? AND input_json IS NOT NULL ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, raw in rows:
+                try:
+                    payload = json.loads(raw)
+                except ValueError:
+                    payload = None
+                encoded = codec.encode(payload) if isinstance(payload, dict) else None
+                # Vérification aller-retour (valeurs et types ; l'ordre des clés suit le template)
+                if encoded is not None and (json.dumps(codec.decode(encoded[0], encoded[1], encoded[2:]), sort_keys=True)
+                                            == json.dumps(payload, sort_keys=True)):
+                    updates.append((*encoded, row_id))
+            with conn:
+                conn.executemany(f"UPDATE inferences SET input_json = NULL, {set_sql} WHERE id = ?", updates)
+            stats["scanned"] += len(rows)
+            stats["compacted"] += len(updates)
+            last_id = rows[-1][0]
+        stats["kept_json"] = stats["scanned"] - stats["compacted"]
+    finally:
+        conn.close()
+    return stats
+
+# Journalisation asynchrone des inférences
+# LOG_MODE : "async" (writer en arrière-plan) ou "sync" (une connexion par requête)
+# LOG_DURABILITY :
+#   - "strict" : synchronous=FULL, la requête attend le commit de son lot
+#                (au plus LOG_STRICT_TIMEOUT_MS, sinon 503)
+#   - "normal" : synchronous=NORMAL (WAL), la requête n'attend pas
+#   - "fast"   : synchronous=OFF, la requête n'attend pas
+LOG_MODE = os.environ.get("LOG_MODE", "async")
+LOG_DURABILITY = os.environ.get("LOG_DURABILITY", "normal")
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL_MS = float(os.environ.get("LOG_FLUSH_INTERVAL_MS", "50"))
+LOG_QUEUE_MAX = int(os.environ.get("LOG_QUEUE_MAX", "10000"))
+LOG_QUEUE_TIMEOUT_MS = float(os.environ.get("LOG_QUEUE_TIMEOUT_MS", "100"))
+LOG_STRICT_TIMEOUT_MS = float(os.environ.get("LOG_STRICT_TIMEOUT_MS", "5000"))
+# File vide depuis ce délai : le writer écrit les compteurs de dérive en attente
+# (prédictions log=False, trafic sans journal)
+DRIFT_FLUSH_S = float(os.environ.get("DRIFT_FLUSH_S", "1"))
+
+class LogQueueFull(Exception):
+    """File de journalisation pleine (backpressure)."""
+
+class LogCommitTimeout(LogQueueFull):
+    """Mode strict : commit non confirmé dans le délai (le lot peut encore être écrit)."""
+
+def _inference_row(payload: dict, label: int, proba: float, session_id: Optional[str], scenario: str, ts: str) -> tuple:
+    return feature_codec().row(payload, label, proba, session_id, scenario, ts)
+
+# Agrégats horaires maintenus à l'écriture du journal : /inferences/stats n'a
+# jamais à parcourir la table brute. Deux grains, pour que les requêtes sans
+# session ne paient pas la cardinalité des sessions.
+ROLLUP_TABLES = {
+    "inference_rollups": ("scenario",),
+    "inference_session_rollups": ("scenario", "session_id"),
+}
+# Clés SQL calculées depuis le journal brut (session absente stockée en '')
+ROLLUP_KEY_SQL = {"scenario": "scenario", "session_id": "COALESCE(session_id, '')"}
+
+def _rollup_upsert_sql(table: str) -> str:
+    keys = ROLLUP_TABLES[table]
+    return (
+        f"INSERT INTO {table} (hour, {', '.join(keys)}, n, n_success, sum_proba) "
+        f"VALUES ({', '.join('?' * (len(keys) + 4))}) "
+        f"ON CONFLICT (hour, {', '.join(keys)}) DO UPDATE SET "
+        "n = n + excluded.n, n_success = n_success + excluded.n_success, sum_proba = sum_proba + excluded.sum_proba"
     )
-    conn.close()
-    return df
+
+def _rollup_insert_sql(table: str, where: str = "") -> str:
+    """Même agrégat en SQL, pour l'initialisation et la reconstruction depuis la table brute."""
+    keys = ROLLUP_TABLES[table]
+    return (
+        f"INSERT INTO {table} (hour, {', '.join(keys)}, n, n_success, sum_proba) "
+        f"SELECT substr(ts, 1, 13) || ':00:00', {', '.join(ROLLUP_KEY_SQL[k] for k in keys)}, "
+        f"COUNT(*), SUM(pred_label), SUM(pred_proba) FROM inferences{where} "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(keys) + 1))}"
+    )
+
+def _rollup_rows(rows: List[tuple]) -> List[tuple]:
+    """Agrège un lot de lignes du journal par (heure, scénario, session)."""
+    acc: Dict[tuple, list] = {}
+    for row in rows:
+        ts, session_id, scenario, label, proba = row[0], row[1], row[2], row[4], row[5]
+        key = (ts[:13] + ":00:00", scenario, session_id or "")
+        a = acc.get(key)
+        if a is None:
+            acc[key] = [1, label, proba]
+        else:
+            a[0] += 1
+            a[1] += label
+            a[2] += proba
+    return [(*key, n, n_success, sum_proba) for key, (n, n_success, sum_proba) in acc.items()]
+
+def _rollup_scenarios(session_rows: List[tuple]) -> List[tuple]:
+    """Grain (heure, scénario), déduit du grain session."""
+    acc: Dict[tuple, list] = {}
+    for hour, scenario, _, n, n_success, sum_proba in session_rows:
+        a = acc.setdefault((hour, scenario), [0, 0, 0.0])
+        a[0] += n
+        a[1] += n_success
+        a[2] += sum_proba
+    return [(*key, *a) for key, a in acc.items()]
+
+def rebuild_rollups(since: Optional[datetime] = None) -> int:
+    """
+    Passe de compaction : recalcule les agrégats depuis la table brute
+    et les archives Parquet (toutes les heures, ou à partir de l'heure de since).
+    Renvoie le nombre d'agrégats (grain session) réécrits.
+    """
+    where, params = "", []
+    if since is not None:
+        where, params = " WHERE ts >= ?", [_ts_param(since)[:13] + ":00:00"]
+    # Jours archivés en Parquet (partitions élaguées par since)
+    archived = _rollup_rows([
+        (r["ts"], r["session_id"], r["scenario"], None, r["pred_label"], r["pred_proba"])
+        for r in iter_archive(InferenceFilters(since=params[0] if params else None),
+                              ["ts", "session_id", "scenario", "pred_label", "pred_proba"])
+    ])
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        with conn:
+            for table in ROLLUP_TABLES:
+                conn.execute(f"DELETE FROM {table}" + (" WHERE hour >= ?" if params else ""), params)
+                n = conn.execute(_rollup_insert_sql(table, where), params).rowcount
+            conn.executemany(_rollup_upsert_sql("inference_session_rollups"), archived)
+            conn.executemany(_rollup_upsert_sql("inference_rollups"), _rollup_scenarios(archived))
+            return n + len(archived)
+    finally:
+        conn.close()
+
+def _db_write_rows(conn: sqlite3.Connection, rows: List[tuple]):
+    conn.executemany(feature_codec().insert_sql, rows)
+    session_rows = _rollup_rows(rows)
+    conn.executemany(_rollup_upsert_sql("inference_session_rollups"), session_rows)
+    conn.executemany(_rollup_upsert_sql("inference_rollups"), _rollup_scenarios(session_rows))
+    # Les compteurs de dérive partent avec le lot du journal
+    _drift_monitor.flush(conn)
+
+class InferenceLogWriter:
+    """
+    Writer SQLite en arrière-plan : une connexion persistante (WAL), une file
+    en mémoire bornée, commit par lots (taille LOG_BATCH_SIZE ou délai
+    LOG_FLUSH_INTERVAL_MS), vidage complet à l'arrêt. En mode strict, un lot
+    est commité dès qu'une requête l'attend (sans délai d'accumulation).
+    Les compteurs de dérive partent avec chaque lot, et aussi quand la file
+    reste vide idle_flush_s secondes, ainsi qu'à l'arrêt.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_path: Path, durability: str = "normal", batch_size: int = 500,
+                 flush_interval_ms: float = 50.0, queue_max: int = 10000, queue_timeout_ms: float = 100.0,
+                 strict_timeout_ms: float = 5000.0, idle_flush_s: float = 1.0):
+        if durability not in ("strict", "normal", "fast"):
+            raise ValueError(f"Unknown LOG_DURABILITY: {durability}")
+        self.db_path = db_path
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.queue_timeout = queue_timeout_ms / 1000.0
+        self.strict_timeout = strict_timeout_ms / 1000.0
+        self.idle_flush = idle_flush_s
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_max)
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"rows_written": 0, "batches": 0, "rejected": 0, "errors": 0, "timeouts": 0, "last_error": None}
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.thread = threading.Thread(target=self._run, name="inference-log-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, rows: List[tuple]):
+        """
+        Met des lignes en file. Lève LogQueueFull si la file reste pleine et,
+        en mode strict, LogCommitTimeout si le commit n'est pas confirmé à temps.
+        """
+        done = threading.Event() if self.durability == "strict" else None
+        item = {"rows": rows, "done": done, "error": None}
+        try:
+            self.queue.put(item, timeout=self.queue_timeout)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise LogQueueFull(f"Log queue full ({self.queue.maxsize} items)")
+        if done is not None:
+            if not done.wait(self.strict_timeout):
+                self.stats["timeouts"] += 1
+                raise LogCommitTimeout(f"Log commit not confirmed within {self.strict_timeout * 1000:.0f} ms")
+            if item["error"] is not None:
+                raise item["error"]
+
+    def close(self, timeout: float = 10.0):
+        """Vide la file puis ferme la connexion."""
+        if not self.running:
+            return
+        self.queue.put(self._STOP)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=" + {"strict": "FULL", "normal": "NORMAL", "fast": "OFF"}[self.durability])
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    item = self.queue.get(timeout=self.idle_flush)
+                except queue.Empty:
+                    self._flush_drift(conn)
+                    continue
+                if item is self._STOP:
+                    break
+                batch = [item]
+                n_rows = len(item["rows"])
+                # Une requête strict attend : on ne prend que ce qui est déjà en file
+                flush_now = item["done"] is not None
+                deadline = time.monotonic() + self.flush_interval
+                while n_rows < self.batch_size:
+                    remaining = 0 if flush_now else deadline - time.monotonic()
+                    try:
+                        nxt = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(nxt)
+                    n_rows += len(nxt["rows"])
+                    flush_now = flush_now or nxt["done"] is not None
+                self._commit(conn, batch)
+            # Vidage des éléments restants à l'arrêt
+            rest = []
+            while True:
+                try:
+                    nxt = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is not self._STOP:
+                    rest.append(nxt)
+            if rest:
+                self._commit(conn, rest)
+            self._flush_drift(conn)
+        finally:
+            conn.close()
+
+    def _flush_drift(self, conn: sqlite3.Connection):
+        if not _drift_monitor.pending:
+            return
+        try:
+            with conn:
+                _drift_monitor.flush(conn)
+        except Exception as e:
+            # Deltas remis en attente par flush : nouvel essai au prochain lot ou tick
+            logger.error("Drift counters flush error: %s", e)
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[dict]):
+        error = None
+        try:
+            with conn:
+                _db_write_rows(conn, [row for item in batch for row in item["rows"]])
+            self.stats["rows_written"] += sum(len(item["rows"]) for item in batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            error = e
+            self.stats["errors"] += 1
+            self.stats["last_error"] = str(e)
+            logger.error("Inference log error: %s", e)
+        for item in batch:
+            if item["done"] is not None:
+                item["error"] = error
+                item["done"].set()
+
+_log_writer = InferenceLogWriter(
+    DB_PATH,
+    durability=LOG_DURABILITY,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval_ms=LOG_FLUSH_INTERVAL_MS,
+    queue_max=LOG_QUEUE_MAX,
+    queue_timeout_ms=LOG_QUEUE_TIMEOUT_MS,
+    strict_timeout_ms=LOG_STRICT_TIMEOUT_MS,
+    idle_flush_s=DRIFT_FLUSH_S,
+)
+
+def _db_log_rows(rows: List[tuple]):
+    if _log_writer.running:
+        _log_writer.submit(rows)
+        return
+    # Writer non démarré (LOG_MODE=sync, tests) : écriture directe
+    with _db_pool.connection(DB_PATH) as conn:
+        with conn:
+            _db_write_rows(conn, rows)
+
+def db_log(payload: dict, label: int, proba: float, session_id: Optional[str], scenario: str):
+    ts = datetime.utcnow().isoformat()
+    _db_log_rows([_inference_row(payload, label, proba, session_id, scenario, ts)])
+
+def db_log_many(records: List[tuple]):
+    """
+    Journalise plusieurs inférences (un seul élément de file / une seule transaction).
+    records : liste de (payload, label, proba, session_id, scenario)
+    """
+    ts = datetime.utcnow().isoformat()
+    _db_log_rows([
+        _inference_row(payload, label, proba, session_id, scenario, ts)
+        for payload, label, proba, session_id, scenario in records
+    ])
+
+INFERENCE_COLUMNS = ["id", "ts", "session_id", "scenario", "input_json", "pred_label", "pred_proba"]
+INFERENCES_MAX_LIMIT = int(os.environ.get("INFERENCES_MAX_LIMIT", "1000"))
+
+class InferenceFilters(BaseModel):
+    """Filtres communs à la lecture du journal (listing, export)."""
+    session_id: Optional[str] = None
+    scenario: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    label: Optional[int] = None
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Projection de colonnes ("id,ts,pred_proba"). L'id est toujours inclus (curseur)."""
+    if not fields:
+        return list(INFERENCE_COLUMNS)
+    cols = [c.strip() for c in fields.split(",") if c.strip()]
+    unknown = [c for c in cols if c not in INFERENCE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown}")
+    return ["id"] + [c for c in cols if c != "id"]
+
+def _ts_param(dt: datetime) -> str:
+    """Les ts sont stockés en ISO UTC naïf : on normalise pour comparer les chaînes."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+def _inference_where(filters: InferenceFilters, before_id: Optional[int] = None, after_id: Optional[int] = None):
+    clauses, params = [], []
+    if filters.session_id is not None:
+        clauses.append("session_id = ?")
+        params.append(filters.session_id)
+    if filters.scenario is not None:
+        clauses.append("scenario = ?")
+        params.append(filters.scenario)
+    if filters.label is not None:
+        clauses.append("pred_label = ?")
+        params.append(int(filters.label))
+    if filters.since is not None:
+        clauses.append("ts >= ?")
+        params.append(_ts_param(filters.since))
+    if filters.until is not None:
+        clauses.append("ts < ?")
+        params.append(_ts_param(filters.until))
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(int(before_id))
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(int(after_id))
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+def db_query(filters: InferenceFilters, fields: List[str], limit: Optional[int] = None,
+             before_id: Optional[int] = None, after_id: Optional[int] = None, descending: bool = True,
+             chunk_size: int = 1000):
+    """
+    Lit le journal par pagination keyset (id < before_id / id > after_id) :
+    les lignes sont produites directement depuis le curseur, sans pandas.
+    """
+    where, params = _inference_where(filters, before_id, after_id)
+    # input_json est reconstitué depuis les colonnes typées (journal compact)
+    codec = feature_codec() if "input_json" in fields else None
+    select = [c for c in fields if c != "input_json"]
+    if codec is not None:
+        select += ["input_json", "present_mask", "int_mask"] + codec.columns
+    sql = f"SELECT {', '.join(select)} FROM inferences{where} ORDER BY id {'DESC' if descending else 'ASC'}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    # Connexion du pool (check_same_thread=False) : un StreamingResponse peut
+    # itérer depuis plusieurs threads
+    with _db_pool.connection(DB_PATH) as conn:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            if codec is None:
+                for row in rows:
+                    yield dict(zip(fields, row))
+                continue
+            n = len(select) - len(codec.columns) - 3
+            pos = [n if c == "input_json" else select.index(c) for c in fields]
+            for row in rows:
+                row = row[:n] + (codec.input_json(row[n], row[n + 1], row[n + 2], row[n + 3:]),)
+                yield dict(zip(fields, [row[p] for p in pos]))
+
+STATS_BUCKETS = {"hour": 19, "day": 10}  # longueur du préfixe de l'heure agrégée
+STATS_GROUPS = ["scenario", "session_id"]
+
+def inference_stats(filters: InferenceFilters, bucket: str = "hour", group_by: Optional[List[str]] = None) -> List[dict]:
+    """
+    Agrégats par tranche de temps (heure ou jour), éventuellement par scénario
+    et/ou session, lus dans les agrégats horaires : le coût dépend du nombre
+    d'heures × scénarios (× sessions si demandé), pas de la taille du journal.
+    Granularité de l'heure : since est arrondi à l'heure, une heure est
+    retenue si elle commence avant until.
+    """
+    group_by = group_by or []
+    clauses, params = [], []
+    if filters.session_id is not None:
+        clauses.append("session_id = ?")
+        params.append(filters.session_id)
+    if filters.scenario is not None:
+        clauses.append("scenario = ?")
+        params.append(filters.scenario)
+    if filters.since is not None:
+        clauses.append("hour >= ?")
+        params.append(_ts_param(filters.since)[:13] + ":00:00")
+    if filters.until is not None:
+        clauses.append("hour < ?")
+        params.append(_ts_param(filters.until))
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    keys = ", ".join(["substr(hour, 1, ?)"] + group_by)
+    table = "inference_session_rollups" if filters.session_id is not None or "session_id" in group_by else "inference_rollups"
+    sql = (f"SELECT {keys}, SUM(n), SUM(n_success), SUM(sum_proba) FROM {table}{where} "
+           f"GROUP BY {', '.join(str(i + 1) for i in range(len(group_by) + 1))} ORDER BY 1")
+    with _db_pool.connection(DB_PATH) as conn:
+        rows = conn.execute(sql, [STATS_BUCKETS[bucket]] + params).fetchall()
+    out = []
+    for row in rows:
+        n, n_success, sum_proba = row[-3:]
+        item = {"bucket": row[0]}
+        for i, col in enumerate(group_by):
+            # session_id absent stocké en '' dans la clé des agrégats
+            item[col] = row[i + 1] if col != "session_id" or row[i + 1] else None
+        item.update({"n": n, "n_success": n_success, "success_rate": n_success / n, "mean_proba": sum_proba / n})
+        out.append(item)
+    return out
+
+# =========================
+# Rétention du journal (archives Parquet)
+# =========================
+# Une partition par jour : <archive>/date=YYYY-MM-DD/part-<id min>-<id max>.parquet,
+# lignes triées par id, input_json restitué (indépendant de feature_codes).
+# pyarrow n'est importé que pour écrire ou lire des archives.
+ARCHIVE_ROW_GROUP = int(os.environ.get("ARCHIVE_ROW_GROUP", "50000"))
+ARCHIVE_VACUUM_PAGES = int(os.environ.get("ARCHIVE_VACUUM_PAGES", "2000"))
+
+def archive_dir() -> Path:
+    return Path(ARCHIVE_DIR) if ARCHIVE_DIR else DB_PATH.with_name(DB_PATH.stem + "_archive")
+
+def _archive_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("ts", pa.string()),
+        ("session_id", pa.string()),
+        ("scenario", pa.string()),
+        ("input_json", pa.string()),
+        ("pred_label", pa.int8()),
+        ("pred_proba", pa.float64()),
+    ])
+
+def archive_partitions(since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Path]:
+    """Fichiers des jours qui recoupent [since, until), dans l'ordre des id (élagage par nom de partition)."""
+    root = archive_dir()
+    if not root.is_dir():
+        return []
+    lo = _ts_param(since)[:10] if since is not None else None
+    hi = _ts_param(until) if until is not None else None
+    files = []
+    for part in sorted(root.glob("date=*")):
+        day = part.name[len("date="):]
+        if (lo is not None and day < lo) or (hi is not None and day + "T00:00:00" >= hi):
+            continue
+        files.extend(sorted(part.glob("part-*.parquet")))
+    return files
+
+def _archive_expression(filters: InferenceFilters):
+    import pyarrow.dataset as ds
+    expr = None
+    for cond in (
+        ds.field("session_id") == filters.session_id if filters.session_id is not None else None,
+        ds.field("scenario") == filters.scenario if filters.scenario is not None else None,
+        ds.field("pred_label") == int(filters.label) if filters.label is not None else None,
+        ds.field("ts") >= _ts_param(filters.since) if filters.since is not None else None,
+        ds.field("ts") < _ts_param(filters.until) if filters.until is not None else None,
+    ):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    return expr
+
+def iter_archive(filters: InferenceFilters, fields: List[str], chunk_size: int = 1000):
+    """
+    Lignes archivées (ordre des id croissant) : partitions élaguées par
+    since/until, filtres poussés au lecteur Parquet (statistiques des row
+    groups), seules les colonnes demandées sont lues.
+    """
+    files = archive_partitions(filters.since, filters.until)
+    if not files:
+        return
+    import pyarrow.dataset as ds
+    expr = _archive_expression(filters)
+    for path in files:
+        dataset = ds.dataset(str(path), format="parquet", schema=_archive_schema())
+        for batch in dataset.to_batches(columns=fields, filter=expr, batch_size=chunk_size, use_threads=False):
+            yield from batch.to_pylist()
+
+def _write_archive_day(day: str, rows) -> Optional[tuple]:
+    """Écrit les lignes d'un jour dans une partition ; renvoie (chemin, nb lignes, id max)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _archive_schema()
+    part = archive_dir() / f"date={day}"
+    part.mkdir(parents=True, exist_ok=True)
+    tmp = part / f".part-{uuid.uuid4().hex}.tmp"
+    n, ids, chunk = 0, [], []
+    writer = pq.ParquetWriter(str(tmp), schema, compression="zstd")
+    try:
+        for row in itertools.chain(rows, [None]):
+            if row is not None:
+                chunk.append(row)
+            if chunk and (row is None or len(chunk) >= ARCHIVE_ROW_GROUP):
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                n += len(chunk)
+                ids = [ids[0] if ids else chunk[0]["id"], chunk[-1]["id"]]
+                chunk = []
+    finally:
+        writer.close()
+    if not n:
+        tmp.unlink()
+        return None
+    # Nom déterministe : une reprise après interruption réécrit le même fichier
+    target = part / f"part-{ids[0]:012d}-{ids[1]:012d}.parquet"
+    os.replace(tmp, target)
+    return target, n, ids[1]
+
+def archive_inference_log(retention_days: Optional[int] = None, now: Optional[datetime] = None) -> dict:
+    """
+    Déplace les jours entiers plus anciens que la fenêtre chaude (retention_days,
+    défaut RETENTION_DAYS) vers des partitions Parquet, les supprime de SQLite
+    (un jour par transaction) puis libère les pages par vacuum incrémental.
+    Les agrégats horaires et les compteurs de dérive sont conservés.
+    """
+    days = RETENTION_DAYS if retention_days is None else retention_days
+    if days <= 0:
+        raise ValueError("Retention is disabled (RETENTION_DAYS <= 0)")
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=days)).date().isoformat()
+    stats = {"days": 0, "rows": 0, "files": [], "freed_pages": 0, "incremental_vacuum": False}
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        while True:
+            first = conn.execute("SELECT MIN(ts) FROM inferences WHERE ts < ?", (cutoff,)).fetchone()[0]
+            if first is None:
+                break
+            day = first[:10]
+            start, end = day + "T00:00:00", (date.fromisoformat(day) + timedelta(days=1)).isoformat() + "T00:00:00"
+            filters = InferenceFilters(since=start, until=end)
+            written = _write_archive_day(day, db_query(filters, INFERENCE_COLUMNS, descending=False,
+                                                       chunk_size=ARCHIVE_ROW_GROUP))
+            if written is None:
+                break
+            path, n, last_id = written
+            with conn:
+                conn.execute("DELETE FROM inferences WHERE ts >= ? AND ts < ? AND id <= ?", (start, end, last_id))
+            stats["days"] += 1
+            stats["rows"] += n
+            stats["files"].append(str(path))
+        # auto_vacuum=INCREMENTAL (2) : pages libres rendues au système par tranches
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            stats["incremental_vacuum"] = True
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            remaining = before
+            while remaining:
+                conn.execute(f"PRAGMA incremental_vacuum({ARCHIVE_VACUUM_PAGES})").fetchall()
+                left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if left >= remaining:
+                    break
+                remaining = left
+            stats["freed_pages"] = before - remaining
+    finally:
+        conn.close()
+    return stats
 
 # =========================
 # Sélection du scénario
@@ -106,228 +1404,1946 @@ def select_scenario(payload: dict) -> str:
     else:
         return "S4"
 
-_loaded_models: Dict[str, Any] = {}
-
-def get_model(scenario: str):
-    if scenario not in MODELS:
-        raise ValueError(f"Unknown scenario: {scenario}")
-    if scenario not in _loaded_models:
-        path = MODELS[scenario]
-        if not path.exists():
-            raise FileNotFoundError(f"Model missing for {scenario}: {path}")
-        _loaded_models[scenario] = joblib.load(path)
-    return _loaded_models[scenario]
-
-class PredictIn(BaseModel):
-    payload: Dict[str, Any] = Field(..., description="Features élève (G1/G2 optionnels)")
-    session_id: Optional[str] = Field(None, description="ID session/utilisateur")
+# =========================
+# Encodeur précompilé
+# =========================
+COMPILED_FORMAT = "student-compiled-lr/1"
 
-class PredictOut(BaseModel):
-    scenario: str
-    pred_label: int
-    pred_proba: float
-    latency_ms: float
+class CompiledModel:
+    """
+    Version "aplatie" d'un pipeline ColumnTransformer(OneHotEncoder + passthrough)
+    + LogisticRegression binaire : feature → index de colonne, plus le vecteur
+    de coefficients. Un payload (dict) est scoré par un produit scalaire NumPy,
+    sans DataFrame ni ColumnTransformer.
+    """
 
-@app.on_event("startup")
-def startup():
-    db_init()
+    def __init__(self, n_columns: int, cat_index: Dict[str, Dict[Any, int]],
+                 num_index: Dict[str, int], coef, intercept: float):
+        self.n_columns = n_columns
+        self.cat_index = cat_index
+        self.num_index = num_index
+        self.coef = np.asarray(coef, dtype=float)
+        self.intercept = float(intercept)
 
-@app.get("/health")
-def health():
-    return {
-        "status": "ok",
-        "models": {
-            k: {"path": str(p), "exists": p.exists(), "loaded": (k in _loaded_models)}
-            for k, p in MODELS.items()
-        },
-        "db_path": str(DB_PATH),
-        "data_path": str(DATA_PATH),
-        "data_exists": DATA_PATH.exists(),
-        "mlflow_uri": MLFLOW_TRACKING_URI,
-    }
+    def _fill(self, x, features: dict):
+        for col, mapping in self.cat_index.items():
+            j = mapping.get(features.get(col))
+            if j is not None:  # catégorie inconnue → ignorée (handle_unknown="ignore")
+                x[j] = 1.0
+        for col, j in self.num_index.items():
+            x[j] = float(features[col])
 
-@app.post("/predict", response_model=PredictOut)
-def predict(inp: PredictIn):
-    t0 = time.time()
+    def encode(self, features: dict):
+        x = np.zeros(self.n_columns)
+        self._fill(x, features)
+        return x
 
-    scenario = select_scenario(inp.payload)
-    model = get_model(scenario)
+    def score(self, x) -> float:
+        z = float(np.dot(self.coef, x)) + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
 
-    full_payload = FEATURE_TEMPLATE.copy()
-    full_payload.update(inp.payload)
-    
-    for col in SCENARIOS_CONFIG[scenario]["exclude"]:
-        full_payload.pop(col, None)
+    def predict_proba_one(self, features: dict) -> float:
+        return self.score(self.encode(features))
 
-    try:
-        X = pd.DataFrame([full_payload])
-        proba = float(model.predict_proba(X)[0, 1])
-        label = int(proba >= 0.5)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Bad input payload: {e}")
+    def predict_proba_many(self, rows: List[dict]):
+        X = np.zeros((len(rows), self.n_columns))
+        for i, features in enumerate(rows):
+            self._fill(X[i], features)
+        return 1.0 / (1.0 + np.exp(-(X @ self.coef + self.intercept)))
 
-    latency_ms = (time.time() - t0) * 1000.0
+    def to_dict(self) -> dict:
+        # Catégories en paires [valeur, index] : le type JSON de la valeur est conservé
+        return {
+            "format": COMPILED_FORMAT,
+            "n_columns": self.n_columns,
+            "cat_index": {col: [[c, j] for c, j in m.items()] for col, m in self.cat_index.items()},
+            "num_index": self.num_index,
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+        }
 
-    try:
-        db_log(inp.payload, label, proba, inp.session_id, scenario)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Logging failure: {e}")
+    @classmethod
+    def from_dict(cls, data: dict) -> "CompiledModel":
+        if data.get("format") != COMPILED_FORMAT:
+            raise ValueError(f"Unsupported compiled model format: {data.get('format')}")
+        cat_index = {col: {c: j for c, j in pairs} for col, pairs in data["cat_index"].items()}
+        return cls(data["n_columns"], cat_index, data["num_index"], data["coef"], data["intercept"])
 
-    return {"scenario": scenario, "pred_label": label, "pred_proba": proba, "latency_ms": float(latency_ms)}
+def compiled_path(model_path: Path) -> Path:
+    """Artefact compilé associé à un modèle joblib (model_s2.joblib → model_s2.compiled.json)."""
+    return model_path.with_suffix(".compiled.json")
 
-@app.get("/inferences")
-def inferences(limit: int = 50):
-    try:
-        df = db_read(limit)
-        return {"inferences": df.to_dict(orient="records")}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def load_compiled(path: Path) -> CompiledModel:
+    with open(path) as f:
+        return CompiledModel.from_dict(json.load(f))
 
-@app.post("/upload-data")
-async def upload_data(file: UploadFile = File(...)):
+def compile_pipeline(pipe) -> Optional[CompiledModel]:
     """
-    Upload un nouveau fichier CSV pour remplacer les données d'entraînement.
-    Le fichier doit contenir les colonnes nécessaires + G3 pour calculer 'success'.
+    Compile un pipeline entraîné en CompiledModel.
+    Retourne None si la structure n'est pas supportée (on reste alors sur le pipeline).
     """
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Le fichier doit être un CSV")
-    
     try:
-        content = await file.read()
-        temp_path = APP_DIR / "temp_upload.csv"
-        with open(temp_path, "wb") as f:
-            f.write(content)
-        
-        df = pd.read_csv(temp_path)
-        
-        required_cols = ["G3"]
-        missing = [c for c in required_cols if c not in df.columns]
-        if missing:
-            temp_path.unlink()
-            raise HTTPException(status_code=400, detail=f"Colonnes manquantes: {missing}")
-        
-        if "success" not in df.columns:
-            df["success"] = (df["G3"] >= 10).astype(int)
-        
-        DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(DATA_PATH, index=False)
-        temp_path.unlink()
-        
-        return {
-            "status": "uploaded",
-            "filename": file.filename,
-            "rows": len(df),
-            "columns": list(df.columns),
-            "success_distribution": {
-                "success": int(df["success"].sum()),
-                "failure": int(len(df) - df["success"].sum())
-            },
-            "message": "Fichier uploadé. Appelez /train pour réentraîner les modèles."
-        }
-        
-    except pd.errors.ParserError as e:
-        raise HTTPException(status_code=400, detail=f"Erreur de parsing CSV: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur: {e}")
+        pre = pipe.steps[0][1]
+        clf = pipe.steps[-1][1]
+        if len(pipe.steps) != 2 or not hasattr(pre, "transformers_"):
+            return None
+        if getattr(clf, "coef_", None) is None or clf.coef_.shape[0] != 1 or len(clf.classes_) != 2:
+            return None
+
+        cat_index: Dict[str, Dict[Any, int]] = {}
+        num_index: Dict[str, int] = {}
+        offset = 0
+        for name, trans, cols in pre.transformers_:
+            if trans == "drop" or len(cols) == 0:
+                continue
+            if hasattr(trans, "categories_"):
+                # OneHotEncoder sans drop ni catégories rares
+                if getattr(trans, "drop_idx_", None) is not None or trans.handle_unknown != "ignore":
+                    return None
+                if getattr(trans, "infrequent_categories_", None):
+                    return None
+                for col, cats in zip(cols, trans.categories_):
+                    cat_index[col] = {c: offset + k for k, c in enumerate(cats.tolist())}
+                    offset += len(cats)
+            elif trans == "passthrough" or getattr(trans, "func", 0) is None:
+                for col in cols:
+                    num_index[col] = offset
+                    offset += 1
+            else:
+                return None
+
+        if offset != clf.coef_.shape[1]:
+            return None
+        return CompiledModel(offset, cat_index, num_index, clf.coef_[0], clf.intercept_[0])
+    except Exception:
+        return None
+
+# =========================
+# Registre de modèles versionné
+# =========================
+# Chaque entraînement crée un répertoire REGISTRY_DIR/<version>/ ; la version
+# active est désignée par manifest.json (écrit de façon atomique). La version
+# "baseline" correspond aux fichiers models/model_s*.joblib livrés avec l'image.
+REGISTRY_DIR = Path(os.environ.get("MODEL_REGISTRY_DIR", str(ROOT / "models" / "registry")))
+BASELINE_VERSION = "baseline"
 
-@app.post("/train")
-def train():
+class ModelSet:
     """
-    Réentraîne les 3 modèles (S2, S3, S4) avec validation croisée.
-    Log les métriques ET les modèles dans MLflow.
+    Modèles S2/S3/S4 d'une version. Le jeu actif est remplacé d'un bloc
+    (affectation d'une référence) : une requête qui a lu current_models()
+    utilise une seule version du début à la fin.
+    Le chargement est "single-flight" : des requêtes concurrentes sur un
+    modèle pas encore chargé attendent un unique joblib.load.
+    En SERVING_ONLY, seul l'artefact compilé est chargé : models[scénario]
+    est alors le CompiledModel lui-même.
     """
-    import numpy as np
-    from sklearn.model_selection import StratifiedKFold, cross_validate
-    from sklearn.linear_model import LogisticRegression
-    from sklearn.pipeline import Pipeline
-    from sklearn.compose import ColumnTransformer
-    from sklearn.preprocessing import OneHotEncoder
-    
-    # Essayer d'importer MLflow
-    mlflow_available = False
-    mlflow = None
-    try:
-        import mlflow as mlflow_module
-        mlflow = mlflow_module
-        mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
-        mlflow_available = True
-    except Exception:
-        pass
-    
+
+    def __init__(self, version: str, paths: Dict[str, Path]):
+        self.version = version
+        self.paths = paths
+        self.models: Dict[str, Any] = {}
+        self.compiled: Dict[str, Optional[CompiledModel]] = {}
+        self.load_ms: Dict[str, float] = {}
+        self.warmup_ms: Dict[str, float] = {}
+        self._locks = {sc: threading.Lock() for sc in paths}
+
+    def get_model(self, scenario: str):
+        if scenario not in self.paths:
+            raise ValueError(f"Unknown scenario: {scenario}")
+        model = self.models.get(scenario)
+        if model is not None:
+            return model
+        with self._locks[scenario]:
+            if scenario not in self.models:
+                path = compiled_path(self.paths[scenario]) if SERVING_ONLY else self.paths[scenario]
+                if not path.exists():
+                    raise FileNotFoundError(f"Model missing for {scenario}: {path}")
+                t0 = time.time()
+                if SERVING_ONLY:
+                    model = load_compiled(path)
+                    self.compiled[scenario] = model
+                else:
+                    import joblib
+                    model = joblib.load(path, mmap_mode="r" if MODEL_MMAP else None)
+                    self.compiled[scenario] = compile_pipeline(model)
+                self.load_ms[scenario] = (time.time() - t0) * 1000.0
+                self.models[scenario] = model
+        return self.models[scenario]
+
+    def get_compiled(self, scenario: str) -> Optional[CompiledModel]:
+        """Encodeur précompilé du scénario (None si mode pipeline ou non supporté)."""
+        if INFERENCE_MODE != "compiled":
+            return None
+        self.get_model(scenario)
+        return self.compiled.get(scenario)
+
+    def warm(self, scenario: str):
+        """Charge le modèle et exécute une prédiction factice construite depuis FEATURE_TEMPLATE."""
+        model = self.get_model(scenario)
+        t0 = time.time()
+        features = build_features(FEATURE_TEMPLATE, scenario)
+        if not SERVING_ONLY:
+            import pandas as pd
+            model.predict_proba(pd.DataFrame([features]))
+        compiled = self.compiled.get(scenario)
+        if compiled is not None:
+            compiled.predict_proba_one(features)
+        self.warmup_ms[scenario] = (time.time() - t0) * 1000.0
+
+    def load_all(self, warm: bool = True) -> "ModelSet":
+        """Charge (et préchauffe) les scénarios en parallèle."""
+        with ThreadPoolExecutor(max_workers=len(self.paths)) as pool:
+            list(pool.map(self.warm if warm else self.get_model, self.paths))
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return all(sc in self.warmup_ms for sc in self.paths)
+
+def _version_paths(version: str) -> Dict[str, Path]:
+    if version == BASELINE_VERSION:
+        return dict(MODELS)
+    return {sc: REGISTRY_DIR / version / p.name for sc, p in MODELS.items()}
+
+def _write_json_atomic(path: Path, data: dict):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_manifest() -> dict:
+    path = REGISTRY_DIR / "manifest.json"
+    if not path.exists():
+        return {"active": BASELINE_VERSION, "history": []}
+    with open(path) as f:
+        return json.load(f)
+
+def list_versions() -> List[dict]:
+    versions = [{"version": BASELINE_VERSION, "created_at": None}]
+    if REGISTRY_DIR.exists():
+        for d in sorted(REGISTRY_DIR.iterdir()):
+            meta = d / "meta.json"
+            if d.is_dir() and meta.exists():
+                with open(meta) as f:
+                    versions.append(json.load(f))
+    return versions
+
+def save_version(pipes: Dict[str, Any], meta: dict, drift_profile: Optional[dict] = None,
+                 feature_schema: Optional[dict] = None) -> str:
+    """Écrit une nouvelle version dans le registre (répertoire temporaire puis renommage atomique)."""
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_dir = REGISTRY_DIR / f".tmp-{version}"
+    tmp_dir.mkdir()
+    import joblib
+    for scenario, pipe in pipes.items():
+        path = tmp_dir / MODELS[scenario].name
+        joblib.dump(pipe, path)
+        # Artefact chargé par les instances SERVING_ONLY
+        compiled = compile_pipeline(pipe)
+        if compiled is not None:
+            _write_json_atomic(compiled_path(path), compiled.to_dict())
+    if drift_profile is not None:
+        _write_json_atomic(tmp_dir / DRIFT_PROFILE_NAME, drift_profile)
+    if feature_schema is not None:
+        _write_json_atomic(tmp_dir / FEATURE_SCHEMA_NAME, feature_schema)
+    _write_json_atomic(tmp_dir / "meta.json", {"version": version, "created_at": _now(), **meta})
+    os.replace(tmp_dir, REGISTRY_DIR / version)
+    return version
+
+_registry_lock = threading.Lock()
+
+def _check_version(version: str):
+    if version != BASELINE_VERSION and not (REGISTRY_DIR / version / "meta.json").exists():
+        raise KeyError(f"Unknown model version: {version}")
+
+def _commit_manifest(manifest: dict, model_set: ModelSet):
+    """Écrit le manifeste puis bascule le jeu actif (appelé sous _registry_lock)."""
+    global _active_models
+    manifest["updated_at"] = _now()
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    _write_json_atomic(REGISTRY_DIR / "manifest.json", manifest)
+    _active_models = model_set
+    _prediction_cache.clear()
+
+def promote_version(version: str) -> ModelSet:
+    """Active une version : les 3 modèles sont chargés AVANT la bascule."""
+    _check_version(version)
+    model_set = ModelSet(version, _version_paths(version)).load_all()
+    with _registry_lock:
+        manifest = read_manifest()
+        if manifest["active"] != version:
+            manifest["history"].append(manifest["active"])
+        manifest["active"] = version
+        _commit_manifest(manifest, model_set)
+    return model_set
+
+def rollback_version() -> ModelSet:
+    """Revient à la version active précédente (pile "history" du manifeste)."""
+    with _registry_lock:
+        manifest = read_manifest()
+        if not manifest["history"]:
+            raise ValueError("No previous model version to roll back to")
+        previous = manifest["history"].pop()
+        model_set = ModelSet(previous, _version_paths(previous)).load_all()
+        manifest["active"] = previous
+        _commit_manifest(manifest, model_set)
+    return model_set
+
+def _model_set_from_manifest() -> ModelSet:
+    version = read_manifest()["active"]
+    return ModelSet(version, _version_paths(version))
+
+_active_models: ModelSet = _model_set_from_manifest()
+
+def refresh_active_models(load: bool = False) -> bool:
+    """
+    Aligne le jeu actif sur le manifeste (ex. promotion faite par un autre
+    processus). Avec load=True, la nouvelle version est chargée avant la bascule.
+    """
+    global _active_models
+    version = read_manifest()["active"]
+    if version == _active_models.version:
+        return False
+    model_set = ModelSet(version, _version_paths(version))
+    if load:
+        model_set.load_all()
+    with _registry_lock:
+        _active_models = model_set
+    _prediction_cache.clear()
+    return True
+
+# En multi-processus (serve.py), une promotion faite par un worker est
+# propagée aux autres par le manifeste : chaque worker le surveille.
+MODEL_RELOAD_INTERVAL_S = float(os.environ.get("MODEL_RELOAD_INTERVAL_S", "2"))
+
+class ManifestWatcher:
+    """Thread qui recharge la version active quand manifest.json change (mtime)."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._mtime: Optional[float] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def _manifest_mtime(self) -> Optional[float]:
+        try:
+            return (REGISTRY_DIR / "manifest.json").stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def start(self):
+        if self.interval_s <= 0 or (self.thread is not None and self.thread.is_alive()):
+            return
+        self._stop.clear()
+        self._mtime = self._manifest_mtime()
+        self.thread = threading.Thread(target=self._run, name="manifest-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            mtime = self._manifest_mtime()
+            if mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            try:
+                if refresh_active_models(load=True):
+                    logger.info("Model version switched to %s", current_models().version)
+            except Exception:
+                logger.exception("Model reload failed, keeping %s", current_models().version)
+
+_manifest_watcher = ManifestWatcher(MODEL_RELOAD_INTERVAL_S)
+
+def current_models() -> ModelSet:
+    return _active_models
+
+def get_model(scenario: str):
+    return current_models().get_model(scenario)
+
+def get_compiled_model(scenario: str) -> Optional[CompiledModel]:
+    return current_models().get_compiled(scenario)
+
+def build_features(payload: dict, scenario: str) -> dict:
+    """Complète le payload avec FEATURE_TEMPLATE et retire les colonnes exclues du scénario."""
+    full_payload = FEATURE_TEMPLATE.copy()
+    full_payload.update(payload)
+    for col in SCENARIOS_CONFIG[scenario]["exclude"]:
+        full_payload.pop(col, None)
+    return full_payload
+
+# =========================
+# Cache des prédictions
+# =========================
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))  # 0 = désactivé
+PREDICTION_CACHE_TTL_S = float(os.environ.get("PREDICTION_CACHE_TTL_S", "300"))
+
+class PredictionCache:
+    """
+    Cache LRU avec TTL des probabilités, indexé par un hash canonique du
+    payload complété (après FEATURE_TEMPLATE et exclusions du scénario)
+    et de la version de modèle.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(version: str, scenario: str, features: dict) -> str:
+        # Les features sont déjà typées par FeaturePayload (12 → 12.0) : pas de normalisation
+        raw = json.dumps([version, scenario, features], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[float]:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, proba: float):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self.entries[key] = (proba, time.monotonic() + self.ttl_s)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+_prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S)
+
+# =========================
+# Dérive des entrées
+# =========================
+# Profil de référence calculé à l'entraînement (drift_profile.json dans le
+# répertoire de la version, models/drift_profile.json pour la baseline) :
+# histogramme par feature numérique, fréquences par catégorie. Chaque requête
+# incrémente les compteurs (version, scénario, feature, bin) en mémoire ; les
+# deltas sont écrits dans drift_counts avec les lots du journal. /drift compare
+# les compteurs au profil (PSI, KS) sans relire le journal.
+DRIFT_PROFILE_NAME = "drift_profile.json"
+DRIFT_MAX_BINS = int(os.environ.get("DRIFT_MAX_BINS", "10"))
+DRIFT_PSI_WARN = float(os.environ.get("DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.environ.get("DRIFT_PSI_ALERT", "0.25"))
+DRIFT_MIN_COUNT = int(os.environ.get("DRIFT_MIN_COUNT", "30"))
+
+def build_drift_profile(df: "pd.DataFrame") -> dict:
+    """Profil de référence des features du template sur les données d'entraînement."""
+    features = {}
+    for name, default in FEATURE_TEMPLATE.items():
+        if name not in df.columns:
+            continue
+        if isinstance(default, str):
+            values = df[name].astype(str)
+            categories = sorted(values.unique().tolist())
+            counts = values.value_counts()
+            features[name] = {"kind": "cat", "categories": categories,
+                              "counts": [int(counts.get(c, 0)) for c in categories] + [0]}
+        else:
+            values = df[name].astype(float).to_numpy()
+            uniques = np.unique(values)
+            if len(uniques) <= DRIFT_MAX_BINS:
+                edges = uniques  # une valeur par bin
+            else:
+                edges = np.unique(np.quantile(values, np.linspace(0, 1, DRIFT_MAX_BINS + 1)[1:-1]))
+            bins = np.searchsorted(edges, values, side="right")  # = bisect_right
+            features[name] = {"kind": "num", "edges": edges.tolist(),
+                              "counts": np.bincount(bins, minlength=len(edges) + 1).tolist()}
+    return {"created_at": _now(), "n_samples": int(len(df)), "features": features}
+
+def drift_profile_path(version: str) -> Path:
+    if version == BASELINE_VERSION:
+        return ROOT / "models" / DRIFT_PROFILE_NAME
+    return REGISTRY_DIR / version / DRIFT_PROFILE_NAME
+
+class DriftMonitor:
+    """Compteurs de dérive par (version, scénario, feature, bin), mis à jour en O(1) par requête."""
+
+    N_KEY = "__requests__"  # nombre de requêtes observées (bin 0)
+
+    def __init__(self):
+        self.pending: Dict[tuple, int] = {}
+        self._binners: Dict[str, Optional[Dict[str, list]]] = {}
+        self._lock = threading.Lock()
+
+    def binners(self, version: str) -> Optional[Dict[str, list]]:
+        """Par scénario : [(feature, bisect sur edges | index des catégories)] ; None sans profil."""
+        if version not in self._binners:
+            path = drift_profile_path(version)
+            binners = None
+            if path.exists():
+                with open(path) as f:
+                    profile = json.load(f)["features"]
+                binners = {}
+                for scenario, cfg in SCENARIOS_CONFIG.items():
+                    binners[scenario] = [
+                        (name, spec["edges"], None) if spec["kind"] == "num"
+                        else (name, None, {c: i for i, c in enumerate(spec["categories"])})
+                        for name, spec in profile.items() if name not in cfg["exclude"]
+                    ]
+            self._binners[version] = binners
+        return self._binners[version]
+
+    def observe(self, version: str, scenario: str, features: dict):
+        binners = self.binners(version)
+        if binners is None:
+            return
+        keys = [(version, scenario, self.N_KEY, 0)]
+        for name, edges, index in binners[scenario]:
+            v = features.get(name)
+            if edges is not None:
+                if isinstance(v, (int, float)):
+                    keys.append((version, scenario, name, bisect_right(edges, v)))
+            else:
+                keys.append((version, scenario, name, index.get(v, len(index))))  # dernier bin : hors référence
+        with self._lock:
+            for key in keys:
+                self.pending[key] = self.pending.get(key, 0) + 1
+
+    def flush(self, conn: sqlite3.Connection):
+        """Écrit les deltas en attente (dans la transaction de l'appelant)."""
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            conn.executemany(
+                "INSERT INTO drift_counts (version, scenario, feature, bin, count) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (version, scenario, feature, bin) DO UPDATE SET count = count + excluded.count",
+                [(*key, n) for key, n in pending.items()],
+            )
+        except Exception:
+            with self._lock:
+                for key, n in pending.items():
+                    self.pending[key] = self.pending.get(key, 0) + n
+            raise
+
+_drift_monitor = DriftMonitor()
+
+def flush_drift():
+    """Écrit les compteurs de dérive en attente, hors writer (arrêt, mode sync, lecture de /drift)."""
+    with _db_pool.connection(DB_PATH) as conn:
+        with conn:
+            _drift_monitor.flush(conn)
+
+def _psi(ref: List[float], live: List[float], floor: float = 1e-4) -> float:
+    return float(sum((q - p) * math.log(q / p) for p, q in ((max(p, floor), max(q, floor)) for p, q in zip(ref, live))))
+
+def _ks(ref: List[float], live: List[float]) -> float:
+    cum_ref = cum_live = ks = 0.0
+    for p, q in zip(ref, live):
+        cum_ref += p
+        cum_live += q
+        ks = max(ks, abs(cum_ref - cum_live))
+    return ks
+
+def drift_report(version: str, scenario: Optional[str] = None) -> dict:
+    """Scores par scénario et par feature, depuis drift_counts et le profil de référence."""
+    path = drift_profile_path(version)
+    if not path.exists():
+        raise FileNotFoundError(f"No drift profile for model version {version}")
+    with open(path) as f:
+        profile = json.load(f)
+    flush_drift()
+    with _db_pool.connection(DB_PATH) as conn:
+        params: list = [version]
+        sql = "SELECT scenario, feature, bin, count FROM drift_counts WHERE version = ?"
+        if scenario is not None:
+            sql += " AND scenario = ?"
+            params.append(scenario)
+        counts: Dict[str, Dict[str, Dict[int, int]]] = {}
+        for sc, feature, b, n in conn.execute(sql, params):
+            counts.setdefault(sc, {}).setdefault(feature, {})[b] = n
+
+    scenarios = {}
+    for sc in ([scenario] if scenario else SCENARIOS_CONFIG):
+        sc_counts = counts.get(sc, {})
+        n_requests = sc_counts.get(DriftMonitor.N_KEY, {}).get(0, 0)
+        features = {}
+        for name, spec in profile["features"].items():
+            if name in SCENARIOS_CONFIG[sc]["exclude"]:
+                continue
+            ref_counts = spec["counts"]
+            live = sc_counts.get(name, {})
+            n_live = sum(live.values())
+            entry: Dict[str, Any] = {"n": n_live, "psi": None, "status": "insufficient_data"}
+            if spec["kind"] == "num":
+                entry["ks"] = None
+            if n_live >= DRIFT_MIN_COUNT:
+                n_ref = sum(ref_counts)
+                ref = [c / n_ref for c in ref_counts]
+                cur = [live.get(b, 0) / n_live for b in range(len(ref_counts))]
+                entry["psi"] = round(_psi(ref, cur), 6)
+                if spec["kind"] == "num":
+                    entry["ks"] = round(_ks(ref, cur), 6)
+                else:
+                    entry["unseen_share"] = round(cur[-1], 6)
+                entry["status"] = ("alert" if entry["psi"] >= DRIFT_PSI_ALERT
+                                   else "warn" if entry["psi"] >= DRIFT_PSI_WARN else "ok")
+            features[name] = entry
+        ranked = sorted((f for f in features if features[f]["psi"] is not None),
+                        key=lambda f: features[f]["psi"], reverse=True)
+        scenarios[sc] = {"n_requests": n_requests, "top_drift": ranked[:5], "features": features}
+    return {
+        "model_version": version,
+        "reference": {"created_at": profile.get("created_at"), "n_samples": profile.get("n_samples")},
+        "thresholds": {"psi_warn": DRIFT_PSI_WARN, "psi_alert": DRIFT_PSI_ALERT, "min_count": DRIFT_MIN_COUNT},
+        "scenarios": scenarios,
+    }
+
+# Schéma des payloads : domaines des catégories vues à l'entraînement, bornes
+# numériques observées élargies au domaine documenté du jeu UCI (une valeur
+# valide peut manquer dans l'échantillon, ex. G1 = 20). Écrit par /train dans
+# la version (feature_schema.json) ; models/feature_schema.json pour la baseline.
+FEATURE_SCHEMA_NAME = "feature_schema.json"
+DOCUMENTED_BOUNDS = {
+    "age": (15, 22),
+    "Medu": (0, 4),
+    "Fedu": (0, 4),
+    "traveltime": (1, 4),
+    "studytime": (1, 4),
+    "failures": (0, 4),
+    "famrel": (1, 5),
+    "freetime": (1, 5),
+    "goout": (1, 5),
+    "Dalc": (1, 5),
+    "Walc": (1, 5),
+    "health": (1, 5),
+    "absences": (0, 93),
+    "G1": (0, 20),
+    "G2": (0, 20),
+}
+
+def build_feature_schema(df: "pd.DataFrame", template: Optional[dict] = None) -> dict:
+    numeric, categorical = {}, {}
+    for col, default in (template or FEATURE_TEMPLATE).items():
+        if col not in df.columns:
+            continue
+        if isinstance(default, str):
+            categorical[col] = sorted(str(v) for v in df[col].dropna().unique())
+        else:
+            lo, hi = float(df[col].min()), float(df[col].max())
+            doc_lo, doc_hi = DOCUMENTED_BOUNDS.get(col, (lo, hi))
+            numeric[col] = {"min": float(min(lo, doc_lo)), "max": float(max(hi, doc_hi))}
+    return {"numeric": numeric, "categorical": categorical}
+
+def feature_schema_path(version: str) -> Path:
+    if version == BASELINE_VERSION:
+        return FEATURE_SCHEMA_PATH
+    return REGISTRY_DIR / version / FEATURE_SCHEMA_NAME
+
+def load_feature_schema(version: str) -> dict:
+    """Schéma d'une version (celui de la baseline pour les versions antérieures au schéma par version)."""
+    for path in (feature_schema_path(version), FEATURE_SCHEMA_PATH):
+        if path.exists():
+            with open(path, "r") as f:
+                return json.load(f)
+    return {}
+
+class PayloadBase(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    # Entiers JSON d'origine (avant conversion en float) : journalisés tels quels
+    _input_ints: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+def _reject_bool(value: Any) -> Any:
+    # float en mode lax accepte true/false (→ 1.0/0.0) : refusé pour une feature numérique
+    if isinstance(value, bool):
+        raise ValueError("booléen refusé : valeur numérique attendue")
+    return value
+
+NumericFeature = Annotated[float, BeforeValidator(_reject_bool)]
+
+def build_payload_model(template: dict, schema: dict) -> type:
+    """
+    Modèle pydantic des features élève : une énumération (Literal) par variable
+    catégorielle, un float borné par variable numérique (entier accepté, booléen
+    refusé). Toutes les features
+    sont facultatives (complétées par FEATURE_TEMPLATE) ; une valeur hors
+    domaine, null ou une clé inconnue donne une 422. Les valeurs validées ont
+    déjà le type attendu par le modèle (float / str).
+    """
+    fields: Dict[str, Any] = {}
+    for col, default in template.items():
+        if col in schema.get("categorical", {}):
+            fields[col] = (Literal[tuple(schema["categorical"][col])], None)
+        elif isinstance(default, str):
+            fields[col] = (str, None)
+        else:
+            bounds = schema.get("numeric", {}).get(col, {})
+            fields[col] = (NumericFeature, Field(None, ge=bounds.get("min"), le=bounds.get("max"), allow_inf_nan=False))
+    return create_model("FeaturePayload", __base__=PayloadBase, **fields)
+
+FEATURE_SCHEMA = load_feature_schema(BASELINE_VERSION)
+# Modèle de la baseline : documentation OpenAPI de /predict
+FeaturePayload = build_payload_model(FEATURE_TEMPLATE, FEATURE_SCHEMA)
+_payload_models: Dict[str, type] = {BASELINE_VERSION: FeaturePayload}
+_payload_models_lock = threading.Lock()
+
+def payload_model(version: Optional[str] = None) -> type:
+    """Modèle de payload de la version (défaut : active), construit une fois par version."""
+    version = version or current_models().version
+    model = _payload_models.get(version)
+    if model is None:
+        with _payload_models_lock:
+            model = _payload_models.get(version)
+            if model is None:
+                model = _payload_models[version] = build_payload_model(FEATURE_TEMPLATE, load_feature_schema(version))
+    return model
+
+def validate_payload(value: Any) -> BaseModel:
+    """Valide un payload avec le schéma de la version active (catégories vues par ses modèles)."""
+    payload = payload_model().model_validate(value)
+    if isinstance(value, dict):
+        payload._input_ints = {k: v for k, v in value.items() if type(v) is int}
+    return payload
+
+def payload_dict(payload: BaseModel) -> dict:
+    """Features effectivement envoyées (la présence de G1/G2 détermine le scénario)."""
+    return payload.model_dump(exclude_unset=True)
+
+def logged_payload(payload: BaseModel) -> dict:
+    """Payload journalisé : valeurs validées, entiers d'origine conservés (int_mask du journal compact)."""
+    return {**payload_dict(payload), **payload._input_ints}
+
+class PredictIn(BaseModel):
+    payload: FeaturePayload = Field(..., description="Features élève (G1/G2 optionnels)")
+    session_id: Optional[str] = Field(None, description="ID session/utilisateur")
+
+    @field_validator("payload", mode="wrap")
+    @classmethod
+    def _active_schema(cls, value, handler):
+        # Validé avec le schéma de la version active, pas celui de la baseline
+        return validate_payload(value)
+
+class PredictOut(BaseModel):
+    scenario: str
+    pred_label: int
+    pred_proba: float
+    latency_ms: float
+    model_version: str
+    cached: bool = False
+
+# Taille max d'un lot pour /predict/batch
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "10000"))
+
+class PredictBatchIn(BaseModel):
+    items: List[PredictIn] = Field(..., description="Liste de requêtes (payload + session_id)")
+    log: bool = Field(True, description="Journaliser les inférences dans SQLite")
+
+class PredictBatchItemOut(BaseModel):
+    scenario: str
+    pred_label: int
+    pred_proba: float
+
+class PredictBatchOut(BaseModel):
+    n_items: int
+    results: List[PredictBatchItemOut]
+    scenarios: Dict[str, Dict[str, Any]]
+    latency_ms: float
+    model_version: str
+
+@app.on_event("startup")
+def startup():
+    # Sous serve.py, la base et les modèles sont préparés une fois dans le parent
+    # avant le fork : les workers partagent les modèles en copy-on-write.
+    if not PREFORKED:
+        db_init()
+    refresh_active_models()
+    if not current_models().ready:
+        if MODEL_WARMUP == "sync":
+            current_models().load_all()
+        elif MODEL_WARMUP == "background":
+            threading.Thread(target=current_models().load_all, name="model-warmup", daemon=True).start()
+    if LOG_MODE == "async":
+        _log_writer.db_path = DB_PATH
+        _log_writer.start()
+    _manifest_watcher.start()
+    _metrics_writer.start()
+    COLD_START["startup_ms"] = _since_process_start_ms()
+
+@app.on_event("shutdown")
+def shutdown():
+    _manifest_watcher.stop()
+    _log_writer.close()
+    # Compteurs de dérive restants (writer arrêté ou jamais démarré : LOG_MODE=sync)
+    flush_drift()
+    _metrics_writer.stop()
+
+@app.get("/health")
+def health():
+    models = current_models()
+    return {
+        "status": "ok",
+        "ready": models.ready,
+        "model_version": models.version,
+        "models": {
+            k: {
+                "path": str(p),
+                "exists": p.exists(),
+                "loaded": (k in models.models),
+                "compiled": models.compiled.get(k) is not None,
+                "load_ms": models.load_ms.get(k),
+                "warmup_ms": models.warmup_ms.get(k),
+            }
+            for k, p in models.paths.items()
+        },
+        "inference_mode": INFERENCE_MODE,
+        "serving_only": SERVING_ONLY,
+        "cold_start": dict(COLD_START),
+        "admission": {
+            "limit": _admission.limit,
+            "in_flight": _admission.in_flight,
+            "queue_depth": _admission.waiting,
+            "queue_max": _admission.queue_max,
+            "admitted": _admission.admitted,
+            "rejected": dict(_admission.rejected),
+        },
+        "prediction_cache": {
+            "size": len(_prediction_cache.entries),
+            "maxsize": _prediction_cache.maxsize,
+            "ttl_s": _prediction_cache.ttl_s,
+            "hits": _prediction_cache.hits,
+            "misses": _prediction_cache.misses,
+        },
+        "db_path": str(DB_PATH),
+        "log_writer": {
+            "running": _log_writer.running,
+            "durability": _log_writer.durability,
+            "queue_depth": _log_writer.queue.qsize(),
+            **_log_writer.stats,
+        },
+        "data_path": str(DATA_PATH),
+        "data_exists": DATA_PATH.exists(),
+        "mlflow_uri": MLFLOW_TRACKING_URI,
+    }
+
+def _model_gauge():
+    models = current_models()
+    return [({"scenario": sc, "version": models.version}, int(sc in models.models)) for sc in models.paths]
+
+register_metric(CallbackMetric("student_api_model_loaded", "Modèle chargé (1) ou non (0)", _model_gauge))
+register_metric(CallbackMetric("student_api_model_ready", "Tous les modèles actifs chargés et préchauffés",
+                               lambda: [({}, int(current_models().ready))]))
+register_metric(CallbackMetric("student_api_log_queue_depth", "Éléments en attente dans la file de journalisation",
+                               lambda: [({}, _log_writer.queue.qsize())]))
+register_metric(CallbackMetric("student_api_prediction_cache_hits_total", "Prédictions servies par le cache",
+                               lambda: [({}, _prediction_cache.hits)], kind="counter"))
+register_metric(CallbackMetric("student_api_prediction_cache_misses_total", "Prédictions absentes du cache",
+                               lambda: [({}, _prediction_cache.misses)], kind="counter"))
+register_metric(CallbackMetric("student_api_log_rows_written_total", "Lignes écrites par le writer de journalisation",
+                               lambda: [({}, _log_writer.stats["rows_written"])], kind="counter"))
+register_metric(CallbackMetric("student_api_log_rejected_total", "Écritures refusées (file pleine)",
+                               lambda: [({}, _log_writer.stats["rejected"])], kind="counter"))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    merged = merged_metrics() if METRICS_DIR else {}
+    lines: List[str] = []
+    for metric in METRICS:
+        lines += metric.render(merged.get(metric.name))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# =========================
+# Contrôle d'admission des inférences
+# =========================
+# INFERENCE_CONCURRENCY inférences en parallèle au plus (0 = illimité), au plus
+# INFERENCE_QUEUE_MAX requêtes en attente, chacune au plus INFERENCE_QUEUE_TIMEOUT_MS ;
+# au-delà : 503 immédiat avec Retry-After.
+INFERENCE_CONCURRENCY = int(os.environ.get("INFERENCE_CONCURRENCY", "8"))
+INFERENCE_QUEUE_MAX = int(os.environ.get("INFERENCE_QUEUE_MAX", "64"))
+INFERENCE_QUEUE_TIMEOUT_MS = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT_MS", "200"))
+INFERENCE_RETRY_AFTER_S = int(os.environ.get("INFERENCE_RETRY_AFTER_S", "1"))
+
+class Overloaded(Exception):
+    """Requête refusée par le contrôle d'admission."""
+
+class AdmissionController:
+    """Sémaphore asyncio + file d'attente bornée avec délai maximal d'attente."""
+
+    def __init__(self, limit: int, queue_max: int, queue_timeout_ms: float):
+        self.limit = limit
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout_ms / 1000.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Un sémaphore asyncio est lié à une boucle d'événements
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem, self._loop = asyncio.Semaphore(self.limit), loop
+        return self._sem
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.limit <= 0:
+            yield
+            return
+        sem = self._semaphore()
+        t0 = time.perf_counter()
+        if sem.locked():
+            if self.waiting >= self.queue_max:
+                self.rejected["queue_full"] += 1
+                raise Overloaded(f"inference queue full ({self.queue_max} waiting)")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(sem.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected["timeout"] += 1
+                raise Overloaded(f"queued more than {self.queue_timeout * 1000:.0f} ms")
+            finally:
+                self.waiting -= 1
+        else:
+            await sem.acquire()
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="queue_wait")
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            sem.release()
+
+_admission = AdmissionController(INFERENCE_CONCURRENCY, INFERENCE_QUEUE_MAX, INFERENCE_QUEUE_TIMEOUT_MS)
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Service overloaded: {e}",
+                         headers={"Retry-After": str(INFERENCE_RETRY_AFTER_S)})
+
+register_metric(CallbackMetric("student_api_inference_in_flight", "Inférences en cours",
+                               lambda: [({}, _admission.in_flight)]))
+register_metric(CallbackMetric("student_api_inference_queue_depth", "Requêtes en attente d'admission",
+                               lambda: [({}, _admission.waiting)]))
+register_metric(CallbackMetric("student_api_inference_rejected_total", "Requêtes refusées (503) par motif",
+                               lambda: [({"reason": k}, v) for k, v in _admission.rejected.items()], kind="counter"))
+
+@app.post("/predict", response_model=PredictOut)
+async def predict(inp: PredictIn, request: Request):
+    # Étape "validation" : de la réception (middleware) au début du handler
+    timer = StageTimer(request.scope.get("state", {}).get("t_received"))
+    timer.lap("validation")
+    fmt = response_format(request)
+    try:
+        async with _admission.slot():
+            timer.t = time.perf_counter()
+            return wire_response(request, await run_in_threadpool(_predict, inp, timer), fmt=fmt)
+    except Overloaded as e:
+        raise _overloaded(e)
+
+def _predict(inp: PredictIn, timer: StageTimer) -> dict:
+    timer.lap("dispatch")
+    t0 = time.time()
+
+    payload = payload_dict(inp.payload)
+    scenario = select_scenario(payload)
+    timer.lap("select_scenario")
+    models = current_models()
+    model = models.get_model(scenario)
+    compiled = models.get_compiled(scenario)
+    timer.lap("model_lookup")
+
+    full_payload = build_features(payload, scenario)
+    timer.lap("merge")
+    _drift_monitor.observe(models.version, scenario, full_payload)
+    timer.lap("drift")
+
+    cache_key = PredictionCache.key(models.version, scenario, full_payload)
+    proba = _prediction_cache.get(cache_key)
+    timer.lap("cache_lookup")
+    cached = proba is not None
+
+    if not cached:
+        try:
+            if compiled is not None:
+                x = compiled.encode(full_payload)
+                timer.lap("encode")
+                proba = float(compiled.score(x))
+            else:
+                import pandas as pd
+                Xt = model[:-1].transform(pd.DataFrame([full_payload]))
+                timer.lap("encode")
+                proba = float(model[-1].predict_proba(Xt)[0, 1])
+            timer.lap("predict_proba")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Bad input payload: {e}")
+        _prediction_cache.put(cache_key, proba)
+    if COLD_START["first_prediction_ms"] is None:
+        COLD_START["first_prediction_ms"] = _since_process_start_ms()
+    label = int(proba >= 0.5)
+
+    latency_ms = (time.time() - t0) * 1000.0
+    PREDICTIONS_TOTAL.inc(scenario=scenario)
+
+    try:
+        db_log(logged_payload(inp.payload), label, proba, inp.session_id, scenario)
+    except LogQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Logging backpressure: {e}", headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Logging failure: {e}")
+    timer.lap("db_log")
+
+    return {
+        "scenario": scenario,
+        "pred_label": label,
+        "pred_proba": proba,
+        "latency_ms": float(latency_ms),
+        "model_version": models.version,
+        "cached": cached,
+    }
+
+@app.post("/predict/batch", response_model=PredictBatchOut)
+async def predict_batch(inp: PredictBatchIn, request: Request):
+    """
+    Score un lot de payloads : regroupement par scénario (S2/S3/S4),
+    un DataFrame et un seul predict_proba par groupe.
+    Les résultats sont renvoyés dans l'ordre d'entrée.
+    Un lot occupe une place du contrôle d'admission.
+    """
+    fmt = response_format(request)
+    try:
+        async with _admission.slot():
+            return wire_response(request, await run_in_threadpool(_predict_batch, inp), fmt=fmt)
+    except Overloaded as e:
+        raise _overloaded(e)
+
+def _predict_batch(inp: PredictBatchIn) -> dict:
+    t0 = time.time()
+    n = len(inp.items)
+    if n == 0:
+        raise HTTPException(status_code=400, detail="Lot vide")
+    if n > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Lot trop grand ({n} > {BATCH_MAX_ITEMS})")
+
+    # Regroupement par scénario en conservant les positions d'origine
+    groups: Dict[str, List[int]] = {}
+    payloads = [payload_dict(item.payload) for item in inp.items]
+    for i, payload in enumerate(payloads):
+        groups.setdefault(select_scenario(payload), []).append(i)
+
+    results: List[Optional[dict]] = [None] * n
+    timings: Dict[str, Dict[str, Any]] = {}
+    # Un seul jeu de modèles pour tout le lot (pas de mélange de versions)
+    models = current_models()
+
+    for scenario, idx in groups.items():
+        ts = time.time()
+        model = models.get_model(scenario)
+        compiled = models.get_compiled(scenario)
+        rows = [build_features(payloads[i], scenario) for i in idx]
+        for features in rows:
+            _drift_monitor.observe(models.version, scenario, features)
+        try:
+            if compiled is not None:
+                probas = compiled.predict_proba_many(rows)
+            else:
+                import pandas as pd
+                X = pd.DataFrame(rows)
+                probas = model.predict_proba(X)[:, 1]
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Bad input payload ({scenario}): {e}")
+        for i, p in zip(idx, probas):
+            p = float(p)
+            results[i] = {"scenario": scenario, "pred_label": int(p >= 0.5), "pred_proba": p}
+        timings[scenario] = {"n_items": len(idx), "latency_ms": (time.time() - ts) * 1000.0}
+        PREDICTIONS_TOTAL.inc(len(idx), scenario=scenario)
+
+    latency_ms = (time.time() - t0) * 1000.0
+
+    if inp.log:
+        try:
+            db_log_many([
+                (logged_payload(item.payload), res["pred_label"], res["pred_proba"], item.session_id, res["scenario"])
+                for item, res in zip(inp.items, results)
+            ])
+        except LogQueueFull as e:
+            raise HTTPException(status_code=503, detail=f"Logging backpressure: {e}", headers={"Retry-After": "1"})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Logging failure: {e}")
+
+    return {
+        "n_items": n,
+        "results": results,
+        "scenarios": timings,
+        "latency_ms": float(latency_ms),
+        "model_version": models.version,
+    }
+
+@app.get("/inferences")
+def inferences(
+    request: Request,
+    limit: int = Query(50, ge=1, le=INFERENCES_MAX_LIMIT),
+    before_id: Optional[int] = Query(None, description="Curseur : renvoie les lignes d'id < before_id"),
+    session_id: Optional[str] = None,
+    scenario: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="ts >= since (ISO 8601, UTC)"),
+    until: Optional[datetime] = Query(None, description="ts < until (ISO 8601, UTC)"),
+    label: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Colonnes séparées par des virgules (ex: id,ts,pred_proba)"),
+):
+    fmt = response_format(request)
+    filters = InferenceFilters(session_id=session_id, scenario=scenario, since=since, until=until, label=label)
+    try:
+        cols = _parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        rows = list(db_query(filters, cols, limit=limit, before_id=before_id))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    next_before_id = rows[-1]["id"] if len(rows) == limit else None
+    return wire_response(request, {"inferences": rows, "next_before_id": next_before_id}, fmt=fmt)
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "5000"))
+
+def _export_stream(filters: InferenceFilters, cols: List[str], fmt: str):
+    """Encode le journal par blocs de EXPORT_CHUNK_SIZE lignes (mémoire constante)."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(cols)
+    chunk: List[str] = []
+    # Jours archivés d'abord (id plus anciens), puis le journal SQLite
+    rows = itertools.chain(iter_archive(filters, cols, EXPORT_CHUNK_SIZE),
+                           db_query(filters, cols, descending=False, chunk_size=EXPORT_CHUNK_SIZE))
+    for row in rows:
+        if fmt == "csv":
+            writer.writerow([row[c] for c in cols])
+            if buf.tell() >= 1 << 16:
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+        else:
+            chunk.append(json.dumps(row, ensure_ascii=False))
+            if len(chunk) >= EXPORT_CHUNK_SIZE:
+                yield ("\n".join(chunk) + "\n").encode("utf-8")
+                chunk = []
+    if fmt == "csv":
+        if buf.tell():
+            yield buf.getvalue().encode("utf-8")
+    elif chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+@app.get("/inferences/export")
+def inferences_export(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    session_id: Optional[str] = None,
+    scenario: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    label: Optional[int] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Export complet du journal (ordre chronologique), en flux NDJSON ou CSV,
+    partitions Parquet archivées comprises. Mêmes filtres que /inferences.
+    """
+    filters = InferenceFilters(session_id=session_id, scenario=scenario, since=since, until=until, label=label)
+    try:
+        cols = _parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if archive_partitions(since, until):
+        try:
+            import pyarrow.dataset  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="pyarrow is required to read archived partitions")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"inferences.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        _export_stream(filters, cols, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/inferences/stats")
+def inferences_stats(
+    request: Request,
+    bucket: str = Query("hour", pattern="^(hour|day)$"),
+    group_by: Optional[str] = Query(None, description="scenario, session_id ou scenario,session_id"),
+    session_id: Optional[str] = None,
+    scenario: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Heure de début (ISO 8601, UTC), arrondie à l'heure"),
+    until: Optional[datetime] = Query(None, description="Heures commençant avant until (ISO 8601, UTC)"),
+):
+    """
+    Nombre de prédictions, taux de succès prédit et pred_proba moyenne par
+    tranche de temps, depuis les agrégats horaires (pas de lecture du journal).
+    """
+    fmt = response_format(request)
+    groups = [c.strip() for c in (group_by or "").split(",") if c.strip()]
+    unknown = [c for c in groups if c not in STATS_GROUPS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by: {unknown}")
+    groups = [c for c in STATS_GROUPS if c in groups]
+    filters = InferenceFilters(session_id=session_id, scenario=scenario, since=since, until=until)
+    stats = inference_stats(filters, bucket, groups)
+    return wire_response(request, {"bucket": bucket, "group_by": groups, "stats": stats}, fmt=fmt)
+
+@app.get("/drift")
+def drift(
+    scenario: Optional[str] = Query(None, pattern="^S[234]$"),
+    version: Optional[str] = Query(None, description="Version de modèle (défaut : version active)"),
+):
+    """
+    Dérive des entrées par scénario et par feature par rapport au profil
+    d'entraînement de la version : PSI (toutes features), KS (numériques),
+    part des catégories inconnues. Calculé depuis les compteurs agrégés.
+    """
+    version = version or current_models().version
+    try:
+        return drift_report(version, scenario)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# =========================
+# Données d'entraînement : ingestion CSV en flux, stockage colonnaire
+# =========================
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(1 << 20)))
+UPLOAD_CHUNK_ROWS = int(os.environ.get("UPLOAD_CHUNK_ROWS", "50000"))
+
+def _require_training_stack():
+    """Upload et entraînement ne sont pas disponibles dans l'image de service seul."""
+    if SERVING_ONLY:
+        raise HTTPException(status_code=501, detail="Indisponible en mode service seul (SERVING_ONLY=1)")
+
+class DataValidationError(ValueError):
+    """CSV d'entraînement non conforme au schéma de feature_template.json."""
+
+# Le schéma (types, catégories) est aussi écrit à côté du fichier en JSON
+TRAIN_STORE_FORMAT = "student-train/1"
+
+def train_schema_path(store: Path) -> Path:
+    return store.with_suffix(".schema.json")
+
+def _update_column_stats(st: dict, col: str, values: "pd.Series"):
+    """Statistiques d'une colonne sur un bloc : catégories vues ou étendue numérique."""
+    import pandas as pd
+    template_kind = FEATURE_TEMPLATE.get(col)
+    numeric = not isinstance(template_kind, str) and pd.api.types.is_numeric_dtype(values)
+    if template_kind is None or not numeric:
+        # Hors template, une colonne numérique dans un bloc et textuelle dans un
+        # autre devient catégorielle : ses valeurs sont donc toujours relevées
+        st.setdefault("categories", set()).update(values.dropna().astype(str).unique().tolist())
+    st["kind"] = "num" if numeric and st.get("kind", "num") == "num" else "cat"
+    if numeric:
+        finite = values.dropna()
+        st["integral"] = st.get("integral", True) and len(finite) == len(values) and bool((finite % 1 == 0).all())
+        if len(finite):
+            st["min"] = min(st.get("min", math.inf), float(finite.min()))
+            st["max"] = max(st.get("max", -math.inf), float(finite.max()))
+
+def _column_dtype(st: dict) -> dict:
+    if st["kind"] == "cat":
+        return {"dtype": "category", "categories": sorted(st["categories"])}
+    if st["integral"]:
+        for dtype in ("int8", "int16", "int32"):
+            info = np.iinfo(dtype)
+            if info.min <= st.get("min", 0) and st.get("max", 0) <= info.max:
+                return {"dtype": dtype}
+        return {"dtype": "int64"}
+    return {"dtype": "float64"}
+
+TRAIN_STORE_DTYPES = ("category", "int8", "int16", "int32", "int64", "float64")
+
+def training_dtypes(schema: dict) -> dict:
+    import pandas as pd
+    bad = [c["name"] for c in schema["columns"] if c["dtype"] not in TRAIN_STORE_DTYPES]
+    if bad:
+        raise DataValidationError(f"Type non supporté pour {bad} (attendu : {', '.join(TRAIN_STORE_DTYPES)})")
+    return {
+        c["name"]: pd.CategoricalDtype(c["categories"]) if c["dtype"] == "category" else c["dtype"]
+        for c in schema["columns"]
+    }
+
+def _cast_column(values: "pd.Series", col: str, dtype) -> "pd.Series":
+    """Convertit une colonne vers le type du schéma, sans perte silencieuse (hors catégories, troncature, dépassement)."""
+    import pandas as pd
+    if isinstance(dtype, pd.CategoricalDtype):
+        values = values.astype(str)
+        lost = ~values.isin(dtype.categories)
+        out = values.where(~lost, dtype.categories[0]).astype(dtype)
+    else:
+        numeric = pd.to_numeric(values, errors="coerce")
+        lost = numeric.isna() & values.notna()
+        if dtype != "float64":
+            info = np.iinfo(dtype)
+            lost |= numeric.isna() | (numeric % 1 != 0) | (numeric < info.min) | (numeric > info.max)
+        out = numeric.where(~lost, 0).astype(dtype)
+    if lost.any():
+        raise DataValidationError(f"Valeur {values[lost].iloc[0]!r} non représentable en {dtype} pour '{col}'")
+    return out
+
+def write_training_store(chunks, schema: dict, dst: Path):
+    """
+    Écrit les blocs (DataFrames) typés selon schema dans dst (Arrow IPC, schéma
+    JSON en métadonnées). Les catégories étant fixées par le schéma, tous les
+    blocs partagent le même dictionnaire. Une valeur que le type du schéma ne
+    représente pas exactement lève DataValidationError (pas de NaN ni de
+    troncature silencieux).
+    """
+    import pyarrow as pa
+    import pandas as pd
+    dtypes = training_dtypes(schema)
+    writer = None
+    try:
+        for chunk in chunks:
+            chunk = pd.DataFrame({col: _cast_column(chunk[col], col, dtype) for col, dtype in dtypes.items()})
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                arrow_schema = table.schema.with_metadata({
+                    **(table.schema.metadata or {}), b"student_schema": json.dumps(schema).encode(),
+                })
+                writer = pa.ipc.new_file(str(dst), arrow_schema)
+            writer.write_table(table.replace_schema_metadata(arrow_schema.metadata))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _install_training_store(tmp: Path, schema: dict):
+    """Remplace le jeu d'entraînement de façon atomique, puis son schéma JSON."""
+    os.replace(tmp, TRAIN_STORE_PATH)
+    _write_json_atomic(train_schema_path(TRAIN_STORE_PATH), schema)
+
+def load_training_schema(store: Optional[Path] = None) -> dict:
+    with open(train_schema_path(Path(store or TRAIN_STORE_PATH))) as f:
+        return json.load(f)
+
+def export_training_csv(dst: Path, store: Optional[Path] = None, columns: Optional[List[str]] = None) -> int:
+    """Réécrit le jeu d'entraînement en CSV (compatibilité), bloc d'enregistrements par bloc."""
+    import pyarrow as pa
+    n = 0
+    with pa.memory_map(str(store or TRAIN_STORE_PATH)) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            batch.to_pandas().to_csv(dst, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            n += batch.num_rows
+    return n
+
+def _training_store_fresh() -> bool:
+    if not (TRAIN_STORE_PATH.exists() and train_schema_path(TRAIN_STORE_PATH).exists()):
+        return False
+    return not DATA_PATH.exists() or DATA_PATH.stat().st_mtime <= TRAIN_STORE_PATH.stat().st_mtime
+
+def ensure_training_store() -> bool:
+    """(Re)construit le fichier colonnaire depuis DATA_PATH s'il manque ou s'il est plus ancien que le CSV."""
+    if _training_store_fresh():
+        return True
     if not DATA_PATH.exists():
-        raise HTTPException(status_code=500, detail="Training data missing. Upload data first with /upload-data")
-    
-    df = pd.read_csv(DATA_PATH)
-    
-    if "success" not in df.columns:
+        return False
+    tmp = TRAIN_STORE_PATH.with_name(f".{TRAIN_STORE_PATH.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        summary = import_training_csv(DATA_PATH, tmp)
+        _install_training_store(tmp, summary["schema"])
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return True
+
+def replace_training_data(src: Path) -> dict:
+    """
+    Remplace le jeu d'entraînement par le CSV src : validation et conversion en
+    flux, puis installation du CSV normalisé (avec success) comme nouvelle
+    source, et enfin du fichier colonnaire (plus récent que le CSV, donc à jour).
+    """
+    TRAIN_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    token = uuid.uuid4().hex
+    tmp_store = TRAIN_STORE_PATH.with_name(f".{TRAIN_STORE_PATH.name}.{token}.tmp")
+    tmp_csv = DATA_PATH.with_name(f".{DATA_PATH.name}.{token}.tmp")
+    try:
+        summary = import_training_csv(src, tmp_store)
+        export_training_csv(tmp_csv, tmp_store)
+        os.replace(tmp_csv, DATA_PATH)
+        _install_training_store(tmp_store, summary["schema"])
+    finally:
+        for path in (tmp_store, tmp_csv):
+            if path.exists():
+                path.unlink()
+    return summary
+
+def _validated_csv_chunks(src: Path):
+    """
+    Lit un CSV bloc par bloc, le valide contre feature_template.json (+ G3) et
+    ajoute 'success' si absent : le fichier n'est jamais chargé en entier.
+    """
+    numeric_cols = [k for k, v in FEATURE_TEMPLATE.items() if isinstance(v, (int, float))]
+    categorical_cols = [k for k, v in FEATURE_TEMPLATE.items() if isinstance(v, str)]
+    required_cols = list(FEATURE_TEMPLATE) + ["G3"]
+
+    import pandas as pd
+
+    n_rows = 0
+    try:
+        reader = pd.read_csv(src, chunksize=UPLOAD_CHUNK_ROWS)
+        for i, chunk in enumerate(reader):
+            if i == 0:
+                missing = [c for c in required_cols if c not in chunk.columns]
+                if missing:
+                    raise DataValidationError(f"Colonnes manquantes: {missing}")
+            for col in required_cols:
+                nulls = chunk[col].isna()
+                if nulls.any():
+                    row = n_rows + int(nulls.values.argmax()) + 2  # +1 en-tête, +1 base 1
+                    raise DataValidationError(f"Valeur manquante pour '{col}' (ligne {row})")
+            for col in numeric_cols + ["G3"]:
+                values = pd.to_numeric(chunk[col], errors="coerce")
+                bad = values.isna()
+                if bad.any():
+                    row = n_rows + int(bad.values.argmax()) + 2
+                    raise DataValidationError(f"Valeur non numérique pour '{col}' (ligne {row})")
+                chunk[col] = values
+            for col in categorical_cols:
+                chunk[col] = chunk[col].astype(str)
+
+            if "success" not in chunk.columns:
+                chunk["success"] = (chunk["G3"] >= 10).astype(int)
+            n_rows += len(chunk)
+            yield chunk
+    except pd.errors.EmptyDataError:
+        raise DataValidationError("Fichier CSV vide")
+    except pd.errors.ParserError as e:
+        raise DataValidationError(f"Erreur de parsing CSV: {e}")
+
+    if n_rows == 0:
+        raise DataValidationError("Aucune ligne de données")
+
+def import_training_csv(src: Path, dst: Path) -> dict:
+    """
+    Convertit un CSV en jeu d'entraînement colonnaire (dst + schéma) en deux
+    passes en flux : validation et types (catégories, plus petit entier), puis
+    écriture des blocs typés.
+    """
+    stats: Dict[str, dict] = {}
+    columns: List[str] = []
+    n_rows, n_success = 0, 0
+    for chunk in _validated_csv_chunks(src):
+        if not columns:
+            columns = list(chunk.columns)
+        for col in columns:
+            _update_column_stats(stats.setdefault(col, {}), col, chunk[col])
+        n_rows += len(chunk)
+        n_success += int(chunk["success"].sum())
+    schema = {
+        "format": TRAIN_STORE_FORMAT,
+        "rows": n_rows,
+        "columns": [{"name": col, **_column_dtype(stats[col])} for col in columns],
+    }
+    write_training_store(_validated_csv_chunks(src), schema, dst)
+    return {"rows": n_rows, "columns": columns, "success": n_success, "failure": n_rows - n_success,
+            "schema": schema}
+
+@app.post("/upload-data")
+async def upload_data(file: UploadFile = File(...)):
+    """
+    Upload un nouveau fichier CSV pour remplacer les données d'entraînement.
+    Le fichier doit contenir les colonnes de feature_template.json + G3 pour calculer 'success'.
+    Le fichier est écrit sur disque par blocs, validé et converti en flux au
+    format colonnaire, puis remplace le CSV source et le fichier colonnaire de
+    façon atomique.
+    """
+    _require_training_stack()
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Le fichier doit être un CSV")
+
+    DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp_upload = DATA_PATH.parent / f".upload-{uuid.uuid4().hex}.csv"
+
+    try:
+        with open(temp_upload, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+        summary = await run_in_threadpool(replace_training_data, temp_upload)
+
+        return {
+            "status": "uploaded",
+            "filename": file.filename,
+            "rows": summary["rows"],
+            "columns": summary["columns"],
+            "success_distribution": {
+                "success": summary["success"],
+                "failure": summary["failure"]
+            },
+            "message": "Fichier uploadé. Appelez /train pour réentraîner les modèles."
+        }
+
+    except DataValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur: {e}")
+    finally:
+        if temp_upload.exists():
+            temp_upload.unlink()
+
+# =========================
+# Entraînement en arrière-plan
+# =========================
+# Nombre de processus d'entraînement (hors workers de prédiction) ;
+# surchargeable par requête avec /train?workers=N. Défaut : la moitié des
+# workers de service (quota CPU du cgroup ou WEB_CONCURRENCY, cf. serve.py),
+# pour que l'entraînement ne sature pas les CPU des workers de prédiction.
+def _default_train_workers() -> int:
+    try:
+        from serve import default_train_workers  # api/ dans sys.path (serve.py, uvicorn app:app, tests)
+    except ImportError:  # module chargé par chemin, hors de api/
+        return max(1, (os.cpu_count() or 1) // 2)
+    return default_train_workers()
+
+TRAIN_WORKERS = int(os.environ.get("TRAIN_WORKERS") or _default_train_workers())
+# Démarrage des processus du pool : pas de fork() depuis le serveur, qui a
+# déjà des threads (writer du journal, coordinateurs, threadpool d'anyio).
+# Les processus réimportent ce module par son nom : il doit être importable
+# (api/ dans sys.path, comme avec serve.py ou uvicorn app:app).
+TRAIN_START_METHOD = os.environ.get("TRAIN_START_METHOD", "forkserver")
+TRAIN_JOBS_KEEP = int(os.environ.get("TRAIN_JOBS_KEEP", "20"))
+CV_FOLDS = 5
+CV_RANDOM_STATE = 42
+
+def load_training_data(data_path: Optional[Path] = None, columns: Optional[List[str]] = None) -> "pd.DataFrame":
+    """
+    Jeu d'entraînement (défaut TRAIN_STORE_PATH, reconstruit depuis DATA_PATH
+    si besoin) : le fichier Arrow est mappé en mémoire et seules les colonnes
+    demandées sont matérialisées, avec leurs types stockés. Un CSV reste
+    accepté (types inférés par pandas).
+    """
+    import pandas as pd
+    if data_path is None and not ensure_training_store():
+        raise FileNotFoundError(f"Jeu d'entraînement absent : {DATA_PATH}")
+    path = Path(data_path or TRAIN_STORE_PATH)
+    if path.suffix == ".csv":
+        df = pd.read_csv(path, usecols=columns)
+    else:
+        from pyarrow import feather
+        df = feather.read_table(str(path), columns=columns, memory_map=True).to_pandas()
+    if "success" not in df.columns and columns is None:
         if "G3" in df.columns:
             df["success"] = (df["G3"] >= 10).astype(int)
         else:
-            raise HTTPException(status_code=500, detail="Colonne 'success' ou 'G3' manquante")
-    
-    y = df["success"]
-    
-    results = {}
-    
-    for scenario, config in SCENARIOS_CONFIG.items():
-        features = [c for c in df.columns if c not in config["exclude"]]
-        X = df[features]
-        
-        cat_cols = X.select_dtypes(include=["object"]).columns.tolist()
-        num_cols = [c for c in X.columns if c not in cat_cols]
-        
-        pre = ColumnTransformer([
-            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
-            ("num", "passthrough", num_cols),
-        ])
-        
-        pipe = Pipeline([("pre", pre), ("model", LogisticRegression(max_iter=2000))])
-        
-        cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-        scores = cross_validate(pipe, X, y, cv=cv, scoring=["accuracy", "f1"])
-        
-        acc = float(np.mean(scores["test_accuracy"]))
-        f1 = float(np.mean(scores["test_f1"]))
-        
-        pipe.fit(X, y)
-        joblib.dump(pipe, MODELS[scenario])
-        _loaded_models[scenario] = pipe
-        
-        # Log dans MLflow si disponible (métriques + modèle)
-        mlflow_logged = False
-        if mlflow_available and mlflow is not None:
-            try:
-                mlflow.set_experiment(f"student-success-{scenario}")
-                with mlflow.start_run(run_name=f"{scenario}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"):
-                    # Paramètres
-                    mlflow.log_param("scenario", scenario)
-                    mlflow.log_param("n_features", len(features))
-                    mlflow.log_param("n_samples", len(df))
-                    mlflow.log_param("model_type", "LogisticRegression")
-                    mlflow.log_param("cv_folds", 5)
-                    
-                    # Métriques
-                    mlflow.log_metric("accuracy_cv", acc)
-                    mlflow.log_metric("f1_cv", f1)
-                    
-                    # Artifact : sauvegarder le modèle
-                    mlflow.sklearn.log_model(pipe, artifact_path=f"model_{scenario}")
-                    
-                mlflow_logged = True
-            except Exception as e:
-                print(f"MLflow error for {scenario}: {e}")
-                mlflow_logged = False
-        
-        results[scenario] = {
-            "accuracy_cv": round(acc, 4),
-            "f1_cv": round(f1, 4),
-            "n_features": len(features),
-            "mlflow_logged": mlflow_logged
+            raise ValueError("Colonne 'success' ou 'G3' manquante")
+    return df
+
+def categorical_columns(X: "pd.DataFrame") -> List[str]:
+    """Colonnes one-hot : tout ce qui n'est pas numérique (object, str, category)."""
+    import pandas as pd
+    return [c for c in X.columns if not pd.api.types.is_numeric_dtype(X[c])]
+
+def build_pipeline(X: "pd.DataFrame"):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder
+
+    cat_cols = categorical_columns(X)
+    num_cols = [c for c in X.columns if c not in cat_cols]
+
+    pre = ColumnTransformer([
+        ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
+        ("num", "passthrough", num_cols),
+    ])
+    return Pipeline([("pre", pre), ("model", LogisticRegression(max_iter=2000))])
+
+def cv_splits(y) -> List[tuple]:
+    """Plis de validation croisée (random_state fixe → métriques déterministes)."""
+    from sklearn.model_selection import StratifiedKFold
+    cv = StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=CV_RANDOM_STATE)
+    return list(cv.split(np.zeros(len(y)), y))
+
+def scenario_features(columns, scenario: str) -> List[str]:
+    return [c for c in columns if c not in SCENARIOS_CONFIG[scenario]["exclude"]]
+
+class EncodedDataset:
+    """
+    Jeu d'entraînement encodé une seule fois : matrice (one-hot des
+    catégorielles puis numériques, même ordre que le ColumnTransformer de
+    build_pipeline) et carte feature → colonnes. S2/S3/S4 ne diffèrent que
+    par G1/G2 : la matrice d'un scénario est une sélection de colonnes.
+
+    Réutiliser l'encodage global dans chaque pli est valide ici : le one-hot
+    n'apprend que la liste des catégories, et une catégorie absente du pli
+    d'entraînement donne une colonne nulle dont le coefficient reste à 0
+    avec la pénalité L2 (même prédiction que handle_unknown="ignore").
+    """
+
+    def __init__(self, X, y, columns: Dict[str, List[int]], features: List[str]):
+        self.X = X
+        self.y = y
+        self.columns = columns
+        self.features = features
+        self._cache: Dict[str, Any] = {}
+
+    def scenario_matrix(self, scenario: str):
+        if scenario not in self._cache:
+            cols = [j for f in scenario_features(self.features, scenario) for j in self.columns[f]]
+            self._cache[scenario] = self.X[:, cols]
+        return self._cache[scenario]
+
+def encode_training_data(df: "pd.DataFrame") -> EncodedDataset:
+    from scipy import sparse
+    from sklearn.preprocessing import OneHotEncoder
+
+    # Union des features de tous les scénarios (S2 est le plus large)
+    features = sorted({f for sc in SCENARIOS_CONFIG for f in scenario_features(df.columns, sc)},
+                      key=list(df.columns).index)
+    X = df[features]
+    cat_cols = categorical_columns(X)
+    num_cols = [c for c in X.columns if c not in cat_cols]
+
+    enc = OneHotEncoder(handle_unknown="ignore").fit(X[cat_cols])
+    columns: Dict[str, List[int]] = {}
+    offset = 0
+    for col, cats in zip(cat_cols, enc.categories_):
+        columns[col] = list(range(offset, offset + len(cats)))
+        offset += len(cats)
+    for col in num_cols:
+        columns[col] = [offset]
+        offset += 1
+
+    design = sparse.hstack([enc.transform(X[cat_cols]), sparse.csr_matrix(X[num_cols].to_numpy(dtype=float))]).tocsr()
+    # Même règle que ColumnTransformer (sparse_threshold=0.3) : dense si la matrice
+    # est assez remplie, pour que le solveur voie exactement les mêmes données
+    if design.nnz / max(1, design.shape[0] * design.shape[1]) >= 0.3:
+        design = design.toarray()
+    return EncodedDataset(design, df["success"].to_numpy(), columns, cat_cols + num_cols)
+
+# Données d'entraînement d'un processus du pool (reçues une fois par processus)
+_TRAIN_DATA: Optional["pd.DataFrame"] = None
+_TRAIN_ENCODED: Optional[EncodedDataset] = None
+
+def _train_worker_init(df: "pd.DataFrame", encoded: EncodedDataset):
+    global _TRAIN_DATA, _TRAIN_ENCODED
+    _TRAIN_DATA = df
+    _TRAIN_ENCODED = encoded
+
+def train_fold(scenario: str, fold: int, train_idx, test_idx) -> dict:
+    """Un pli de validation croisée d'un scénario, sur l'encodage partagé (exécuté dans le pool)."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, f1_score
+
+    X = _TRAIN_ENCODED.scenario_matrix(scenario)
+    y = _TRAIN_ENCODED.y
+    clf = LogisticRegression(max_iter=2000).fit(X[train_idx], y[train_idx])
+    pred = clf.predict(X[test_idx])
+    return {"fold": fold, "accuracy": float(accuracy_score(y[test_idx], pred)), "f1": float(f1_score(y[test_idx], pred))}
+
+def train_final(scenario: str) -> dict:
+    """
+    Entraînement final d'un scénario (exécuté dans le pool) : la régression est
+    ajustée sur l'encodage partagé, puis assemblée avec le ColumnTransformer du
+    scénario pour obtenir un pipeline servable sur des DataFrames.
+    """
+    X = _TRAIN_DATA[scenario_features(_TRAIN_DATA.columns, scenario)]
+    pipe = build_pipeline(X)
+    pre, clf = pipe.steps[0][1], pipe.steps[-1][1]
+    pre.fit(X)
+    Xs = _TRAIN_ENCODED.scenario_matrix(scenario)
+    head = pre.transform(X.iloc[:5])
+    head = head.toarray() if hasattr(head, "toarray") else np.asarray(head)
+    ref = Xs[:5].toarray() if hasattr(Xs, "toarray") else Xs[:5]
+    if head.shape[1] != Xs.shape[1] or not np.allclose(head, ref):
+        raise RuntimeError(f"Shared encoding does not match the {scenario} ColumnTransformer")
+    clf.fit(Xs, _TRAIN_ENCODED.y)
+    return {"n_features": X.shape[1], "pipe": pipe}
+
+def _mlflow_log_scenario(scenario: str, result: dict) -> bool:
+    """Log métriques + modèle dans MLflow si disponible."""
+    try:
+        import mlflow
+        import mlflow.sklearn
+        mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    except Exception:
+        return False
+    try:
+        mlflow.set_experiment(f"student-success-{scenario}")
+        with mlflow.start_run(run_name=f"{scenario}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"):
+            # Paramètres
+            mlflow.log_param("scenario", scenario)
+            mlflow.log_param("n_features", result["n_features"])
+            mlflow.log_param("n_samples", result["n_samples"])
+            mlflow.log_param("model_type", "LogisticRegression")
+            mlflow.log_param("cv_folds", CV_FOLDS)
+
+            # Métriques
+            mlflow.log_metric("accuracy_cv", result["accuracy_cv"])
+            mlflow.log_metric("f1_cv", result["f1_cv"])
+
+            # Artifact : sauvegarder le modèle
+            mlflow.sklearn.log_model(result["pipe"], artifact_path=f"model_{scenario}")
+        return True
+    except Exception as e:
+        print(f"MLflow error for {scenario}: {e}")
+        return False
+
+_train_jobs: Dict[str, dict] = {}
+_train_jobs_lock = threading.Lock()
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+# Un job "queued"/"running" dont l'état n'a pas bougé depuis ce délai est
+# considéré comme abandonné (worker mort) et ne bloque plus /train
+TRAIN_JOB_STALE_S = float(os.environ.get("TRAIN_JOB_STALE_S", "3600"))
+
+def _persist_job(job_id: str):
+    """Copie l'état du job dans SQLite pour que tous les workers puissent répondre à /train/{job_id}."""
+    with _train_jobs_lock:
+        snap = _job_snapshot(_train_jobs[job_id])
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO train_jobs (job_id, status, updated_at, snapshot_json) VALUES (?, ?, ?, ?)",
+                (job_id, snap["status"], _now(), json.dumps(snap)),
+            )
+        conn.close()
+    except Exception:
+        logger.exception("Train job persistence error for %s", job_id)
+
+def _job_update(job_id: str, **fields):
+    with _train_jobs_lock:
+        _train_jobs[job_id].update(fields)
+    _persist_job(job_id)
+
+def _scenario_update(job_id: str, scenario: str, **fields):
+    with _train_jobs_lock:
+        _train_jobs[job_id]["scenarios"][scenario].update(fields)
+    _persist_job(job_id)
+
+def _read_persisted_job(job_id: str) -> Optional[dict]:
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute("SELECT snapshot_json FROM train_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+def _active_persisted_job() -> Optional[str]:
+    cutoff = datetime.utcfromtimestamp(time.time() - TRAIN_JOB_STALE_S).isoformat()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute(
+            "SELECT job_id FROM train_jobs WHERE status IN ('queued', 'running') AND updated_at >= ? LIMIT 1",
+            (cutoff,),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def _train_mp_context():
+    ctx = multiprocessing.get_context(TRAIN_START_METHOD)
+    if TRAIN_START_METHOD == "forkserver":
+        # Le serveur de fork importe l'API une fois ; chaque processus en hérite
+        ctx.set_forkserver_preload([__name__])
+    return ctx
+
+def _run_train_job(job_id: str, data_path: Path, workers: int):
+    """
+    Coordinateur (thread) : les plis de CV et les entraînements finaux des
+    3 scénarios sont soumis ensemble au pool de processus.
+    """
+    t0 = time.time()
+    _job_update(job_id, status="running", started_at=_now())
+    try:
+        df = load_training_data(data_path)
+        splits = cv_splits(df["success"])
+        encoded = encode_training_data(df)
+        _job_update(job_id, n_samples=len(df))
+
+        fold_scores: Dict[str, List[dict]] = {sc: [] for sc in SCENARIOS_CONFIG}
+        finals: Dict[str, dict] = {}
+        failed: Dict[str, str] = {}
+        task_futures: Dict[str, list] = {sc: [] for sc in SCENARIOS_CONFIG}
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_train_mp_context(),
+                                 initializer=_train_worker_init, initargs=(df, encoded)) as pool:
+            futures = {}
+            for scenario in SCENARIOS_CONFIG:
+                fut = pool.submit(train_final, scenario)
+                futures[fut] = (scenario, None)
+                task_futures[scenario].append(fut)
+            for fold, (train_idx, test_idx) in enumerate(splits):
+                for scenario in SCENARIOS_CONFIG:
+                    fut = pool.submit(train_fold, scenario, fold, train_idx, test_idx)
+                    futures[fut] = (scenario, fold)
+                    task_futures[scenario].append(fut)
+            with _train_jobs_lock:
+                _train_jobs[job_id]["_futures"] = task_futures
+
+            for fut in as_completed(futures):
+                scenario, fold = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    failed.setdefault(scenario, str(e))
+                    _scenario_update(job_id, scenario, status="failed", error=failed[scenario], finished_at=_now())
+                    continue
+                if fold is None:
+                    finals[scenario] = result
+                else:
+                    fold_scores[scenario].append(result)
+                    _scenario_update(job_id, scenario, folds_done=len(fold_scores[scenario]))
+                if scenario not in failed and scenario in finals and len(fold_scores[scenario]) == CV_FOLDS:
+                    # Moyenne dans l'ordre des plis (indépendante de l'ordre de fin des tâches)
+                    scores = sorted(fold_scores[scenario], key=lambda r: r["fold"])
+                    _scenario_update(
+                        job_id, scenario,
+                        status="succeeded",
+                        finished_at=_now(),
+                        wall_clock_s=round(time.time() - t0, 3),
+                        accuracy_cv=round(float(np.mean([r["accuracy"] for r in scores])), 4),
+                        f1_cv=round(float(np.mean([r["f1"] for r in scores])), 4),
+                        n_features=finals[scenario]["n_features"],
+                    )
+
+        if failed:
+            raise RuntimeError(f"Training failed for {sorted(failed)}; models unchanged")
+
+        # Tous les scénarios ont réussi : nouvelle version dans le registre, puis promotion
+        pipes = {sc: finals[sc]["pipe"] for sc in SCENARIOS_CONFIG}
+        version = save_version(pipes, {
+            "job_id": job_id,
+            "n_samples": len(df),
+            "metrics": {
+                sc: {k: _train_jobs[job_id]["scenarios"][sc][k] for k in ("accuracy_cv", "f1_cv", "n_features")}
+                for sc in SCENARIOS_CONFIG
+            },
+        }, drift_profile=build_drift_profile(df), feature_schema=build_feature_schema(df))
+        promote_version(version)
+        _job_update(job_id, model_version=version)
+
+        for scenario, pipe in pipes.items():
+            metrics = _train_jobs[job_id]["scenarios"][scenario]
+            result = {**metrics, "n_samples": len(df), "pipe": pipe}
+            _scenario_update(job_id, scenario, mlflow_logged=_mlflow_log_scenario(scenario, result))
+
+        _job_update(job_id, status="succeeded", finished_at=_now(), wall_clock_s=round(time.time() - t0, 3))
+    except Exception as e:
+        _job_update(job_id, status="failed", error=str(e), finished_at=_now(), wall_clock_s=round(time.time() - t0, 3))
+
+def _job_snapshot(job: dict) -> dict:
+    snap = {k: v for k, v in job.items() if not k.startswith("_")}
+    snap["scenarios"] = {}
+    futures = job.get("_futures", {})
+    for scenario, state in job["scenarios"].items():
+        state = dict(state)
+        if state["status"] == "pending" and any(f.running() or f.done() for f in futures.get(scenario, [])):
+            state["status"] = "running"
+        snap["scenarios"][scenario] = state
+    return snap
+
+@app.post("/train", status_code=202)
+def train(workers: Optional[int] = Query(None, ge=1, description="Processus d'entraînement (défaut TRAIN_WORKERS)")):
+    """
+    Lance le réentraînement des 3 modèles (S2, S3, S4) en tâche de fond
+    (pool de processus : scénarios et plis de CV en parallèle). Renvoie immédiatement un job_id ; l'avancement,
+    les métriques et les erreurs sont consultables sur /train/{job_id}.
+    En cas de succès, une nouvelle version est créée dans le registre et activée.
+    Les métriques ET les modèles sont loggés dans MLflow si disponible.
+    """
+    _require_training_stack()
+    if not ensure_training_store():
+        raise HTTPException(status_code=500, detail="Training data missing. Upload data first with /upload-data")
+
+    with _train_jobs_lock:
+        active = [j["job_id"] for j in _train_jobs.values() if j["status"] in ("queued", "running")]
+        active = active or [j for j in [_active_persisted_job()] if j]
+        if active:
+            raise HTTPException(status_code=409, detail=f"Training job already running: {active[0]}")
+
+        job_id = uuid.uuid4().hex[:12]
+        _train_jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "n_samples": None,
+            "model_version": None,
+            "error": None,
+            "workers": workers or TRAIN_WORKERS,
+            "wall_clock_s": None,
+            "scenarios": {sc: {"status": "pending", "folds_done": 0, "n_folds": CV_FOLDS} for sc in SCENARIOS_CONFIG},
         }
-    
-    return {
-        "status": "trained",
-        "n_samples": len(df),
-        "models": results,
-        "mlflow_tracking_uri": MLFLOW_TRACKING_URI if mlflow_available else "not available"
-    }
+        # On ne garde que les TRAIN_JOBS_KEEP derniers jobs
+        for old in list(_train_jobs)[:-TRAIN_JOBS_KEEP]:
+            _train_jobs.pop(old)
+
+    _persist_job(job_id)
+    threading.Thread(target=_run_train_job, args=(job_id, TRAIN_STORE_PATH, workers or TRAIN_WORKERS), name=f"train-{job_id}", daemon=True).start()
+    return {"job_id": job_id, "status": "queued", "status_url": f"/train/{job_id}"}
+
+@app.get("/train/{job_id}")
+def train_status(job_id: str):
+    with _train_jobs_lock:
+        job = _train_jobs.get(job_id)
+        snap = _job_snapshot(job) if job is not None else None
+    if snap is None:
+        # Job lancé par un autre worker
+        snap = _read_persisted_job(job_id)
+        if snap is None:
+            raise HTTPException(status_code=404, detail=f"Unknown training job: {job_id}")
+    snap["mlflow_tracking_uri"] = MLFLOW_TRACKING_URI
+    return snap
+
+# =========================
+# Gestion des versions de modèles
+# =========================
+@app.get("/models")
+def models_list():
+    manifest = read_manifest()
+    versions = list_versions()
+    for v in versions:
+        v["active"] = v["version"] == manifest["active"]
+    return {"active": manifest["active"], "history": manifest["history"], "versions": versions}
+
+@app.post("/models/{version}/promote")
+def models_promote(version: str):
+    try:
+        model_set = promote_version(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Promotion failed, active version unchanged: {e}")
+    return {"status": "promoted", "active": model_set.version}
+
+@app.post("/models/rollback")
+def models_rollback():
+    try:
+        model_set = rollback_version()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rollback failed, active version unchanged: {e}")
+    return {"status": "rolled_back", "active": model_set.version}
+
+COLD_START["import_ms"] = _since_process_start_ms()
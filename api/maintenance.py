@@ -0,0 +1,82 @@
+"""
+Opérations de maintenance sur la base des inférences.
+
+Usage (depuis api/) :
+    python maintenance.py compact-log [--vacuum]   # JSON brut → colonnes typées (journal compact)
+    python maintenance.py rollup [--since ISO]     # recalcule les agrégats horaires depuis le journal
+    python maintenance.py archive [--days N]       # jours hors fenêtre chaude → partitions Parquet
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+
+def compact_log(api, args) -> int:
+    api.db_init()
+    stats = api.compact_inference_log(batch_size=args.batch_size)
+    print(f"[compact-log] {stats['scanned']} lignes JSON, {stats['compacted']} réencodées, "
+          f"{stats['kept_json']} conservées en JSON")
+    if args.vacuum:
+        conn = sqlite3.connect(api.DB_PATH)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        print(f"[compact-log] VACUUM : {api.DB_PATH.stat().st_size} octets")
+    return 0
+
+
+def rollup(api, args) -> int:
+    api.db_init()
+    since = datetime.fromisoformat(args.since) if args.since else None
+    n = api.rebuild_rollups(since)
+    print(f"[rollup] {n} agrégats horaires recalculés" + (f" depuis {args.since}" if since else ""))
+    return 0
+
+
+def archive(api, args) -> int:
+    api.db_init()
+    try:
+        stats = api.archive_inference_log(retention_days=args.days)
+    except ValueError as e:
+        print(f"[archive] {e} : préciser --days ou RETENTION_DAYS", file=sys.stderr)
+        return 2
+    print(f"[archive] {stats['rows']} lignes sur {stats['days']} jour(s) → {api.archive_dir()}")
+    if stats["incremental_vacuum"]:
+        print(f"[archive] vacuum incrémental : {stats['freed_pages']} pages libérées")
+    elif not args.vacuum:
+        print("[archive] base sans auto_vacuum incrémental : relancer une fois avec --vacuum pour la convertir")
+    if args.vacuum:
+        conn = sqlite3.connect(api.DB_PATH)
+        try:
+            # Convertit la base (auto_vacuum ne change qu'au VACUUM) puis compacte
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        print(f"[archive] VACUUM : {api.DB_PATH.stat().st_size} octets")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintenance de la base des inférences")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("compact-log", help="réencode les lignes JSON du journal en colonnes typées")
+    p.add_argument("--batch-size", type=int, default=5000)
+    p.add_argument("--vacuum", action="store_true", help="récupère l'espace libéré (VACUUM)")
+    p.set_defaults(func=compact_log)
+    p = sub.add_parser("rollup", help="recalcule inference_rollups depuis la table brute")
+    p.add_argument("--since", help="ne recalcule qu'à partir de cette heure (ISO 8601, UTC)")
+    p.set_defaults(func=rollup)
+    p = sub.add_parser("archive", help="archive en Parquet les jours plus anciens que la rétention")
+    p.add_argument("--days", type=int, default=None, help="fenêtre chaude en jours (défaut : RETENTION_DAYS)")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM complet (convertit en auto_vacuum incrémental)")
+    p.set_defaults(func=archive)
+    args = parser.parse_args(argv)
+    import app as api  # maintenance.py est dans api/ (sys.path[0]) : import direct, après le parsing
+    return args.func(api, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
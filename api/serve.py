@@ -0,0 +1,171 @@
+"""
+Serveur multi-processus pour l'API.
+
+Le processus parent initialise la base et charge/préchauffe les modèles une
+seule fois, puis fork N workers uvicorn qui partagent la socket d'écoute et
+les modèles en copy-on-write. Le nombre de workers suit le quota CPU du
+conteneur (cgroup), ou WEB_CONCURRENCY / --workers.
+
+Chaque worker a ses propres compteurs : ils écrivent leurs métriques dans un
+répertoire partagé (METRICS_DIR, par défaut un répertoire temporaire) et
+/metrics renvoie la somme sur tous les workers, quel que soit celui qui répond.
+
+Les messages de l'API (logger "student_api" : rechargement de version,
+erreurs du journal...) sont écrits sur stderr, préfixés par le PID du worker.
+
+Usage (depuis api/) : python serve.py --host 0.0.0.0 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def cpu_quota(cgroup_root: Path = Path("/sys/fs/cgroup")) -> float:
+    """Nombre de CPU disponibles : quota cgroup v2/v1 s'il existe, sinon affinité du processus."""
+    try:
+        quota, period = (cgroup_root / "cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int((cgroup_root / "cpu" / "cpu.cfs_quota_us").read_text())
+        period = int((cgroup_root / "cpu" / "cpu.cfs_period_us").read_text())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return float(len(os.sched_getaffinity(0)))
+    return float(os.cpu_count() or 1)
+
+
+def default_workers(cgroup_root: Path = Path("/sys/fs/cgroup")) -> int:
+    if os.environ.get("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    return max(1, int(cpu_quota(cgroup_root)))
+
+
+def default_train_workers(cgroup_root: Path = Path("/sys/fs/cgroup")) -> int:
+    """
+    Processus d'entraînement par défaut : la moitié des workers de service.
+    Un /train est plus lent qu'avec tous les CPU, mais il ne prive pas les
+    workers de prédiction (qui occupent déjà tout le quota) de plus de la
+    moitié du temps CPU pendant l'entraînement.
+    """
+    return max(1, default_workers(cgroup_root) // 2)
+
+
+def run_worker(api, sock: socket.socket, args) -> None:
+    import uvicorn
+
+    config = uvicorn.Config(api.app, log_level=args.log_level, lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Student Success API (multi-workers, modèles partagés)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="défaut : quota CPU ou WEB_CONCURRENCY")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    workers = args.workers or default_workers()
+    # Référence du démarrage à froid (/health cold_start) pour le parent et les
+    # workers ; un superviseur peut fournir une date antérieure (ex. conteneur)
+    os.environ.setdefault("PROCESS_START_TIME", repr(time.time()))
+
+    # Une ligne par message, préfixée par le PID : lisible malgré les workers concurrents
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("[worker %(process)d] %(levelname)s %(name)s: %(message)s"))
+    api_logger = logging.getLogger("student_api")
+    api_logger.addHandler(handler)
+    api_logger.setLevel(args.log_level.upper())
+
+    # Les workers forkés ne refont ni db_init ni le chargement des modèles
+    os.environ["SERVE_PREFORKED"] = "1"
+    metrics_dir = Path(os.environ.get("METRICS_DIR") or tempfile.mkdtemp(prefix="student-api-metrics-"))
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    for stale in metrics_dir.glob("*.json"):
+        stale.unlink()  # instantanés d'une exécution précédente
+    os.environ["METRICS_DIR"] = str(metrics_dir)
+    sys.path.insert(0, str(Path(__file__).parent))
+    import app as api
+
+    api.db_init()
+    print(f"[serve] database ready: {api.DB_PATH}", flush=True)
+    api.refresh_active_models()
+    models = api.current_models().load_all()
+    print(f"[serve] models {models.version} loaded in parent", flush=True)
+
+    # Les objets chargés ne seront plus parcourus par le GC : leurs pages
+    # restent partagées entre workers au lieu d'être copiées
+    gc.collect()
+    gc.freeze()
+    print(f"[serve] gc frozen ({gc.get_freeze_count()} objects), starting {workers} workers, metrics in {metrics_dir}",
+          flush=True)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(api, sock, args)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+        print(f"[serve] worker {pid} started", flush=True)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"[serve] worker {pid} exited (status {status}), restarting", flush=True)
+        if time.time() - started < 1.0:
+            time.sleep(1.0)  # évite une boucle de redémarrage trop rapide
+        spawn()
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
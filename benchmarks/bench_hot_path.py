@@ -0,0 +1,204 @@
+"""
+Micro-benchmarks du chemin chaud de /predict, avec baseline stockée.
+
+Mesure, pour chaque étape : temps par appel (meilleure de plusieurs séries, comme timeit) et
+allocations (pic d'octets alloués pendant un appel et mémoire conservée, via tracemalloc).
+
+    python benchmarks/bench_hot_path.py                  # compare à benchmarks/baseline.json
+    python benchmarks/bench_hot_path.py --save-baseline  # enregistre une nouvelle baseline
+    python benchmarks/bench_hot_path.py --threshold 1.3  # tolère 30 % d'allocations en plus (code retour 1 au-delà)
+    python benchmarks/bench_hot_path.py --runs 5         # 5 passes complètes au lieu de 3
+
+Gate : les étapes sont mesurées sur --runs passes entrelacées (médiane par
+métrique), puis comparées à la baseline sur trois métriques. Une métrique n'est
+signalée que si elle dépasse à la fois un ratio et un écart absolu minimal :
+  - ALLOC     pic d'allocation par appel, ratio > --threshold (1.25) et écart > MIN_DELTA_ALLOC octets ;
+  - RETAINED  mémoire conservée par appel, ratio > --threshold et écart > MIN_DELTA_RETAINED octets ;
+  - TIME      temps par appel, ratio > --time-threshold (2.0) et écart > --min-delta-us (0.5 µs).
+Les allocations sont quasi déterministes : c'est le gate strict, il signale un
+vrai changement de code même quand le temps reste dans le bruit. Le temps varie
+jusqu'à ~1.6x d'un processus à l'autre sur une machine partagée (1 vCPU) malgré
+la médiane : sa tolérance par défaut ne retient que les régressions franches
+(sur une machine dédiée, --time-threshold 1.25 reste stable).
+
+Une régression assumée s'inscrit dans la section "accepted" de baseline.json :
+mesure d'avant ("before") et motif. La comparaison se fait toujours contre
+"results" ; la section "accepted" est conservée par --save-baseline et rappelée
+à l'affichage.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+sys.path.insert(0, str(ROOT / "ml"))
+from _api import load_api  # noqa: E402
+
+# Écarts absolus en dessous desquels une métrique n'est pas signalée (la mémoire
+# conservée par predict_proba varie de ~2.5 Ko d'un processus à l'autre)
+MIN_DELTA_ALLOC = 256
+MIN_DELTA_RETAINED = 4096
+
+
+def measure(fn, number: int, repeat: int = 5) -> dict:
+    fn()  # échauffement
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+
+    # Allocations : pic de mémoire allouée pendant un appel, et mémoire conservée
+    n_alloc = max(1, min(200, number // 10))
+    peaks = []
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    for _ in range(n_alloc):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "time_us": min(times) * 1e6,
+        "alloc_peak_bytes": statistics.median(peaks),
+        "retained_bytes": max(0, end - start) / n_alloc,
+    }
+
+
+def build_benchmarks(api, tmp: Path) -> dict:
+    import pandas as pd
+
+    api.DB_PATH = tmp / "bench.sqlite"
+    api.REGISTRY_DIR = tmp / "registry"
+    api.db_init()
+    api.db_log_many([({"absences": i}, 1, 0.9, "bench", "S4") for i in range(2000)])
+
+    payloads = {"S2": {"G1": 12, "G2": 13, "absences": 4}, "S3": {"G1": 12, "absences": 4}, "S4": {"absences": 4}}
+    # Payload complet (toutes les features du template) pour la validation
+    full_payload = dict(api.FEATURE_TEMPLATE)
+    models = api.current_models().load_all()
+    filters = api.InferenceFilters()
+    cols = api._parse_fields(None)
+
+    benches = {
+        "payload_validation": (lambda: api.PredictIn.model_validate({"payload": full_payload}), 20000),
+        "select_scenario": (lambda: api.select_scenario(payloads["S2"]), 20000),
+        "template_merge": (lambda: api.build_features(payloads["S2"], "S2"), 20000),
+        "drift_observe": (lambda: api._drift_monitor.observe(models.version, "S2", full_payload), 20000),
+        "dataframe_build": (lambda: pd.DataFrame([api.build_features(payloads["S2"], "S2")]), 300),
+        "db_log": (lambda: api.db_log(payloads["S2"], 1, 0.9, "bench", "S2"), 200),
+        "db_read_50": (lambda: list(api.db_query(filters, cols, limit=50)), 500),
+    }
+    for scenario, payload in payloads.items():
+        features = api.build_features(payload, scenario)
+        X = pd.DataFrame([features])
+        model = models.get_model(scenario)
+        compiled = models.compiled[scenario]
+        benches[f"predict_proba_{scenario}"] = (lambda m=model, x=X: m.predict_proba(x), 100)
+        if compiled is not None:
+            benches[f"compiled_score_{scenario}"] = (lambda c=compiled, f=features: c.predict_proba_one(f), 20000)
+    return benches
+
+
+def run_all(benches: dict, only, runs: int) -> dict:
+    """Médiane par étape et par métrique de `runs` passes complètes.
+
+    Les passes sont entrelacées (toutes les étapes, puis de nouveau toutes les
+    étapes) pour qu'un ralentissement passager de la machine ne tombe pas sur
+    une seule étape.
+    """
+    names = [name for name in benches if not only or name in only]
+    samples = {name: [] for name in names}
+    for _ in range(runs):
+        for name in names:
+            fn, number = benches[name]
+            samples[name].append(measure(fn, number))
+    return {
+        name: {key: statistics.median(s[key] for s in runs_) for key in runs_[0]}
+        for name, runs_ in samples.items()
+    }
+
+
+def over_tolerance(result: dict, ref: dict, args) -> list:
+    """Métriques (TIME, ALLOC, RETAINED) hors tolérance par rapport à la référence."""
+    flags = []
+    for key, flag, threshold, min_delta in (
+        ("time_us", "TIME", args.time_threshold, args.min_delta_us),
+        ("alloc_peak_bytes", "ALLOC", args.threshold, MIN_DELTA_ALLOC),
+        ("retained_bytes", "RETAINED", args.threshold, MIN_DELTA_RETAINED),
+    ):
+        cur, base = result[key], ref.get(key)
+        if base is not None and cur > base * threshold and cur - base > min_delta:
+            flags.append(flag)
+    return flags
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks du chemin d'inférence")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio signalé pour les allocations")
+    parser.add_argument("--time-threshold", type=float, default=2.0, help="ratio signalé pour le temps")
+    parser.add_argument("--min-delta-us", type=float, default=0.5, help="écart de temps minimal (µs) pour signaler")
+    parser.add_argument("--runs", type=int, default=3, help="nombre de passes complètes (médiane)")
+    parser.add_argument("--only", nargs="*", help="noms des benchmarks à lancer")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore")
+    api = load_api()
+    with tempfile.TemporaryDirectory() as tmp:
+        benches = build_benchmarks(api, Path(tmp))
+        results = run_all(benches, args.only, max(1, args.runs))
+
+    baseline_path = Path(args.baseline)
+    stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    # régressions assumées : mesure d'avant et motif, conservés d'une baseline à l'autre
+    accepted = stored.get("accepted", {})
+    if args.save_baseline:
+        stored = {"python": sys.version.split()[0], "results": results}
+        if accepted:
+            stored["accepted"] = accepted
+        baseline_path.write_text(json.dumps(stored, indent=2, ensure_ascii=False) + "\n")
+        print(f"Baseline saved to {baseline_path}")
+
+    baseline = stored.get("results", {})
+    regressions = []
+    print(f"{'benchmark':<22}{'time (us)':>12}{'baseline':>12}{'before':>12}{'ratio':>8}"
+          f"{'peak alloc (B)':>16}{'retained (B)':>14}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        ratio = r["time_us"] / base["time_us"] if base else None
+        flags = over_tolerance(r, base, args) if base else []
+        flag = f"  << {'+'.join(flags)}" if flags else ""
+        if flags:
+            regressions.append(f"{name} ({'+'.join(flags)})")
+        print(
+            f"{name:<22}{r['time_us']:>12.2f}"
+            f"{(base['time_us'] if base else float('nan')):>12.2f}"
+            f"{(accepted[name]['before']['time_us'] if name in accepted else float('nan')):>12.2f}"
+            f"{(ratio if ratio is not None else float('nan')):>8.2f}"
+            f"{r['alloc_peak_bytes']:>16.0f}{r['retained_bytes']:>14.1f}{flag}"
+        )
+    for name in results:
+        if name in accepted:
+            before = accepted[name].get("before", {})
+            print(f"\n{name}: régression acceptée, {before.get('time_us', float('nan')):.2f} us avant "
+                  f"({accepted[name].get('reason', 'sans motif')})")
+    if regressions and not args.save_baseline:
+        print(f"\nRegressions (time x{args.time_threshold}, alloc x{args.threshold}): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
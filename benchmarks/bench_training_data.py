@@ -0,0 +1,101 @@
+"""
+Chargement du jeu d'entraînement : CSV relu par pandas comparé au fichier
+colonnaire (Arrow mappé en mémoire, types stockés), complet et avec projection
+de colonnes, sur une copie agrandie de data/student_full.csv. Chaque mesure
+tourne dans un processus neuf (temps, RSS ajouté par le chargement, mémoire
+du DataFrame).
+
+    python benchmarks/bench_training_data.py                 # x500 (~520 000 lignes)
+    python benchmarks/bench_training_data.py --scale 100 --runs 5 --out training_data.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "ml"))
+from _api import load_api  # noqa: E402
+
+# Exécuté dans un interpréteur neuf : une ligne JSON sur stdout
+CHILD = r"""
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+sys.path.insert(0, sys.argv[1] + "/ml")
+from _api import load_api
+api = load_api()
+import pandas, pyarrow.feather
+columns = json.loads(sys.argv[3])
+rss = lambda: int(open("/proc/self/statm").read().split()[1]) * 4096
+rss0 = rss()
+t0 = time.perf_counter()
+df = api.load_training_data(api.Path(sys.argv[2]), columns=columns)
+load_ms = (time.perf_counter() - t0) * 1000.0
+print(json.dumps({
+    "load_ms": load_ms,
+    "rss_added_mb": (rss() - rss0) / 2**20,
+    "frame_mb": df.memory_usage(deep=True).sum() / 2**20,
+    "rows": len(df),
+    "columns": df.shape[1],
+}))
+"""
+
+
+def run_once(path: Path, columns) -> dict:
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    proc = subprocess.run([sys.executable, "-c", CHILD, str(ROOT), str(path), json.dumps(columns)],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"Échec du chargement ({path.name}):\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chargement du jeu d'entraînement : CSV vs fichier colonnaire")
+    parser.add_argument("--scale", type=int, default=500, help="nombre de copies du jeu d'entraînement")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--out", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    api = load_api()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        csv_path = tmp / "big.csv"
+        with open(api.DATA_PATH) as src:
+            header, *lines = src.read().splitlines(keepends=True)
+        with open(csv_path, "w") as f:
+            f.write(header)
+            for _ in range(args.scale):
+                f.writelines(lines)
+        store = tmp / "big.feather"
+        api.import_training_csv(csv_path, store)
+
+        projection = ["G1", "G2", "absences", "school", "success"]
+        cases = {
+            "csv": (csv_path, None),
+            "store": (store, None),
+            "store_projection": (store, projection),
+        }
+        results = {}
+        for name, (path, columns) in cases.items():
+            runs = [run_once(path, columns) for _ in range(args.runs)]
+            results[name] = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+            results[name]["file_mb"] = path.stat().st_size / 2**20
+
+    base = results["csv"]
+    print(f"{'format':<18}{'lignes':>9}{'cols':>6}{'fichier Mo':>12}{'chargement':>13}{'RSS ajouté':>12}"
+          f"{'DataFrame':>11}{'vs csv':>9}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['rows']:>9.0f}{r['columns']:>6.0f}{r['file_mb']:>12.1f}{r['load_ms']:>11.0f}ms"
+              f"{r['rss_added_mb']:>10.0f}Mo{r['frame_mb']:>9.1f}Mo{base['load_ms'] / r['load_ms']:>8.1f}x")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
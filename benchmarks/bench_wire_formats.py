@@ -0,0 +1,110 @@
+"""
+Coût de sérialisation et taille des messages : encodage par défaut de FastAPI
+(jsonable_encoder + JSONResponse) comparé à orjson et MessagePack, pour une
+réponse de /predict, des pages de /inferences et un corps de /predict/batch.
+
+    python benchmarks/bench_wire_formats.py
+    python benchmarks/bench_wire_formats.py --out wire_formats.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import msgpack
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "ml"))
+from _api import load_api  # noqa: E402
+
+
+def per_call_us(fn, min_time: float = 0.2, repeat: int = 5) -> float:
+    fn()
+    number, elapsed = 1, 0.0
+    while True:  # calibre le nombre d'appels pour ~min_time par série
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time / repeat:
+            break
+        number *= 2
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return statistics.median(times) * 1e6
+
+
+# format → (encodage, décodage)
+CODECS = {
+    "default": (lambda d: JSONResponse(jsonable_encoder(d)).body, json.loads),
+    "orjson": (lambda d: orjson.dumps(d, option=orjson.OPT_SERIALIZE_NUMPY), orjson.loads),
+    "msgpack": (lambda d: msgpack.packb(d, use_bin_type=True), lambda b: msgpack.unpackb(b, raw=False)),
+}
+
+
+def build_messages(api, tmp: Path) -> dict:
+    api.DB_PATH = tmp / "wire.sqlite"
+    api.REGISTRY_DIR = tmp / "registry"
+    api.db_init()
+    with open(ROOT / "loadtest" / "sample_payloads.jsonl") as f:
+        payloads = [json.loads(line)["payload"] for line in f if line.strip()]
+    api.db_log_many([(p, 1, 0.873, "bench", "S2") for p in payloads * 2])
+    filters, cols = api.InferenceFilters(), api._parse_fields(None)
+
+    def page(limit):
+        rows = list(api.db_query(filters, cols, limit=limit))
+        return {"inferences": rows, "next_before_id": rows[-1]["id"]}
+
+    return {
+        "predict_response": {"scenario": "S2", "pred_label": 1, "pred_proba": 0.8731452, "latency_ms": 0.41,
+                             "model_version": "baseline", "cached": False},
+        "inferences_50": page(50),
+        "inferences_500": page(500),
+        "batch_request_500": {"items": [{"payload": p, "session_id": "bench"} for p in (payloads * 2)[:500]]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sérialisation : FastAPI par défaut vs orjson vs MessagePack")
+    parser.add_argument("--out", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    api = load_api()
+    with tempfile.TemporaryDirectory() as tmp:
+        messages = build_messages(api, Path(tmp))
+
+    results = {}
+    print(f"{'message':<20}{'format':<10}{'encode (us)':>13}{'decode (us)':>13}{'bytes':>10}{'vs default':>12}")
+    for name, data in messages.items():
+        results[name] = {}
+        for fmt, (encode, decode) in CODECS.items():
+            raw = encode(data)
+            results[name][fmt] = {
+                "encode_us": per_call_us(lambda: encode(data)),
+                "decode_us": per_call_us(lambda: decode(raw)),
+                "bytes": len(raw),
+            }
+        base = results[name]["default"]
+        for fmt, r in results[name].items():
+            speedup = base["encode_us"] / r["encode_us"]
+            print(f"{name:<20}{fmt:<10}{r['encode_us']:>13.1f}{r['decode_us']:>13.1f}{r['bytes']:>10}"
+                  f"{speedup:>11.1f}x")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
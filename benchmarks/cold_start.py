@@ -0,0 +1,98 @@
+"""
+Mesure du démarrage à froid de l'API : temps d'import du module, temps
+jusqu'aux modèles prêts et jusqu'à la première prédiction, dans un processus
+Python neuf, pour le mode complet et le mode service seul (SERVING_ONLY=1).
+
+    python benchmarks/cold_start.py                 # 5 démarrages par mode
+    python benchmarks/cold_start.py --runs 10 --out cold_start.json
+
+Le mode service seul suppose les artefacts models/model_s*.compiled.json
+(python ml/export_compiled.py).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["pandas", "joblib", "sklearn", "scipy", "mlflow"]
+
+# Exécuté dans un interpréteur neuf : une ligne JSON sur stdout
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1] + "/ml")
+from _api import load_api
+t0 = time.perf_counter()
+api = load_api()
+t_import = time.perf_counter()
+api.DB_PATH = __import__("pathlib").Path(sys.argv[2])
+api.db_init()
+api.current_models().load_all()
+t_ready = time.perf_counter()
+out = api._predict(api.PredictIn(payload={"G1": 12, "G2": 13, "absences": 4}), api.StageTimer())
+t_first = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000.0,
+    "ready_ms": (t_ready - t0) * 1000.0,
+    "first_prediction_ms": (t_first - t0) * 1000.0,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    "heavy_modules": [m for m in json.loads(sys.argv[3]) if m in sys.modules],
+    "pred_proba": out["pred_proba"],
+}))
+"""
+
+
+def run_once(serving_only: bool, tmp: Path) -> dict:
+    env = dict(os.environ, LOG_MODE="sync", MODEL_REGISTRY_DIR=str(tmp / "registry"),
+               PYTHONWARNINGS="ignore")
+    env["SERVING_ONLY"] = "1" if serving_only else "0"
+    db = tmp / f"cold-{time.monotonic_ns()}.sqlite"
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD, str(ROOT), str(db), json.dumps(HEAVY_MODULES)],
+                          env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    if proc.returncode != 0:
+        sys.exit(f"Échec du démarrage ({'serving' if serving_only else 'full'}):\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = wall_ms  # interpréteur compris
+    return result
+
+
+def summarize(runs: list) -> dict:
+    keys = ["import_ms", "ready_ms", "first_prediction_ms", "process_ms", "max_rss_mb"]
+    summary = {k: statistics.median(r[k] for r in runs) for k in keys}
+    summary["heavy_modules"] = runs[0]["heavy_modules"]
+    summary["pred_proba"] = runs[0]["pred_proba"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Démarrage à froid de l'API (mode complet vs service seul)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", nargs="*", default=["full", "serving"], choices=["full", "serving"])
+    parser.add_argument("--out", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            runs = [run_once(mode == "serving", Path(tmp)) for _ in range(args.runs)]
+            results[mode] = summarize(runs)
+
+    print(f"{'mode':<10}{'import':>10}{'prêt':>10}{'1re préd.':>12}{'processus':>12}{'RSS Mo':>9}  modules lourds")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['import_ms']:>8.0f}ms{r['ready_ms']:>8.0f}ms{r['first_prediction_ms']:>10.0f}ms"
+              f"{r['process_ms']:>10.0f}ms{r['max_rss_mb']:>9.0f}  {', '.join(r['heavy_modules']) or '-'}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
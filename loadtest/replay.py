@@ -0,0 +1,251 @@
+"""
+Générateur de charge pour /predict.
+
+Rejoue des payloads issus d'un fichier JSONL et/ou de la table `inferences`
+(SQLite), en boucle fermée (--concurrency) ou ouverte (--rate, arrivées à
+cadence fixe quelle que soit la latence du serveur). Rapporte le débit, les
+latences p50/p95/p99 par scénario et les taux d'erreur, et écrit le tout en JSON.
+
+Exemples :
+    python loadtest/replay.py --jsonl loadtest/sample_payloads.jsonl --concurrency 16 --requests 5000
+    python loadtest/replay.py --db api/inferences.sqlite --rate 200 --duration 60 --out results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+FEATURE_TEMPLATE_PATH = ROOT / "models" / "feature_template.json"
+sys.path.insert(0, str(ROOT / "ml"))
+from _api import load_api  # noqa: E402  (l'API n'est importée qu'à l'appel : --jsonl seul ne dépend que de httpx)
+
+
+def expected_scenario(payload: dict) -> str:
+    """Même règle que select_scenario (api/app.py), pour classer les requêtes en erreur."""
+    has_g1, has_g2 = "G1" in payload, "G2" in payload
+    if has_g1 and has_g2:
+        return "S2"
+    if has_g1 and not has_g2:
+        return "S3"
+    return "S4"
+
+
+def feature_names(template_path: Path = FEATURE_TEMPLATE_PATH) -> set:
+    """Variables du template : seules clés admises dans un dict de features nu."""
+    with open(template_path) as f:
+        return set(json.load(f))
+
+
+def load_jsonl(path: str, features: Optional[set] = None) -> Tuple[List[dict], int]:
+    """
+    Lignes acceptées : {"payload": {...}, "session_id": ...} ou un dict de features
+    dont toutes les clés sont des variables du template (un autre objet JSON plat,
+    ex. une ligne de backlog, serait refusé en 422 par /predict).
+    Les autres lignes sont ignorées (et comptées).
+    """
+    features = feature_names() if features is None else features
+    bodies, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if isinstance(obj, dict) and isinstance(obj.get("payload"), dict):
+                bodies.append({"payload": obj["payload"], "session_id": obj.get("session_id")})
+            elif isinstance(obj, dict) and obj and obj.keys() <= features \
+                    and all(not isinstance(v, (dict, list)) for v in obj.values()):
+                bodies.append({"payload": obj, "session_id": None})
+            else:
+                skipped += 1
+    return bodies, skipped
+
+
+def load_db(path: str, limit: int) -> List[dict]:
+    """
+    Payloads journalisés, restitués par la lecture du journal de l'API
+    (db_query : JSON brut ou journal compact décodé par FeatureCodec).
+    """
+    api = load_api()
+    api.DB_PATH = Path(path)
+    try:
+        rows = list(api.db_query(api.InferenceFilters(), ["session_id", "input_json"], limit=limit))
+    except sqlite3.OperationalError:  # base antérieure au journal compact
+        conn = sqlite3.connect(path)
+        try:
+            rows = [{"session_id": sid, "input_json": raw} for sid, raw in conn.execute(
+                "SELECT session_id, input_json FROM inferences ORDER BY id DESC LIMIT ?", (limit,))]
+        finally:
+            conn.close()
+    return [{"payload": json.loads(r["input_json"]), "session_id": r["session_id"]}
+            for r in rows if r["input_json"] is not None]
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: List[tuple] = []  # (scenario, latency_s, status)
+
+    def add(self, scenario: str, latency_s: float, status: int):
+        self.samples.append((scenario, latency_s, status))
+
+    def summary(self, wall_s: float) -> dict:
+        def stats(samples):
+            lat = sorted(s[1] * 1000.0 for s in samples)
+            errors: Dict[str, int] = {}
+            for _, _, status in samples:
+                if status != 200:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+            return {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / wall_s, 2) if wall_s > 0 else None,
+                "error_rate": round(sum(errors.values()) / len(samples), 4) if samples else None,
+                "errors": errors,
+                "latency_ms": {
+                    "p50": percentile(lat, 50),
+                    "p95": percentile(lat, 95),
+                    "p99": percentile(lat, 99),
+                    "max": lat[-1] if lat else None,
+                    "mean": sum(lat) / len(lat) if lat else None,
+                },
+            }
+
+        by_scenario: Dict[str, list] = {}
+        for sample in self.samples:
+            by_scenario.setdefault(sample[0], []).append(sample)
+        return {
+            "wall_clock_s": round(wall_s, 3),
+            "overall": stats(self.samples),
+            "scenarios": {sc: stats(v) for sc, v in sorted(by_scenario.items())},
+        }
+
+
+async def send(client: httpx.AsyncClient, url: str, body: dict, rec: Recorder, t_start: float):
+    """t_start = instant prévu (boucle ouverte) ou d'envoi : évite l'omission coordonnée."""
+    scenario = expected_scenario(body["payload"])
+    try:
+        r = await client.post(url, json=body)
+        status = r.status_code
+        if status == 200:
+            scenario = r.json().get("scenario", scenario)
+    except httpx.HTTPError:
+        status = 0  # erreur réseau / timeout
+    rec.add(scenario, time.perf_counter() - t_start, status)
+
+
+async def run_closed_loop(url, bodies, concurrency, n_requests, duration, timeout) -> Tuple[Recorder, float]:
+    rec = Recorder()
+    source = itertools.cycle(bodies)
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker(client):
+        while True:
+            if n_requests is not None and next(counter) >= n_requests:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            await send(client, url, next(source), rec, time.perf_counter())
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return rec, time.perf_counter() - t0
+
+
+async def run_open_loop(url, bodies, rate, n_requests, duration, timeout, max_in_flight) -> Tuple[Recorder, float]:
+    rec = Recorder()
+    total = n_requests if n_requests is not None else int(rate * duration)
+    interval = 1.0 / rate
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        t0 = time.perf_counter()
+        tasks = []
+        for i, body in zip(range(total), itertools.cycle(bodies)):
+            scheduled = t0 + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, url, body, rec, scheduled)))
+        await asyncio.gather(*tasks)
+        return rec, time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rejoue des payloads contre /predict")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--jsonl", action="append", default=[], help="fichier JSONL de payloads (répétable)")
+    parser.add_argument("--db", help="base SQLite des inférences à rejouer")
+    parser.add_argument("--db-limit", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=8, help="boucle fermée : requêtes simultanées")
+    parser.add_argument("--rate", type=float, help="boucle ouverte : requêtes/s à cadence fixe")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="boucle ouverte : connexions max")
+    parser.add_argument("--requests", type=int, help="nombre total de requêtes")
+    parser.add_argument("--duration", type=float, help="durée en secondes")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--out", help="fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    bodies, skipped = [], 0
+    for path in args.jsonl:
+        b, s = load_jsonl(path)
+        bodies += b
+        skipped += s
+    if args.db:
+        bodies += load_db(args.db, args.db_limit)
+    if not bodies:
+        print(f"No payload to replay ({skipped} lines skipped)", file=sys.stderr)
+        return 1
+    if args.requests is None and args.duration is None:
+        args.requests = len(bodies)
+
+    url = args.url.rstrip("/") + "/predict"
+    if args.rate:
+        if args.requests is None and args.duration is None:
+            parser.error("--rate needs --requests or --duration")
+        rec, wall = asyncio.run(run_open_loop(url, bodies, args.rate, args.requests, args.duration,
+                                              args.timeout, args.max_in_flight))
+        mode = {"mode": "open", "rate": args.rate}
+    else:
+        rec, wall = asyncio.run(run_closed_loop(url, bodies, args.concurrency, args.requests, args.duration,
+                                                args.timeout))
+        mode = {"mode": "closed", "concurrency": args.concurrency}
+
+    report = {
+        "started_at": datetime.utcnow().isoformat(),
+        "url": url,
+        **mode,
+        "payloads": len(bodies),
+        "skipped_lines": skipped,
+        **rec.summary(wall),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
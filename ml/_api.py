@@ -0,0 +1,23 @@
+"""
+Chargement du module de l'API (api/app.py) par les scripts hors de api/
+(ml/, benchmarks/, loadtest/).
+
+Le module est importé sous le nom "app", avec api/ dans sys.path, comme par
+serve.py et les tests : un seul module partagé, que les processus du pool
+d'entraînement (forkserver) savent réimporter.
+
+    from _api import load_api          # depuis ml/
+    sys.path.insert(0, str(ROOT / "ml"))
+    from _api import load_api          # depuis benchmarks/ ou loadtest/
+"""
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+
+
+def load_api():
+    if str(API_DIR) not in sys.path:
+        sys.path.insert(0, str(API_DIR))
+    import app
+    return app
@@ -0,0 +1,44 @@
+"""
+Exporte les artefacts compilés (model_s*.compiled.json) chargés par l'API en
+mode service seul (SERVING_ONLY=1), pour les modèles de base et les versions
+du registre qui n'en ont pas encore (les versions créées par /train les
+contiennent déjà).
+
+    python ml/export_compiled.py            # baseline + versions du registre
+    python ml/export_compiled.py --force    # réécrit les artefacts existants
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from _api import load_api
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="Réécrire les artefacts existants")
+    args = parser.parse_args()
+
+    api = load_api()
+    if api.SERVING_ONLY:
+        sys.exit("Export impossible avec SERVING_ONLY=1 (les pipelines joblib sont nécessaires)")
+    versions = [v["version"] for v in api.list_versions()]
+    for version in versions:
+        models = api.ModelSet(version, api._version_paths(version))
+        for scenario, path in models.paths.items():
+            target = api.compiled_path(path)
+            if target.exists() and not args.force:
+                continue
+            models.get_model(scenario)
+            compiled = models.compiled.get(scenario)
+            if compiled is None:
+                print(f"{version}/{scenario}: pipeline non supporté par l'encodeur compilé, ignoré")
+                continue
+            api._write_json_atomic(target, compiled.to_dict())
+            print(f"{version}/{scenario}: {target.relative_to(ROOT) if target.is_relative_to(ROOT) else target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Génère models/drift_profile.json, profil de référence de la dérive des
+entrées (/drift) pour les modèles de base. Les versions créées par /train
+ont leur propre profil, calculé sur leurs données d'entraînement.
+
+    python ml/export_drift_profile.py                  # jeu d'entraînement courant
+    python ml/export_drift_profile.py --data autre.csv
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from _api import load_api
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil de référence de la dérive des entrées")
+    parser.add_argument("--data", default=None, help="défaut : jeu d'entraînement courant (data/student_full.csv)")
+    args = parser.parse_args()
+
+    api = load_api()
+    data = Path(args.data) if args.data else None
+    profile = api.build_drift_profile(api.load_training_data(data, columns=list(api.FEATURE_TEMPLATE)))
+    path = api.drift_profile_path(api.BASELINE_VERSION)
+    api._write_json_atomic(path, profile)
+    print(f"{len(profile['features'])} features, {profile['n_samples']} lignes → {path.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Génère models/feature_schema.json, à partir duquel l'API construit le modèle
+de requête typé de /predict pour les modèles de base : domaine de chaque
+variable catégorielle (valeurs vues dans les données d'entraînement) et bornes
+des variables numériques (étendue observée, élargie au domaine documenté du
+jeu UCI). Les versions créées par /train ont leur propre schéma, calculé sur
+leurs données d'entraînement.
+
+    python ml/export_feature_schema.py                       # jeu d'entraînement courant
+    python ml/export_feature_schema.py --data autre.csv
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from _api import load_api
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schéma typé des payloads de /predict")
+    parser.add_argument("--data", default=None, help="défaut : jeu d'entraînement courant (data/student_full.csv)")
+    parser.add_argument("--out", default=None, help="défaut : schéma de la baseline (models/feature_schema.json)")
+    args = parser.parse_args()
+
+    api = load_api()
+    df = api.load_training_data(Path(args.data) if args.data else None, columns=list(api.FEATURE_TEMPLATE))
+    schema = api.build_feature_schema(df)
+    out = Path(args.out) if args.out else api.feature_schema_path(api.BASELINE_VERSION)
+    with open(out, "w") as f:
+        json.dump(schema, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"{len(schema['numeric'])} numériques, {len(schema['categorical'])} catégorielles → {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 \
+import json
+
 import mlflow
 import mlflow.sklearn
 import pandas as pd
@@ -11,7 +13,8 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder
 
 def build_pipeline(model, X):
-    cat_cols = X.select_dtypes(include=["object"]).columns.tolist()
+    # object/str (CSV) ou category (fichier colonnaire)
+    cat_cols = [c for c in X.columns if not pd.api.types.is_numeric_dtype(X[c])]
     num_cols = [c for c in X.columns if c not in cat_cols]
     pre = ColumnTransformer([
         ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
@@ -19,10 +22,19 @@ def build_pipeline(model, X):
     ])
     return Pipeline([("pre", pre), ("model", model)])
 
-def main(data_csv="data/student_full.csv"):
-    df = pd.read_csv(data_csv)
+def load_data(path):
+    """CSV (source versionnée), ou fichier colonnaire mappé en mémoire (pyarrow requis) ; sans G3."""
+    if path.endswith(".csv"):
+        return pd.read_csv(path).drop(columns=["G3"])
+    from pyarrow import feather
+    with open(path.rsplit(".", 1)[0] + ".schema.json") as f:
+        columns = [c["name"] for c in json.load(f)["columns"] if c["name"] != "G3"]
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+def main(data_path="data/student_full.csv"):
+    df = load_data(data_path)
     y = df["success"]
-    X = df.drop(columns=["success","G3"])
+    X = df.drop(columns=["success"])
 
     cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
     model = LogisticRegression(max_iter=2000)
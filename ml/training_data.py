@@ -0,0 +1,48 @@
+"""
+Import / export CSV du jeu d'entraînement. L'import valide le CSV (même
+validation que /upload-data), le normalise dans data/student_full.csv (source
+versionnée) et reconstruit le fichier colonnaire dérivé (data/student_full.feather
++ student_full.schema.json), lu par /train et les scripts d'export.
+
+    python ml/training_data.py import nouveau_jeu.csv
+    python ml/training_data.py export jeu.csv
+    python ml/training_data.py export notes.csv --columns G1,G2,G3
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from _api import load_api
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="CSV → fichier colonnaire (remplace le jeu courant)")
+    p.add_argument("csv")
+    p = sub.add_parser("export", help="fichier colonnaire → CSV")
+    p.add_argument("csv")
+    p.add_argument("--columns", help="colonnes séparées par des virgules (défaut : toutes)")
+    args = parser.parse_args()
+
+    api = load_api()
+    store = api.TRAIN_STORE_PATH
+    if args.command == "import":
+        try:
+            summary = api.replace_training_data(Path(args.csv))
+        except api.DataValidationError as e:
+            sys.exit(f"CSV invalide : {e}")
+        print(f"{summary['rows']} lignes, {len(summary['columns'])} colonnes → {api.DATA_PATH.relative_to(ROOT)}, "
+              f"{store.relative_to(ROOT)} ({store.stat().st_size} octets)")
+    else:
+        if not api.ensure_training_store():
+            sys.exit(f"Jeu d'entraînement absent : {api.DATA_PATH}")
+        columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+        n = api.export_training_csv(Path(args.csv), columns=columns)
+        print(f"{n} lignes → {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import sys
+from importlib import util
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def load_api(tmp_path, monkeypatch):
+    """
+    Fabrique : recharge api/app.py isolé dans tmp_path.
+
+    Le module est chargé sous le nom "app", avec api/ dans sys.path, comme par
+    serve.py : les processus du pool d'entraînement (forkserver) le réimportent.
+    MODEL_REGISTRY_DIR est posé avant l'import (le manifeste est lu au chargement
+    du module), puis la base d'inférences, le registre et MLflow sont redirigés
+    vers tmp_path. db_init=False laisse la base vierge (ex. table historique à
+    créer avant la migration).
+    """
+    monkeypatch.setenv("MODEL_REGISTRY_DIR", str(tmp_path / "registry"))
+    monkeypatch.syspath_prepend(str(Path("api").resolve()))
+
+    def load(db_init: bool = True):
+        spec = util.spec_from_file_location("app", "api/app.py")
+        mod = util.module_from_spec(spec)
+        monkeypatch.setitem(sys.modules, "app", mod)
+        spec.loader.exec_module(mod)
+        mod.DB_PATH = tmp_path / "inferences.sqlite"
+        mod.REGISTRY_DIR = tmp_path / "registry"
+        mod.MLFLOW_TRACKING_URI = "file:" + str(tmp_path / "mlruns")
+        if db_init:
+            mod.db_init()
+        return mod
+
+    return load
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+
+def test_admission_control_sheds_load(load_api):
+    """Au-delà de la concurrence + file d'attente : 503 immédiat avec Retry-After."""
+    mod = load_api()
+    mod._admission = mod.AdmissionController(limit=1, queue_max=1, queue_timeout_ms=5000)
+    real_predict = mod._predict
+    mod._predict = lambda inp, timer: time.sleep(0.3) or real_predict(inp, timer)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=mod.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/predict", json={"payload": {}}) for _ in range(4)))
+
+    statuses = sorted(r.status_code for r in asyncio.run(burst()))
+    # 1 en cours + 1 en file → servis ; les 2 autres refusés
+    assert statuses == [200, 200, 503, 503]
+    assert mod._admission.rejected["queue_full"] == 2
+
+    mod._admission = mod.AdmissionController(limit=1, queue_max=10, queue_timeout_ms=50)
+    statuses = sorted(r.status_code for r in asyncio.run(burst()))
+    assert statuses == [200, 503, 503, 503]
+    assert mod._admission.rejected["timeout"] == 3
+    assert "student_api_inference_rejected_total" in TestClient(mod.app).get("/metrics").text
@@ -1,13 +1,11 @@
-import sys
-from importlib import util
+import threading
+import time
+
 from fastapi.testclient import TestClient
 
-def test_health():
+def test_health(load_api):
     """Test que l'API démarre et /health répond."""
-    spec = util.spec_from_file_location("student_api", "api/app.py")
-    mod = util.module_from_spec(spec)
-    sys.modules["student_api"] = mod
-    spec.loader.exec_module(mod)
+    mod = load_api(db_init=False)
     client = TestClient(mod.app)
     
     # Test /health seulement (pas besoin des modèles)
@@ -16,3 +14,63 @@ def test_health():
     data = r.json()
     assert data["status"] == "ok"
     assert "models" in data
+
+
+def test_startup_warms_models(monkeypatch, load_api):
+    """Au démarrage, les 3 modèles sont chargés une seule fois et préchauffés."""
+    mod = load_api(db_init=False)
+
+    # joblib est importé à la demande par ModelSet.get_model
+    import joblib
+    calls = []
+    real_load = joblib.load
+    monkeypatch.setattr(joblib, "load", lambda path, **kw: calls.append(path) or real_load(path, **kw))
+
+    # Requêtes concurrentes sur un modèle pas encore chargé : un seul chargement
+    models = mod.current_models()
+    threads = [threading.Thread(target=models.get_model, args=("S4",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+
+    with TestClient(mod.app) as client:
+        data = client.get("/health").json()
+    assert data["ready"] is True
+    assert len(calls) == 3
+    for info in data["models"].values():
+        assert info["loaded"] and info["load_ms"] is not None and info["warmup_ms"] is not None
+
+
+def test_manifest_watcher_logs_reload_failure(caplog, load_api):
+    """Manifeste illisible : la version active est conservée et l'échec passe par le logger de l'API."""
+    mod = load_api(db_init=False)
+    mod.REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    watcher = mod.ManifestWatcher(0.05)
+    watcher.start()
+    try:
+        with caplog.at_level("INFO", logger="student_api"):
+            (mod.REGISTRY_DIR / "manifest.json").write_text("{pas du json")
+            deadline = time.time() + 5
+            while not caplog.records and time.time() < deadline:
+                time.sleep(0.05)
+    finally:
+        watcher.stop()
+    record = caplog.records[0]
+    assert record.name == "student_api" and record.levelname == "ERROR" and record.exc_info
+    assert record.getMessage() == "Model reload failed, keeping baseline"
+    assert mod.current_models().version == "baseline"
+
+
+def test_cold_start_is_measured_from_process_start(monkeypatch, load_api):
+    """cold_start part du début du processus : PROCESS_START_TIME du point d'entrée, sinon /proc."""
+    before_import = time.time()
+    mod = load_api(db_init=False)
+    # Sans variable : démarrage du processus pytest (/proc), bien avant l'import du module
+    assert mod.PROCESS_START_TIME < before_import - 0.1
+    assert mod.COLD_START["import_ms"] > (time.time() - before_import) * 1000.0
+
+    monkeypatch.setenv("PROCESS_START_TIME", repr(time.time() - 5))
+    mod = load_api(db_init=False)
+    assert 5000 <= mod.COLD_START["import_ms"] < 60000
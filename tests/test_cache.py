@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+
+def test_prediction_cache_hits_and_invalidation(load_api):
+    mod = load_api()
+    client = TestClient(mod.app)
+
+    first = client.post("/predict", json={"payload": {"G1": 12, "absences": 3}}).json()
+    # Même payload complété (12 == 12.0, valeur du template explicitée) → servi par le cache
+    again = client.post("/predict", json={"payload": {"absences": 3.0, "G1": 12.0, "school": "GP"}}).json()
+    assert not first["cached"] and again["cached"]
+    assert again["pred_proba"] == first["pred_proba"]
+    assert (mod._prediction_cache.hits, mod._prediction_cache.misses) == (1, 1)
+
+    # Changement de version active → cache vidé
+    mod._commit_manifest({"active": "baseline", "history": []}, mod.ModelSet("baseline", dict(mod.MODELS)))
+    assert not client.post("/predict", json={"payload": {"G1": 12, "absences": 3}}).json()["cached"]
+    assert len(client.get("/inferences").json()["inferences"]) == 3
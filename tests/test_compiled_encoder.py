@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+def test_compiled_matches_pipeline(load_api):
+    """L'encodeur précompilé donne les mêmes probabilités que model.predict_proba."""
+    mod = load_api(db_init=False)
+    df = mod.load_training_data().head(200)
+    df["school"] = df["school"].astype(str)
+    # Quelques catégories inconnues pour vérifier handle_unknown="ignore"
+    df.loc[df.index[:5], "school"] = "XX"
+
+    for scenario in mod.MODELS:
+        model = mod.get_model(scenario)
+        compiled = mod.compile_pipeline(model)
+        assert compiled is not None
+
+        rows = [mod.build_features(r, scenario) for r in df.to_dict(orient="records")]
+        expected = model.predict_proba(pd.DataFrame(rows))[:, 1]
+
+        single = np.array([compiled.predict_proba_one(r) for r in rows])
+        np.testing.assert_allclose(single, expected, rtol=0, atol=1e-12)
+        np.testing.assert_allclose(compiled.predict_proba_many(rows), expected, rtol=0, atol=1e-12)
+
+
+def test_serving_only_mode(tmp_path, monkeypatch, load_api):
+    """SERVING_ONLY=1 : scoring depuis les artefacts compilés, sans pandas/joblib/sklearn, /train désactivé."""
+    reference = load_api(db_init=False)
+    rows = [reference.build_features(r, "S4") for r in reference.load_training_data().head(50).to_dict(orient="records")]
+    expected = reference.get_model("S4").predict_proba(pd.DataFrame(rows))[:, 1]
+
+    monkeypatch.setenv("SERVING_ONLY", "1")
+    mod = load_api()
+    compiled = mod.get_model("S4")
+    assert isinstance(compiled, mod.CompiledModel)
+    np.testing.assert_allclose(compiled.predict_proba_many(rows), expected, rtol=0, atol=1e-12)
+
+    from fastapi.testclient import TestClient
+    with TestClient(mod.app) as client:
+        r = client.post("/predict", json={"payload": {"G1": 12, "G2": 13, "absences": 4}})
+        assert r.status_code == 200
+        assert client.post("/train").status_code == 501
+        health = client.get("/health").json()
+    assert health["serving_only"] is True and health["ready"] is True
+    assert health["cold_start"]["first_prediction_ms"] is not None
+
+    # Processus neuf : la pile d'entraînement n'est jamais importée
+    code = (
+        "import sys; from importlib import util;"
+        "spec = util.spec_from_file_location('student_api', 'api/app.py');"
+        "mod = util.module_from_spec(spec); spec.loader.exec_module(mod);"
+        "mod.current_models().load_all();"
+        "print(sorted(m for m in ('pandas', 'joblib', 'sklearn', 'mlflow') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         env=dict(os.environ, MODEL_REGISTRY_DIR=str(tmp_path / "registry")))
+    assert out.stdout.strip() == "[]"
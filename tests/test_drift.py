@@ -0,0 +1,67 @@
+import json
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+
+
+def test_drift_counters_and_report(load_api):
+    """Compteurs incrémentaux par scénario, écrits avec le journal, comparés au profil d'entraînement."""
+    mod = load_api()
+    client = TestClient(mod.app)
+    with open("loadtest/sample_payloads.jsonl") as f:
+        payloads = [json.loads(line)["payload"] for line in f]
+    s2 = [p for p in payloads if "G1" in p and "G2" in p][:60]
+
+    r = client.post("/predict/batch", json={"items": [{"payload": p} for p in s2]})
+    assert r.status_code == 200
+    report = client.get("/drift?scenario=S2").json()
+    assert report["model_version"] == "baseline" and report["reference"]["n_samples"] > 0
+    features = report["scenarios"]["S2"]["features"]
+    assert report["scenarios"]["S2"]["n_requests"] == 60
+    assert features["absences"]["n"] == 60 and features["absences"]["psi"] < mod.DRIFT_PSI_ALERT
+    assert "sex" not in features  # variables sensibles exclues du scénario
+
+    # Trafic décalé : absences élevées → alerte (PSI et KS)
+    shifted = [{**p, "absences": 40.0} for p in s2]
+    for p in shifted[:40]:
+        assert client.post("/predict", json={"payload": p}).status_code == 200
+    features = client.get("/drift?scenario=S2").json()["scenarios"]["S2"]["features"]
+    assert features["absences"]["status"] == "alert" and features["absences"]["ks"] > 0.3
+    assert features["school"]["unseen_share"] == 0.0
+
+    conn = sqlite3.connect(mod.DB_PATH)
+    n = conn.execute("SELECT count FROM drift_counts WHERE scenario = 'S2' AND feature = '__requests__'").fetchone()[0]
+    conn.close()
+    assert n == 100
+    assert client.get("/drift?version=unknown").status_code == 404
+
+
+def test_drift_counters_flushed_without_log_rows(load_api):
+    """Compteurs sans ligne de journal associée : écrits au tick d'inactivité du writer et à l'arrêt."""
+    mod = load_api()
+    features = mod.build_features({"G1": 12, "G2": 13}, "S2")
+
+    def requests_counted():
+        conn = sqlite3.connect(mod.DB_PATH)
+        row = conn.execute("SELECT count FROM drift_counts WHERE feature = '__requests__'").fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    # Writer démarré, file vide : écriture au tick d'inactivité
+    writer = mod.InferenceLogWriter(mod.DB_PATH, idle_flush_s=0.05)
+    writer.start()
+    try:
+        mod._drift_monitor.observe("baseline", "S2", features)
+        deadline = time.time() + 5
+        while requests_counted() == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        assert requests_counted() == 1 and not mod._drift_monitor.pending
+    finally:
+        writer.close()
+
+    # Writer jamais démarré (LOG_MODE=sync) : écriture par le handler d'arrêt
+    mod.LOG_MODE = "sync"
+    with TestClient(mod.app):
+        mod._drift_monitor.observe("baseline", "S2", features)
+    assert requests_counted() == 2
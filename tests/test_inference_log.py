@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def test_async_log_writer_flushes_on_shutdown(load_api):
+    """Le writer en arrière-plan écrit tout ce qui a été mis en file avant l'arrêt."""
+    mod = load_api(db_init=False)
+    with TestClient(mod.app) as client:
+        assert mod._log_writer.running
+        for i in range(20):
+            r = client.post("/predict", json={"payload": {"absences": i}, "session_id": "t"})
+            assert r.status_code == 200
+    assert not mod._log_writer.running
+
+    conn = sqlite3.connect(mod.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM inferences").fetchone()[0] == 20
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_log_writer_backpressure(load_api):
+    """File pleine → LogQueueFull, traduit en 503 par /predict."""
+    mod = load_api()
+    writer = mod.InferenceLogWriter(mod.DB_PATH, queue_max=1, queue_timeout_ms=1)
+    writer.thread = type("Alive", (), {"is_alive": lambda self: True})()  # writer "bloqué"
+    writer.queue.put({"rows": [], "done": None, "error": None})
+    mod._log_writer = writer
+
+    client = TestClient(mod.app)
+    r = client.post("/predict", json={"payload": {}})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+    assert writer.stats["rejected"] == 1
+
+
+def test_strict_writer_commits_without_waiting_and_times_out(load_api):
+    """Mode strict : commit immédiat du lot attendu, 503 si la confirmation n'arrive pas."""
+    import time
+
+    mod = load_api()
+    writer = mod.InferenceLogWriter(mod.DB_PATH, durability="strict", flush_interval_ms=1000)
+    writer.start()
+    t0 = time.perf_counter()
+    for i in range(10):
+        writer.submit([mod._inference_row({"absences": i}, 0, 0.1, "s", "S4", "2024-01-01T00:00:00")])
+    # Sans vidage immédiat, chaque requête attendrait flush_interval_ms (10 s au total)
+    assert time.perf_counter() - t0 < 2.0
+    writer.close()
+    assert writer.stats["rows_written"] == 10
+
+    stuck = mod.InferenceLogWriter(mod.DB_PATH, durability="strict", strict_timeout_ms=50)
+    stuck.thread = type("Alive", (), {"is_alive": lambda self: True})()  # writer "bloqué"
+    mod._log_writer = stuck
+    r = TestClient(mod.app).post("/predict", json={"payload": {}})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+    assert stuck.stats["timeouts"] == 1
+
+
+def test_inferences_keyset_pagination_and_filters(load_api):
+    """/inferences : curseur before_id, filtres et projection sans input_json."""
+    mod = load_api()
+    mod.db_log_many(
+        [({"absences": i}, i % 2, 0.5, "a" if i < 6 else "b", "S4") for i in range(10)]
+    )
+    client = TestClient(mod.app)
+
+    page1 = client.get("/inferences?limit=4&fields=ts,pred_proba").json()
+    assert [r["id"] for r in page1["inferences"]] == [10, 9, 8, 7]
+    assert set(page1["inferences"][0]) == {"id", "ts", "pred_proba"}
+    page2 = client.get(f"/inferences?limit=4&before_id={page1['next_before_id']}").json()
+    assert [r["id"] for r in page2["inferences"]] == [6, 5, 4, 3]
+
+    rows = client.get("/inferences?session_id=a&label=1").json()["inferences"]
+    assert [r["id"] for r in rows] == [6, 4, 2]
+    assert client.get("/inferences?since=2000-01-01T00:00:00Z&scenario=S2").json()["inferences"] == []
+    assert client.get("/inferences?fields=nope").status_code == 400
+
+
+def test_inferences_export_streams_ndjson_and_csv(load_api):
+    mod = load_api()
+    mod.EXPORT_CHUNK_SIZE = 3
+    mod.db_log_many([({"absences": i}, 1, 0.9, "x", "S4") for i in range(7)])
+    client = TestClient(mod.app)
+
+    r = client.get("/inferences/export?format=ndjson&fields=pred_label")
+    lines = r.text.strip().split("\n")
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in lines] == list(range(1, 8))
+
+    r = client.get("/inferences/export?format=csv&session_id=x")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 7
+    assert json.loads(rows[0]["input_json"]) == {"absences": 0}
+
+
+def test_compact_log_roundtrip_and_aggregates(load_api):
+    """Journal compact : colonnes typées, payload restitué exactement, agrégats sans JSON."""
+    mod = load_api()
+    # Ligne au format historique (JSON brut), réencodée par compact_inference_log
+    legacy = {"absences": 6, "school": "MS", "G1": 12}
+    conn = sqlite3.connect(mod.DB_PATH)
+    with conn:
+        conn.execute("INSERT INTO inferences (ts, scenario, input_json, pred_label, pred_proba) VALUES (?, ?, ?, ?, ?)",
+                     ("2024-01-01T00:00:00", "S3", json.dumps(legacy), 1, 0.7))
+    conn.close()
+
+    payloads = [
+        {"age": 17.0, "absences": 4.0, "G1": 12.0, "school": "GP"},  # age et school = référence du template
+        {"age": 19.0, "higher": "no"},
+        {"absences": 3, "famrel": 5.0},  # entier conservé comme tel
+        {"G2": float("inf"), "Mjob": "health"},
+        {"unknown": [1, 2]},  # non représentable : reste en JSON
+    ]
+    mod.db_log_many([(p, 1, 0.5, "c", "S4") for p in payloads])
+    assert mod.compact_inference_log() == {"scanned": 2, "compacted": 1, "kept_json": 1}
+
+    conn = sqlite3.connect(mod.DB_PATH)
+    stored = conn.execute("SELECT input_json, f_age, f_school, f_higher FROM inferences ORDER BY id").fetchall()
+    assert [r[0] is None for r in stored] == [True, True, True, True, True, False]
+    assert stored[1][1:3] == (None, None) and isinstance(stored[2][3], int)
+    stats = conn.execute(
+        "SELECT COUNT(*), AVG(age), SUM(school = 'MS'), SUM(higher = 'no') FROM inference_features WHERE age IS NOT NULL"
+    ).fetchone()
+    assert stats == (5, (17.0 * 4 + 19.0) / 5, 1, 1)
+    conn.close()
+
+    rows = list(mod.db_query(mod.InferenceFilters(), ["id", "input_json"], descending=False))
+    assert [json.loads(r["input_json"]) for r in rows] == [legacy] + payloads
+    # même texte que json.dumps (clés dans l'ordre du template), y compris ±inf (« Infinity »)
+    ordered = [{k: p[k] for k in mod.FEATURE_TEMPLATE if k in p} for p in payloads[:-1]] + payloads[-1:]
+    assert [r["input_json"] for r in rows[1:]] == [json.dumps(p, ensure_ascii=False) for p in ordered]
+    assert type(json.loads(rows[3]["input_json"])["absences"]) is int
+
+
+def test_rollups_match_raw_log(load_api):
+    """Agrégats horaires : initialisés depuis l'existant, maintenus à l'écriture, identiques au brut."""
+    mod = load_api(db_init=False)
+    conn = sqlite3.connect(mod.DB_PATH)
+    conn.execute("CREATE TABLE inferences (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, session_id TEXT, "
+                 "scenario TEXT, input_json TEXT, pred_label INTEGER, pred_proba REAL)")
+    with conn:
+        conn.execute("INSERT INTO inferences (ts, session_id, scenario, input_json, pred_label, pred_proba) "
+                     "VALUES ('2024-01-01T09:15:00', NULL, 'S2', '{}', 0, 0.2)")
+    conn.close()
+    mod.db_init()
+
+    records = [({"absences": i}, i % 2, i / 10, "a" if i < 4 else None, "S3" if i % 3 else "S4") for i in range(8)]
+    for batch, ts in [(records[:4], "2024-01-01T10:05:00"), (records[4:], "2024-01-01T10:55:00"),
+                      (records[:2], "2024-01-02T08:00:00")]:
+        mod._db_log_rows([mod._inference_row(*rec, ts) for rec in batch])
+
+    with TestClient(mod.app) as client:
+        r = client.get("/inferences/stats", params={"bucket": "day"})
+        assert r.status_code == 200
+        days = {s["bucket"]: s for s in r.json()["stats"]}
+        assert days["2024-01-01"]["n"] == 9 and days["2024-01-02"]["n"] == 2
+        assert abs(days["2024-01-01"]["mean_proba"] - (0.2 + sum(i / 10 for i in range(8))) / 9) < 1e-9
+
+        r = client.get("/inferences/stats", params={"group_by": "session_id,scenario", "since": "2024-01-01T10:30:00",
+                                                    "until": "2024-01-02T00:00:00"})
+        stats = r.json()["stats"]
+        assert r.json()["group_by"] == ["scenario", "session_id"]
+        conn = sqlite3.connect(mod.DB_PATH)
+        raw = conn.execute(
+            "SELECT scenario, session_id, COUNT(*), AVG(pred_label), AVG(pred_proba) FROM inferences "
+            "WHERE ts >= '2024-01-01T10:00:00' AND ts < '2024-01-02' GROUP BY 1, 2"
+        ).fetchall()
+        conn.close()
+        got = {(s["scenario"], s["session_id"]): (s["n"], s["success_rate"], s["mean_proba"]) for s in stats}
+        assert got.keys() == {r[:2] for r in raw}
+        for scenario, session_id, n, rate, mean in raw:
+            assert got[scenario, session_id][0] == n
+            assert abs(got[scenario, session_id][1] - rate) < 1e-9 and abs(got[scenario, session_id][2] - mean) < 1e-9
+        assert client.get("/inferences/stats", params={"group_by": "label"}).status_code == 400
+
+    # La passe de reconstruction retombe sur les mêmes agrégats
+    def snapshot():
+        conn = sqlite3.connect(mod.DB_PATH)
+        out = [conn.execute(f"SELECT *, round(sum_proba, 9) FROM {t} ORDER BY 1, 2, 3").fetchall()
+               for t in mod.ROLLUP_TABLES]
+        out = [[r[:-2] + r[-1:] for r in rows] for rows in out]
+        conn.close()
+        return out
+
+    before = snapshot()
+    mod.rebuild_rollups()
+    assert snapshot() == before
+
+
+def test_archive_moves_old_days_to_parquet(load_api):
+    """Rétention : jours anciens en Parquet, retirés de SQLite, toujours exportés et agrégés."""
+    pytest.importorskip("pyarrow")
+    mod = load_api()
+    for day in range(1, 6):
+        mod._db_log_rows([
+            mod._inference_row({"absences": i}, i % 2, i / 10, f"s{i % 2}", "S3", f"2024-01-0{day}T{10 + i:02d}:00:00")
+            for i in range(day * 4)
+        ])
+    mod.db_log_many([({"unknown": day}, 1, 0.9, "s0", "S2") for day in range(3)])  # JSON brut conservé
+    with TestClient(mod.app) as client:
+        before = client.get("/inferences/export").text
+        stats_before = client.get("/inferences/stats", params={"bucket": "day", "group_by": "session_id"}).json()
+
+    stats = mod.archive_inference_log(retention_days=1, now=mod.datetime(2024, 1, 5, 8))
+    assert stats["days"] == 3 and stats["rows"] == 4 + 8 + 12
+    assert stats["incremental_vacuum"]
+    assert [p.parent.name for p in mod.archive_partitions()] == ["date=2024-01-01", "date=2024-01-02", "date=2024-01-03"]
+    assert [p.parent.name for p in mod.archive_partitions(since=mod.datetime(2024, 1, 2, 12), until=mod.datetime(2024, 1, 3))] \
+        == ["date=2024-01-02"]
+    conn = sqlite3.connect(mod.DB_PATH)
+    assert conn.execute("SELECT MIN(ts) FROM inferences").fetchone()[0] == "2024-01-04T10:00:00"
+    conn.close()
+    assert mod.archive_inference_log(retention_days=1, now=mod.datetime(2024, 1, 5, 8))["rows"] == 0
+
+    with TestClient(mod.app) as client:
+        assert client.get("/inferences/export").text == before
+        r = client.get("/inferences/export", params={"format": "csv", "since": "2024-01-02T11:00:00",
+                                                     "until": "2024-01-04T12:00:00", "session_id": "s1",
+                                                     "fields": "ts,pred_label"})
+        rows = list(csv.DictReader(io.StringIO(r.text)))
+        assert [row["ts"] for row in rows] == ["2024-01-02T11:00:00", "2024-01-02T13:00:00", "2024-01-02T15:00:00",
+                                               "2024-01-02T17:00:00"] + [f"2024-01-03T{h}:00:00" for h in (11, 13, 15, 17, 19, 21)] \
+            + ["2024-01-04T11:00:00"]
+        assert client.get("/inferences/stats", params={"bucket": "day", "group_by": "session_id"}).json() == stats_before
+        mod.rebuild_rollups()
+        assert client.get("/inferences/stats", params={"bucket": "day", "group_by": "session_id"}).json() == stats_before
@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+
+def run_cli(tmp_path, *args):
+    env = dict(os.environ, INFERENCE_DB_PATH=str(tmp_path / "inferences.sqlite"),
+               INFERENCE_ARCHIVE_DIR=str(tmp_path / "archive"), MODEL_REGISTRY_DIR=str(tmp_path / "registry"))
+    env.pop("RETENTION_DAYS", None)
+    return subprocess.run([sys.executable, "maintenance.py", *args], cwd="api", env=env, capture_output=True, text=True)
+
+
+def test_maintenance_cli_compacts_rolls_up_and_archives(tmp_path):
+    """compact-log, rollup et archive sur une base au format historique (JSON brut)."""
+    pytest.importorskip("pyarrow")
+    db = tmp_path / "inferences.sqlite"
+    today = datetime.utcnow().date().isoformat()
+    rows = [(f"2020-01-0{day}T{10 + i}:00:00", f"s{i % 2}", "S3", json.dumps({"absences": i, "school": "MS"}), i % 2, i / 10)
+            for day in (1, 2, 3) for i in range(day * 2)]
+    rows += [(f"{today}T00:00:00", None, "S4", json.dumps({"age": 18}), 1, 0.8)] * 2
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE inferences (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, session_id TEXT, "
+                 "scenario TEXT, input_json TEXT, pred_label INTEGER, pred_proba REAL)")
+    with conn:
+        conn.executemany("INSERT INTO inferences (ts, session_id, scenario, input_json, pred_label, pred_proba) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+
+    r = run_cli(tmp_path, "compact-log", "--vacuum")
+    assert r.returncode == 0, r.stderr
+    assert "14 lignes JSON, 14 réencodées, 0 conservées en JSON" in r.stdout
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM inferences WHERE input_json IS NULL").fetchone()[0] == 14
+    assert conn.execute("SELECT SUM(school = 'MS') FROM inference_features").fetchone()[0] == 12
+
+    expected = conn.execute("SELECT * FROM inference_session_rollups ORDER BY 1, 2, 3").fetchall()
+    assert sum(r[3] for r in expected) == 14
+    with conn:
+        conn.execute("DELETE FROM inference_rollups")
+        conn.execute("UPDATE inference_session_rollups SET n = 0")
+    conn.close()
+    r = run_cli(tmp_path, "rollup")
+    assert r.returncode == 0, r.stderr
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT * FROM inference_session_rollups ORDER BY 1, 2, 3").fetchall() == expected
+    assert conn.execute("SELECT SUM(n) FROM inference_rollups").fetchone()[0] == 14
+    conn.close()
+
+    r = run_cli(tmp_path, "archive")
+    assert r.returncode == 2 and "RETENTION_DAYS" in r.stderr
+    r = run_cli(tmp_path, "archive", "--days", "7", "--vacuum")
+    assert r.returncode == 0, r.stderr
+    assert "12 lignes sur 3 jour(s)" in r.stdout
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM inferences").fetchone()[0] == 2
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # INCREMENTAL après --vacuum
+    assert conn.execute("SELECT SUM(n) FROM inference_rollups").fetchone()[0] == 14
+    conn.close()
+
+    import pyarrow.dataset as ds
+    parts = sorted(p.parent.name for p in (tmp_path / "archive").rglob("*.parquet"))
+    assert parts == ["date=2020-01-01", "date=2020-01-02", "date=2020-01-03"]
+    table = ds.dataset(tmp_path / "archive", format="parquet").to_table()
+    assert table.num_rows == 12
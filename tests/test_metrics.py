@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+
+def test_metrics_exposes_stage_histograms(load_api):
+    mod = load_api()
+    client = TestClient(mod.app)
+    client.post("/predict", json={"payload": {"G1": 12, "G2": 13}})
+    mod.INFERENCE_MODE = "pipeline"
+    client.post("/predict", json={"payload": {"G1": 12}})
+    client.post("/predict", json={"payload": {"G1": "abc"}})
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    text = r.text
+    for stage in ("validation", "select_scenario", "merge", "encode", "predict_proba", "db_log"):
+        assert f'student_api_stage_seconds_count{{stage="{stage}"}} ' in text
+    assert 'student_api_predictions_total{scenario="S2"} 1.0' in text
+    assert 'student_api_responses_total{path="/predict",status="422"} 1.0' in text
+    assert "student_api_log_queue_depth 0" in text
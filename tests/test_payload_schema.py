@@ -0,0 +1,28 @@
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_payload_schema_validates_and_coerces(load_api):
+    """Payload typé : énumérations, bornes et clés inconnues rejetées (422), valeurs converties."""
+    mod = load_api()
+    client = TestClient(mod.app)
+
+    bad = [{"school": "XX"}, {"G1": 25}, {"absences": -1}, {"G1": None}, {"G1": "abc"}, {"absence": 3},
+           {"G1": True}, {"absences": False}]
+    for payload in bad:
+        assert client.post("/predict", json={"payload": payload}).status_code == 422, payload
+    r = client.post("/predict/batch", json={"items": [{"payload": {"G1": 12}}, {"payload": {"school": "XX"}}]})
+    assert r.status_code == 422
+    assert client.get("/inferences").json()["inferences"] == []
+
+    r = client.post("/predict", json={"payload": {"G1": "12", "age": 17, "school": "MS"}})
+    assert r.status_code == 200 and r.json()["scenario"] == "S3"
+    logged = json.loads(client.get("/inferences").json()["inferences"][0]["input_json"])
+    # Entier JSON journalisé comme entier (int_mask), chaîne convertie en float
+    assert logged == {"G1": 12.0, "age": 17, "school": "MS"}
+    assert type(logged["age"]) is int and type(logged["G1"]) is float
+
+    # Bornes numériques du schéma exporté : toutes en float
+    bounds = [b for col in mod.FEATURE_SCHEMA["numeric"].values() for b in col.values()]
+    assert bounds and all(type(b) is float for b in bounds)
@@ -0,0 +1,27 @@
+from fastapi.testclient import TestClient
+
+
+def test_predict_batch_matches_single(load_api):
+    """Le lot renvoie les mêmes résultats que /predict, dans l'ordre d'entrée."""
+    mod = load_api()
+    client = TestClient(mod.app)
+
+    payloads = [
+        {"G1": 12, "G2": 13, "absences": 4},
+        {"absences": 10, "studytime": 1},
+        {"G1": 8, "failures": 2},
+        {"G1": 15, "G2": 16},
+    ]
+    r = client.post("/predict/batch", json={"items": [{"payload": p} for p in payloads]})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["n_items"] == 4
+    assert [res["scenario"] for res in data["results"]] == ["S2", "S4", "S3", "S2"]
+    assert data["scenarios"]["S2"]["n_items"] == 2
+
+    for p, res in zip(payloads, data["results"]):
+        single = client.post("/predict", json={"payload": p}).json()
+        assert single["scenario"] == res["scenario"]
+        assert abs(single["pred_proba"] - res["pred_proba"]) < 1e-9
+
+    assert len(client.get("/inferences?limit=100").json()["inferences"]) == 8
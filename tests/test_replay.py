@@ -0,0 +1,41 @@
+import json
+from importlib import util
+
+
+def load_replay():
+    spec = util.spec_from_file_location("student_replay", "loadtest/replay.py")
+    mod = util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_replay_reads_logged_payloads_through_api_codec(load_api):
+    """--db : payloads restitués à l'identique (journal compact et JSON brut), plus récents d'abord."""
+    mod = load_api()
+    payloads = [{"age": 17, "school": "MS", "G1": 12}, {"absences": 3.0}, {"unknown": [1, 2]}]
+    mod.db_log_many([(p, 1, 0.5, f"s{i}", "S4") for i, p in enumerate(payloads)])
+
+    bodies = load_replay().load_db(str(mod.DB_PATH), limit=10)
+    assert bodies == [{"payload": p, "session_id": f"s{i}"} for i, p in reversed(list(enumerate(payloads)))]
+    assert type(bodies[-1]["payload"]["age"]) is int
+
+
+def test_replay_jsonl_accepts_payload_lines(tmp_path):
+    path = tmp_path / "payloads.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"payload": {"G1": 10}, "session_id": "a"}),
+        json.dumps({"absences": 2, "school": "MS"}),
+        json.dumps({"absences": 2, "title": "x"}),  # clé hors template
+        json.dumps({"request_id": "user-001", "title": "t", "body": "b"}),  # ligne de backlog
+        json.dumps({"nested": {"a": 1}}),
+        "not json",
+    ]))
+    bodies, skipped = load_replay().load_jsonl(str(path))
+    assert bodies == [{"payload": {"G1": 10}, "session_id": "a"}, {"payload": {"absences": 2, "school": "MS"}, "session_id": None}]
+    assert skipped == 4
+
+
+def test_replay_sample_payloads_are_all_accepted():
+    """Le fichier de l'exemple du module : toutes les lignes sont des payloads valides."""
+    bodies, skipped = load_replay().load_jsonl("loadtest/sample_payloads.jsonl")
+    assert bodies and skipped == 0
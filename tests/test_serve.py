@@ -0,0 +1,147 @@
+from importlib import util
+
+
+def load_serve():
+    spec = util.spec_from_file_location("student_serve", "api/serve.py")
+    mod = util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_workers_follow_cgroup_cpu_quota(tmp_path, monkeypatch):
+    serve = load_serve()
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+
+    (tmp_path / "cpu.max").write_text("250000 100000\n")
+    assert serve.cpu_quota(tmp_path) == 2.5
+    assert serve.default_workers(tmp_path) == 2
+
+    (tmp_path / "cpu.max").write_text("50000 100000\n")
+    assert serve.default_workers(tmp_path) == 1
+
+    (tmp_path / "cpu.max").unlink()
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("400000")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000")
+    assert serve.default_workers(tmp_path) == 4
+    assert serve.default_train_workers(tmp_path) == 2
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert serve.default_workers(tmp_path) == 3
+    assert serve.default_train_workers(tmp_path) == 1
+
+
+def test_train_workers_default_to_half_the_serving_workers(load_api, monkeypatch):
+    """TRAIN_WORKERS par défaut : moitié des workers de service, pas os.cpu_count()."""
+    monkeypatch.delenv("TRAIN_WORKERS", raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "6")
+    assert load_api(db_init=False).TRAIN_WORKERS == 3
+    monkeypatch.setenv("TRAIN_WORKERS", "5")
+    assert load_api(db_init=False).TRAIN_WORKERS == 5
+
+
+def test_preforked_workers_skip_db_init(load_api, monkeypatch):
+    """Sous serve.py la base est préparée par le parent : le démarrage d'un worker ne refait pas db_init."""
+    from fastapi.testclient import TestClient
+
+    for preforked, expected in (("1", 0), ("0", 1)):
+        monkeypatch.setenv("SERVE_PREFORKED", preforked)
+        mod = load_api()
+        calls = []
+        monkeypatch.setattr(mod, "db_init", lambda: calls.append(1))
+        with TestClient(mod.app):
+            pass
+        assert len(calls) == expected
+
+
+def _metric_samples(text, name):
+    """{labels: valeur} des lignes d'une métrique du format texte Prometheus."""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            labels, value = line[len(name):].rsplit(" ", 1)
+            samples[labels] = float(value)
+    return samples
+
+
+def test_serve_prefork_restarts_workers_and_aggregates_metrics(tmp_path):
+    """serve.py avec 2 workers : /predict, /metrics agrégé, worker tué puis redémarré."""
+    import os
+    import re
+    import signal
+    import socket
+    import subprocess
+    import sys
+    import time
+
+    import httpx
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, MODEL_REGISTRY_DIR=str(tmp_path / "registry"),
+               INFERENCE_DB_PATH=str(tmp_path / "inferences.sqlite"),
+               METRICS_DIR=str(tmp_path / "metrics"), METRICS_FLUSH_S="0.1")
+    out = open(tmp_path / "serve.log", "w")
+    proc = subprocess.Popen([sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+                             "--workers", "2", "--log-level", "warning"],
+                            cwd="api", env=env, stdout=out, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+
+    def log():
+        return (tmp_path / "serve.log").read_text()
+
+    def started():
+        return [int(pid) for pid in re.findall(r"\[serve\] worker (\d+) started", log())]
+
+    def wait_for(predicate, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            result = predicate()
+            if result:
+                return result
+            time.sleep(0.1)
+        raise AssertionError(f"timeout, serve.log:\n{log()}")
+
+    def workers_in_metrics():
+        time.sleep(0.3)  # instantané des autres workers
+        text = httpx.get(f"{base}/metrics").text
+        gauges = _metric_samples(text, "student_api_model_loaded")
+        predictions = sum(_metric_samples(text, "student_api_predictions_total").values())
+        return {int(w) for labels in gauges for w in re.findall(r'worker="(\d+)"', labels)}, predictions
+
+    try:
+        def healthy():
+            try:
+                return httpx.get(f"{base}/health").status_code == 200
+            except httpx.TransportError:
+                return False
+        wait_for(healthy, timeout=60)
+
+        # Parent : base, puis modèles, puis gel du GC, puis fork des workers
+        text = log()
+        steps = [text.index("[serve] database ready"), text.index("loaded in parent"),
+                 text.index("[serve] gc frozen"), text.index("[serve] worker")]
+        assert steps == sorted(steps)
+        assert int(re.search(r"gc frozen \((\d+) objects\)", text).group(1)) > 0
+        assert text.count("[serve] database ready") == 1
+        first = wait_for(lambda: len(started()) == 2 and started())
+
+        for i in range(20):
+            r = httpx.post(f"{base}/predict", json={"payload": {"absences": i}})  # une connexion par requête
+            assert r.status_code == 200
+        # Quel que soit le worker qui répond, le total est celui des 2 workers
+        for _ in range(5):
+            workers, predictions = workers_in_metrics()
+            assert workers == set(first) and predictions == 20
+
+        os.kill(first[0], signal.SIGKILL)
+        restarted = wait_for(lambda: len(started()) == 3 and started()[2])
+        assert f"worker {first[0]} exited" in log()
+        wait_for(lambda: workers_in_metrics()[0] == {first[1], restarted})
+        assert workers_in_metrics()[1] == 20  # compteurs du worker mort conservés
+        assert httpx.post(f"{base}/predict", json={"payload": {}}).status_code == 200
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+        out.close()
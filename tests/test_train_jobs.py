@@ -0,0 +1,116 @@
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+
+def wait_for_job(client, job_id, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/train/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.2)
+    raise AssertionError("training job timed out")
+
+
+def test_train_runs_as_background_job(load_api):
+    mod = load_api()
+    client = TestClient(mod.app)
+
+    r = client.post("/train?workers=2")
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "succeeded", job
+    assert job["n_samples"] > 0
+    assert job["workers"] == 2 and job["wall_clock_s"] > 0
+    for scenario, state in job["scenarios"].items():
+        assert state["status"] == "succeeded"
+        assert state["folds_done"] == state["n_folds"] == 5
+        assert 0.5 < state["accuracy_cv"] <= 1.0
+
+    version = job["model_version"]
+    for scenario, path in mod.MODELS.items():
+        assert (mod.REGISTRY_DIR / version / path.name).exists()
+        assert mod.compiled_path(mod.REGISTRY_DIR / version / path.name).exists()
+    assert mod.drift_profile_path(version).exists()
+
+    # Métriques déterministes (plis à random_state fixe), identiques au
+    # cross_validate par scénario d'avant l'encodage partagé
+    assert job["scenarios"]["S2"]["accuracy_cv"] == 0.9224
+    assert job["scenarios"]["S2"]["f1_cv"] == 0.9506
+    assert job["scenarios"]["S3"]["accuracy_cv"] == 0.8707
+    assert job["scenarios"]["S4"]["accuracy_cv"] == 0.8008
+
+    # Modèle final = pipeline ajusté de bout en bout sur les données brutes
+    df = mod.load_training_data()
+    for scenario, path in mod.MODELS.items():
+        X = df[mod.scenario_features(df.columns, scenario)]
+        reference = mod.build_pipeline(X).fit(X, df["success"])
+        final = joblib.load(mod.REGISTRY_DIR / version / path.name)
+        np.testing.assert_allclose(final.predict_proba(X.head(20)), reference.predict_proba(X.head(20)), rtol=0, atol=1e-12)
+
+    assert client.get("/train/unknown").status_code == 404
+    r = client.post("/predict", json={"payload": {"G1": 10}}).json()
+    assert r["scenario"] == "S3" and r["model_version"] == version
+
+    models = client.get("/models").json()
+    assert models["active"] == version and models["history"] == ["baseline"]
+    assert client.post("/models/rollback").json()["active"] == "baseline"
+    assert client.post("/predict", json={"payload": {}}).json()["model_version"] == "baseline"
+    assert client.post("/models/rollback").status_code == 409
+    assert client.post(f"/models/{version}/promote").json()["active"] == version
+    assert client.post("/models/nope/promote").status_code == 404
+
+
+@pytest.mark.parametrize("start_method", ["forkserver", "spawn"])
+def test_train_in_process_pool_produces_usable_version(load_api, start_method):
+    """Pool de processus (sans fork) : le job aboutit et la version produite sert /predict."""
+
+    mod = load_api()
+    mod.TRAIN_START_METHOD = start_method
+    mod.TRAIN_WORKERS = 3
+    client = TestClient(mod.app)
+
+    job = wait_for_job(client, client.post("/train").json()["job_id"])
+    assert job["status"] == "succeeded", job
+    assert job["workers"] == 3
+    version = job["model_version"]
+
+    models = mod.ModelSet(version, mod._version_paths(version))
+    rows = mod.load_training_data().drop(columns=["G3", "success"]).head(5).to_dict(orient="records")
+    for row in rows:
+        r = client.post("/predict", json={"payload": row}).json()
+        assert r["model_version"] == version and r["scenario"] == "S2"
+        features = pd.DataFrame([mod.build_features(row, "S2")])
+        assert abs(r["pred_proba"] - models.get_model("S2").predict_proba(features)[0, 1]) < 1e-9
+
+
+def test_train_publishes_feature_schema_of_new_data(tmp_path, load_api):
+    """Catégorie apparue dans les données : acceptée par /predict après /train, refusée par la baseline."""
+    mod = load_api()
+    df = pd.read_csv(mod.DATA_PATH).drop(columns=["success"])
+    mod.DATA_PATH = tmp_path / "student_full.csv"
+    mod.TRAIN_STORE_PATH = tmp_path / "student_full.feather"
+    client = TestClient(mod.app)
+    df.loc[df.index[::7], "guardian"] = "grandparent"
+    r = client.post("/upload-data", files={"file": ("d.csv", df.to_csv(index=False), "text/csv")})
+    assert r.status_code == 200
+
+    body = {"payload": {"guardian": "grandparent", "absences": 2}}
+    assert client.post("/predict", json=body).status_code == 422
+
+    job = wait_for_job(client, client.post("/train?workers=2").json()["job_id"])
+    assert job["status"] == "succeeded", job
+    version = job["model_version"]
+    assert "grandparent" in mod.load_feature_schema(version)["categorical"]["guardian"]
+    r = client.post("/predict", json=body)
+    assert r.status_code == 200 and r.json()["model_version"] == version
+
+    client.post("/models/rollback")
+    assert client.post("/predict", json=body).status_code == 422
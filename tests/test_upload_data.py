@@ -0,0 +1,107 @@
+import json
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+
+def test_upload_streams_and_replaces_dataset(tmp_path, load_api):
+    mod = load_api(db_init=False)
+    src = pd.read_csv(mod.DATA_PATH)
+    mod.DATA_PATH = tmp_path / "student_full.csv"
+    mod.TRAIN_STORE_PATH = tmp_path / "student_full.feather"
+    for path in (mod.DATA_PATH, mod.TRAIN_STORE_PATH):
+        path.write_text("old\n")
+    mod.UPLOAD_CHUNK_ROWS = 100
+    mod.UPLOAD_CHUNK_BYTES = 4096
+    src = src.drop(columns=["success"]).head(350)
+
+    client = TestClient(mod.app)
+    r = client.post("/upload-data", files={"file": ("d.csv", src.to_csv(index=False), "text/csv")})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["rows"] == 350
+    assert data["success_distribution"]["success"] == int((src["G3"] >= 10).sum())
+
+    out = mod.load_training_data()
+    assert len(out) == 350 and "success" in out.columns
+    assert str(out["school"].dtype) == "category" and str(out["age"].dtype) == "int8"
+    assert sorted(tmp_path.iterdir()) == sorted([mod.DATA_PATH, mod.TRAIN_STORE_PATH, mod.train_schema_path(mod.TRAIN_STORE_PATH)])
+    assert mod.ensure_training_store() and mod.TRAIN_STORE_PATH.stat().st_mtime >= mod.DATA_PATH.stat().st_mtime
+    schema = mod.load_training_schema()
+    assert schema["rows"] == 350 and {"name": "G3", "dtype": "int8"} in schema["columns"]
+
+    # Projection de colonnes ; CSV source réécrit = entrée (+ success), identique à l'export
+    assert list(mod.load_training_data(columns=["G1", "success"]).columns) == ["G1", "success"]
+    src["success"] = (src["G3"] >= 10).astype(int)
+    pd.testing.assert_frame_equal(pd.read_csv(mod.DATA_PATH), src)
+    mod.export_training_csv(tmp_path / "export.csv")
+    assert (tmp_path / "export.csv").read_text() == mod.DATA_PATH.read_text()
+
+
+def test_upload_rejects_bad_schema_without_touching_dataset(tmp_path, load_api):
+    mod = load_api(db_init=False)
+    src = pd.read_csv(mod.DATA_PATH)
+    mod.DATA_PATH = tmp_path / "student_full.csv"
+    mod.TRAIN_STORE_PATH = tmp_path / "student_full.feather"
+    for path in (mod.DATA_PATH, mod.TRAIN_STORE_PATH):
+        path.write_text("old\n")
+    mod.UPLOAD_CHUNK_ROWS = 50
+    src = src.head(120)
+    src["absences"] = src["absences"].astype(object)
+    src.loc[110, "absences"] = "beaucoup"
+
+    client = TestClient(mod.app)
+    r = client.post("/upload-data", files={"file": ("d.csv", src.to_csv(index=False), "text/csv")})
+    assert r.status_code == 400
+    assert "absences" in r.json()["detail"] and "ligne 112" in r.json()["detail"]
+
+    r = client.post("/upload-data", files={"file": ("d.csv", src.drop(columns=["G1"]).to_csv(index=False), "text/csv")})
+    assert r.status_code == 400
+    assert mod.DATA_PATH.read_text() == mod.TRAIN_STORE_PATH.read_text() == "old\n"
+    assert sorted(tmp_path.iterdir()) == sorted([mod.DATA_PATH, mod.TRAIN_STORE_PATH])
+
+
+def test_training_store_schema_roundtrip(tmp_path, load_api):
+    """CSV source → fichier colonnaire → CSV → fichier colonnaire : même schéma, mêmes types et valeurs."""
+    mod = load_api(db_init=False)
+    mod.DATA_PATH = tmp_path / "student_full.csv"
+    mod.TRAIN_STORE_PATH = tmp_path / "student_full.feather"
+    mod.DATA_PATH.write_bytes((mod.ROOT / "data" / "student_full.csv").read_bytes())
+    df = mod.load_training_data()  # fichier colonnaire construit depuis le CSV
+    store = mod.TRAIN_STORE_PATH
+    schema = mod.load_training_schema(store)
+    assert {c: str(t) for c, t in df.dtypes.items()} == {c["name"]: c["dtype"] for c in schema["columns"]}
+
+    mod.export_training_csv(tmp_path / "jeu.csv", store)
+    assert (tmp_path / "jeu.csv").read_text() == mod.DATA_PATH.read_text()
+    summary = mod.import_training_csv(tmp_path / "jeu.csv", tmp_path / "copie.feather")
+    assert summary["schema"] == schema
+
+    # Schéma également embarqué dans les métadonnées Arrow ; relecture en mémoire mappée
+    from pyarrow import feather
+    table = feather.read_table(str(tmp_path / "copie.feather"), memory_map=True)
+    assert json.loads(table.schema.metadata[b"student_schema"]) == schema
+    pd.testing.assert_frame_equal(mod.load_training_data(tmp_path / "copie.feather"), df)
+
+
+def test_training_store_rejects_bad_dtype(tmp_path, load_api):
+    """Type inconnu ou valeur non représentable dans le type du schéma : rien n'est écrit en silence."""
+    mod = load_api(db_init=False)
+    schema = {"format": mod.TRAIN_STORE_FORMAT, "rows": 2, "columns": [
+        {"name": "age", "dtype": "int8"},
+        {"name": "school", "dtype": "category", "categories": ["GP", "MS"]},
+    ]}
+    ok = pd.DataFrame({"age": [15, 22], "school": ["GP", "MS"]})
+    mod.write_training_store([ok], schema, tmp_path / "ok.feather")
+    assert mod.load_training_data(tmp_path / "ok.feather", columns=["age", "school"]).equals(
+        ok.astype({"age": "int8", "school": pd.CategoricalDtype(["GP", "MS"])}))
+
+    bad_schema = {**schema, "columns": [{"name": "age", "dtype": "object"}]}
+    with pytest.raises(mod.DataValidationError, match="Type non supporté"):
+        mod.write_training_store([ok], bad_schema, tmp_path / "bad.feather")
+    for col, value in [("age", 300), ("age", 16.5), ("age", "seize"), ("school", "XX")]:
+        bad = ok.astype(object)
+        bad.loc[1, col] = value
+        with pytest.raises(mod.DataValidationError, match=f"'{col}'"):
+            mod.write_training_store([bad], schema, tmp_path / "bad.feather")
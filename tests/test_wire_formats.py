@@ -0,0 +1,50 @@
+
+import msgpack
+from fastapi.testclient import TestClient
+
+MSGPACK = "application/msgpack"
+
+
+def test_msgpack_requests_and_responses(load_api):
+    """Négociation de contenu : MessagePack en entrée et en sortie, JSON par défaut."""
+    mod = load_api()
+    client = TestClient(mod.app)
+    body = {"payload": {"G1": 12, "G2": 13, "absences": 4}, "session_id": "mp"}
+
+    as_json = client.post("/predict", json=body)
+    assert as_json.headers["content-type"] == "application/json"
+    r = client.post("/predict", content=msgpack.packb(body),
+                    headers={"Content-Type": MSGPACK, "Accept": MSGPACK})
+    assert r.status_code == 200 and r.headers["content-type"] == MSGPACK
+    out = msgpack.unpackb(r.content)
+    assert out["scenario"] == "S2" and out["pred_proba"] == as_json.json()["pred_proba"]
+
+    # Validation identique quel que soit le format d'entrée
+    bad = msgpack.packb({"payload": {"school": "XX"}})
+    assert client.post("/predict", content=bad, headers={"Content-Type": MSGPACK}).status_code == 422
+    assert client.post("/predict", content=b"\xc1", headers={"Content-Type": MSGPACK}).status_code == 400
+
+    items = {"items": [{"payload": {"G1": 10}}, {"payload": {}}]}
+    r = client.post("/predict/batch", content=msgpack.packb(items),
+                    headers={"Content-Type": MSGPACK, "Accept": f"application/json;q=0.5, {MSGPACK}"})
+    assert [res["scenario"] for res in msgpack.unpackb(r.content)["results"]] == ["S3", "S4"]
+
+    page = client.get("/inferences?limit=2", headers={"Accept": MSGPACK})
+    assert page.headers["content-type"] == MSGPACK
+    assert msgpack.unpackb(page.content) == client.get("/inferences?limit=2").json()
+    assert client.get("/inferences", headers={"Accept": "text/html"}).status_code == 406
+
+
+def test_unacceptable_format_is_refused_before_scoring(load_api):
+    """406 avant l'admission : ni prédiction, ni journal, ni agrégats, ni dérive."""
+    mod = load_api()
+    client = TestClient(mod.app)
+    html = {"Accept": "text/html"}
+    assert client.post("/predict", json={"payload": {"G1": 12}}, headers=html).status_code == 406
+    assert client.post("/predict/batch", json={"items": [{"payload": {}}]}, headers=html).status_code == 406
+
+    assert mod._admission.admitted == 0
+    assert mod.PREDICTIONS_TOTAL.snapshot() == {}
+    assert client.get("/inferences").json()["inferences"] == []
+    assert client.get("/inferences/stats").json()["stats"] == []
+    assert mod._drift_monitor.pending == {}
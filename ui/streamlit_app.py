@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import time
 
 st.set_page_config(page_title="Prédiction Réussite Scolaire", page_icon="🎓", layout="wide")
 
@@ -9,6 +10,38 @@ st.markdown("*✅ Interface conforme RGPD : aucune variable sensible collectée
 
 # URL de l'API
 API_URL = st.sidebar.text_input("URL API", "http://api:8000")
+# Durée maximale du suivi d'un entraînement (/train/{job_id})
+TRAIN_POLL_TIMEOUT_S = 15 * 60
+TRAIN_POLL_INTERVAL_S = 2
+
+
+def api_error(response) -> str:
+    """Message d'erreur d'une réponse HTTP : detail JSON de l'API, sinon le texte brut."""
+    try:
+        detail = response.json().get("detail")
+    except ValueError:
+        detail = None
+    return f"HTTP {response.status_code} : {detail or response.text or response.reason}"
+
+
+def wait_train_job(job_id: str) -> dict:
+    """
+    Suit un job jusqu'à succès ou échec. Lève RuntimeError sur une réponse
+    autre que 200 (job inconnu ou évincé, erreur serveur) ou au-delà de
+    TRAIN_POLL_TIMEOUT_S.
+    """
+    deadline = time.monotonic() + TRAIN_POLL_TIMEOUT_S
+    while True:
+        response = requests.get(f"{API_URL}/train/{job_id}", timeout=10)
+        if response.status_code != 200:
+            raise RuntimeError(f"Suivi du job {job_id} impossible ({api_error(response)})")
+        job = response.json()
+        if job.get("status") in ("succeeded", "failed"):
+            return job
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Job {job_id} toujours '{job.get('status')}' après {TRAIN_POLL_TIMEOUT_S // 60} min "
+                               f"(suivi : {API_URL}/train/{job_id})")
+        time.sleep(TRAIN_POLL_INTERVAL_S)
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 📊 Scénarios")
@@ -80,7 +113,7 @@ with col5:
 with col6:
     st.markdown("### 📈 Santé & Présence")
     health = st.slider("État de santé (1-5)", 1, 5, 3, help="1=très mauvais, 5=très bon")
-    absences = st.number_input("Nombre d'absences", 0, 100, 0)
+    absences = st.number_input("Nombre d'absences", 0, 93, 0)
 
 # Notes - Section séparée avec checkboxes
 st.markdown("---")
@@ -215,7 +248,7 @@ with col_upload:
     uploaded_file = st.file_uploader(
         "Choisir un fichier CSV",
         type=["csv"],
-        help="Le fichier doit contenir au minimum la colonne G3 (note finale)"
+        help="Le fichier doit contenir les colonnes de feature_template.json et la colonne G3 (note finale)"
     )
     
     if uploaded_file is not None:
@@ -242,20 +275,28 @@ with col_train:
     
     if st.button("🔄 Réentraîner S2, S3, S4", use_container_width=True):
         try:
-            with st.spinner("Entraînement en cours..."):
-                response = requests.post(f"{API_URL}/train", timeout=60)
-            
-            if response.status_code == 200:
-                result = response.json()
-                st.success(f"✅ Modèles réentraînés sur {result.get('n_samples', '?')} échantillons")
-                
-                # Afficher les résultats
-                for scenario, metrics in result.get("models", {}).items():
-                    acc = metrics.get("accuracy_cv", 0) * 100
-                    f1 = metrics.get("f1_cv", 0) * 100
-                    st.metric(f"{scenario}", f"Fiabilité : {acc:.1f}%", f"F1 : {f1:.1f}%")
+            response = requests.post(f"{API_URL}/train", timeout=10)
+
+            if response.status_code == 202:
+                job_id = response.json()["job_id"]
+                # L'entraînement tourne en tâche de fond : on suit le job
+                with st.spinner("Entraînement en cours..."):
+                    job = wait_train_job(job_id)
+
+                if job["status"] == "succeeded":
+                    st.success(f"✅ Modèles réentraînés sur {job.get('n_samples', '?')} échantillons")
+
+                    # Afficher les résultats
+                    for scenario, metrics in job.get("scenarios", {}).items():
+                        acc = metrics.get("accuracy_cv", 0) * 100
+                        f1 = metrics.get("f1_cv", 0) * 100
+                        st.metric(f"{scenario}", f"Fiabilité : {acc:.1f}%", f"F1 : {f1:.1f}%")
+                else:
+                    st.error(f"❌ Entraînement échoué : {job.get('error') or 'erreur inconnue'}")
+            elif response.status_code == 409:
+                st.warning(f"⏳ Un entraînement est déjà en cours, réessayez plus tard ({api_error(response)})")
             else:
-                st.error(f"❌ Erreur : {response.text}")
+                st.error(f"❌ Erreur : {api_error(response)}")
         except Exception as e:
             st.error(f"❌ Erreur : {str(e)}")
 